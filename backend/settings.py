@@ -223,6 +223,44 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 if WHITENOISE_AVAILABLE:
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Static result snapshot (python manage.py export_result_snapshot)
+RESULT_SNAPSHOT_DIR = 'results'
+RESULT_SNAPSHOT_MAX_AGE = int(os.environ.get('RESULT_SNAPSHOT_MAX_AGE', 3600))
+
+def _result_snapshot_headers(headers, path, url):
+    # Snapshot files keep their name when a result is republished, so they
+    # get a long but bounded max-age instead of WhiteNoise's immutable one
+    if url.startswith(f'{STATIC_URL}{RESULT_SNAPSHOT_DIR}/'):
+        headers['Cache-Control'] = f'public, max-age={RESULT_SNAPSHOT_MAX_AGE}'
+
+WHITENOISE_ADD_HEADERS_FUNCTION = _result_snapshot_headers
+
+# Processes the run_jobs worker uses to render a class's result cards; web
+# requests always render in-process so gunicorn workers never fork
+RESULT_CARD_WORKERS = int(os.environ.get('RESULT_CARD_WORKERS', 2))
+
+# Shared by every gunicorn worker and the job/outbox workers, so clearing a
+# cached value (e.g. analytics.invalidate_dashboard) applies to all of them.
+# Redis when REDIS_URL is set; otherwise a table created by createcachetable.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
+# Rendered result cards and reports (core.render_cache), LRU-evicted past the size limit
+RENDER_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR', os.path.join(BASE_DIR, 'render_cache'))
+RENDER_CACHE_MAX_BYTES = int(os.environ.get('RENDER_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -240,6 +278,19 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', 'nawaprativaschool@gmail.com
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'Nawa Prativa School <nawaprativaschool@gmail.com>')
 
+# Bulk result emails share one SMTP connection and go out in batches, pausing
+# between batches to stay under the provider's rate limit
+RESULT_EMAIL_BATCH_SIZE = int(os.environ.get('RESULT_EMAIL_BATCH_SIZE', 50))
+RESULT_EMAIL_BATCH_DELAY = float(os.environ.get('RESULT_EMAIL_BATCH_DELAY', 1.0))
+
+# Email outbox (core.outbox): send_outbox sends at most OUTBOX_RATE messages per
+# second (bursts of OUTBOX_BURST) and retries failures with exponential backoff
+OUTBOX_RATE = float(os.environ.get('OUTBOX_RATE', 1.0))
+OUTBOX_BURST = int(os.environ.get('OUTBOX_BURST', 10))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 6))
+OUTBOX_RETRY_BASE = int(os.environ.get('OUTBOX_RETRY_BASE', 60))
+OUTBOX_RETRY_MAX = int(os.environ.get('OUTBOX_RETRY_MAX', 6 * 60 * 60))
+
 # For testing (uncomment to see emails in console instead of sending)
 # EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
@@ -158,8 +158,9 @@ class EnhancedMarksEntry {
 				return;
 			}
 			
-			// Initialize marks data
+			// Initialize marks data and fill in every saved subject in one request
 			this.initializeMarksData();
+			await this.loadMarksMatrix();
 			
 			// Populate subject dropdown and checklist
 			this.populateSubjectDropdown();
@@ -251,9 +252,46 @@ class EnhancedMarksEntry {
 			});
 		} catch (e) {}
 		this.initializeMarksData();
+		await this.loadMarksMatrix();
 		this.loadSubject(0);
 	}
 	
+	async loadMarksMatrix() {
+		try {
+			const params = new URLSearchParams({
+				class: this.currentClass,
+				exam_type: this.currentExamType,
+				academic_year: this.currentAcademicYear
+			});
+			const response = await fetch(`/api/marks/matrix/?${params}`);
+			if (!response.ok) return;
+			
+			const matrix = await response.json();
+			const cells = matrix.cells;
+			for (let i = 0; i < cells.student_index.length; i++) {
+				const symbolNumber = matrix.students.symbol_numbers[cells.student_index[i]];
+				const subjectName = matrix.subjects.names[cells.subject_index[i]];
+				const marks = this.marksData[subjectName] && this.marksData[subjectName][symbolNumber];
+				if (!marks) continue;
+				
+				const hasMarks = cells.theory_marks[i] !== null || cells.practical_marks[i] !== null;
+				marks.theory_marks = cells.theory_marks[i] ?? '';
+				marks.theory_total = cells.theory_total[i] ?? 100;
+				marks.practical_marks = cells.practical_marks[i] ?? '';
+				marks.practical_total = cells.practical_total[i] ?? 0;
+				if (hasMarks) {
+					marks.total_marks = (cells.total_marks[i] ?? 0).toFixed(2);
+					marks.percentage = (cells.percentage[i] ?? 0).toFixed(2);
+					marks.grade = cells.grade[i] || '';
+					marks.grade_point = (cells.grade_point[i] ?? 0).toFixed(2);
+					marks.status = cells.is_passed[i] ? 'Passed' : 'Failed';
+				}
+			}
+		} catch (error) {
+			console.error('Failed to load saved marks:', error);
+		}
+	}
+	
 	populateMarksTable() {
 		if (!this.elements.marksTableBody) return;
 		
@@ -92,11 +92,28 @@ function showResults() {
 }
 
 // Data Fetching Functions
+
+// Results day: published results are exported as static files keyed by
+// sha256(symbol number), see core/result_snapshot.py
+async function fetchResultSnapshot(symbolNumber) {
+    if (!window.crypto || !window.crypto.subtle) return null;
+    try {
+        const digest = await window.crypto.subtle.digest('SHA-256', new TextEncoder().encode(symbolNumber));
+        const key = Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+        const response = await fetch(`/static/results/${key.slice(0, 2)}/${key}.json`);
+        return response.ok ? await response.json() : null;
+    } catch (err) {
+        return null;
+    }
+}
+
 async function fetchStudentResultBySymbol(symbolNumber) {
     try {
         showLoading();
         hideError();
         hideSuccess();
+        const snapshot = await fetchResultSnapshot(symbolNumber);
+        if (snapshot) return snapshot;
         const response = await fetch(`/api/student-result/${encodeURIComponent(symbolNumber)}/`);
         if (!response.ok) {
             if (response.status === 404) {
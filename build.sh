@@ -5,4 +5,9 @@ set -o errexit
 pip install -r requirements.txt
 
 python manage.py collectstatic --no-input
-python manage.py migrate
\ No newline at end of file
+python manage.py migrate
+python manage.py createcachetable
+# After migrate: the export reads tables a new migration may create
+if [ "${EXPORT_RESULT_SNAPSHOT:-}" = "1" ]; then
+  python manage.py export_result_snapshot
+fi
\ No newline at end of file
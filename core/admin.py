@@ -7,7 +7,7 @@ from .models import (
     Student, Profile, HomeworkSubmission, ActivityLog, StudentAccount, 
     LeadershipMessage, Attendance, ClassSection, GalleryLike, GalleryComment,
     ResultAnalytics, SubjectPerformance, StudentPerformanceHistory, 
-    ResultTemplate, GradeScale, Subject, Marks, Resource
+    ResultTemplate, GradeScale, Subject, Marks, Resource, Job, OutboundEmail
 )
 from django.utils.html import format_html
 from django import forms
@@ -17,6 +17,8 @@ from django.contrib import messages
 from django.http import HttpResponseRedirect
 from django.urls import path, reverse
 
+from . import analytics, grading, pipeline, ranking, regrade, result_documents, result_snapshot
+
 SUBJECTS = [
     'English',
     'Nepali',
@@ -26,25 +28,6 @@ SUBJECTS = [
     'Computer',
 ]
 
-def get_grade_and_point(marks):
-    if marks is None:
-        return '', None
-    if marks >= 90:
-        return 'A+', 4.0
-    if marks >= 80:
-        return 'A', 3.6
-    if marks >= 70:
-        return 'B+', 3.2
-    if marks >= 60:
-        return 'B', 2.8
-    if marks >= 50:
-        return 'C+', 2.4
-    if marks >= 40:
-        return 'C', 2.0
-    if marks >= 30:
-        return 'D', 1.6
-    return 'NG', 0.0
-
 class SubjectResultInline(admin.StackedInline):
     model = SubjectResult
     extra = 1
@@ -83,16 +66,8 @@ class SubjectResultInline(admin.StackedInline):
         return obj
 
     def _auto_calculate(self, obj):
-        # Theory
-        obj.theory_grade, obj.theory_grade_point = get_grade_and_point(obj.theory_marks)
-        # Practical
-        obj.practical_grade, obj.practical_grade_point = get_grade_and_point(obj.practical_marks)
-        # Final/Combined
-        total_marks = (obj.theory_marks or 0) + (obj.practical_marks or 0)
-        max_parts = int(obj.theory_marks is not None) + int(obj.practical_marks is not None)
-        avg_marks = total_marks / max_parts if max_parts else 0
-        obj.grade, obj.grade_point = get_grade_and_point(avg_marks)
-        obj.final_grade = obj.grade
+        grading.apply_subject_result_grades([obj])
+        obj.grade = obj.final_grade
         # Remarks
         if (obj.theory_marks is not None and obj.theory_marks < 40) or (obj.practical_marks is not None and obj.practical_marks < 40):
             obj.remarks = 'Failed'
@@ -116,7 +91,7 @@ class ResultAdmin(admin.ModelAdmin):
     list_filter = ('student_class', 'exam_type', 'academic_year', 'is_published', 'uploaded_at')
     readonly_fields = ('uploaded_at', 'percentage')
     inlines = [SubjectResultInline]
-    actions = ['publish_results', 'unpublish_results', 'generate_analytics']
+    actions = ['publish_results', 'unpublish_results', 'generate_analytics', 'recalculate_grades', 'rank_classes']
     
     fieldsets = (
         ('Basic Information', {
@@ -196,7 +171,9 @@ class ResultAdmin(admin.ModelAdmin):
             published_at=timezone.now(),
             published_by=request.user
         )
+        result_documents.results_published(queryset)
         self.message_user(request, f'{updated} results have been published successfully.')
+        self._snapshot_notice(request)
     publish_results.short_description = "Publish selected results"
     
     def unpublish_results(self, request, queryset):
@@ -206,44 +183,35 @@ class ResultAdmin(admin.ModelAdmin):
             published_by=None
         )
         self.message_user(request, f'{updated} results have been unpublished.')
+        self._snapshot_notice(request)
     unpublish_results.short_description = "Unpublish selected results"
+
+    def _snapshot_notice(self, request):
+        # WhiteNoise indexed the snapshot at startup, so it is only rewritten at deploy
+        if result_snapshot.is_enabled():
+            self.message_user(
+                request,
+                'The static result snapshot is unchanged until the next deploy re-runs export_result_snapshot.',
+                level=messages.WARNING,
+            )
     
     def generate_analytics(self, request, queryset):
-        for result in queryset:
-            analytics, created = ResultAnalytics.objects.get_or_create(
-                class_name=result.student_class,
-                exam_type=result.exam_type,
-                academic_year=result.academic_year,
-                defaults={
-                    'total_students': 0,
-                    'passed_students': 0,
-                    'failed_students': 0,
-                    'average_gpa': 0.0,
-                    'highest_gpa': 0.0,
-                    'lowest_gpa': 0.0,
-                    'pass_percentage': 0.0
-                }
-            )
-        
-        # Update analytics for each class/exam combination
-        for analytics in ResultAnalytics.objects.all():
-            results = Result.objects.filter(
-                class_name=analytics.class_name,
-                exam_type=analytics.exam_type,
-                academic_year=analytics.academic_year
-            )
-            
-            analytics.total_students = results.count()
-            analytics.passed_students = results.filter(gpa__gte=2.0).count()
-            analytics.failed_students = results.filter(gpa__lt=2.0).count()
-            analytics.average_gpa = results.aggregate(Avg('gpa'))['gpa__avg'] or 0.0
-            analytics.highest_gpa = results.aggregate(Max('gpa'))['gpa__max'] or 0.0
-            analytics.lowest_gpa = results.aggregate(Min('gpa'))['gpa__min'] or 0.0
-            analytics.pass_percentage = (analytics.passed_students / analytics.total_students * 100) if analytics.total_students > 0 else 0.0
-            analytics.save()
-        
-        self.message_user(request, 'Analytics generated successfully.')
+        buckets = queryset.values_list('student_class', 'exam_type', 'academic_year').order_by().distinct()
+        refreshed = analytics.refresh_result_analytics(buckets)
+        self.message_user(request, f'Analytics generated for {refreshed} class/exam combinations.')
     generate_analytics.short_description = "Generate analytics for selected results"
+    
+    def recalculate_grades(self, request, queryset):
+        subject_results = SubjectResult.objects.filter(result__in=queryset)
+        updated = regrade.regrade_subject_results(subject_results)
+        self.message_user(request, f'Recalculated grades for {updated} subject results.')
+    recalculate_grades.short_description = "Recalculate subject grades for selected results"
+    
+    def rank_classes(self, request, queryset):
+        buckets = queryset.values_list('student_class', 'exam_type', 'academic_year').order_by().distinct()
+        updated = ranking.rank_results(buckets)
+        self.message_user(request, f'Class positions updated for {updated} results.')
+    rank_classes.short_description = "Recalculate class positions for selected classes"
 
 @admin.register(Teacher)
 class TeacherAdmin(admin.ModelAdmin):
@@ -441,6 +409,13 @@ class StudentPerformanceHistoryAdmin(admin.ModelAdmin):
     search_fields = ('student__full_name', 'student__symbol_number', 'exam_type', 'academic_year')
     readonly_fields = ('created_at',)
     ordering = ('-created_at',)
+    actions = ['rank_classes']
+
+    def rank_classes(self, request, queryset):
+        buckets = queryset.values_list('class_name', 'exam_type', 'academic_year').order_by().distinct()
+        updated = ranking.rank_performance_history(buckets)
+        self.message_user(request, f'Class positions updated for {updated} records.')
+    rank_classes.short_description = "Recalculate class positions for selected classes"
 
 @admin.register(ResultTemplate)
 class ResultTemplateAdmin(admin.ModelAdmin):
@@ -472,6 +447,7 @@ class MarksAdmin(admin.ModelAdmin):
     search_fields = ['student__full_name', 'student__symbol_number', 'subject__name']
     ordering = ['student__full_name', 'subject__name']
     readonly_fields = ['total_marks', 'percentage', 'grade', 'grade_point', 'is_passed', 'created_at', 'updated_at']
+    actions = ['recalculate_grades', 'build_results']
     
     fieldsets = [
         ('Student & Subject', {
@@ -493,12 +469,57 @@ class MarksAdmin(admin.ModelAdmin):
         })
     ]
 
+    def recalculate_grades(self, request, queryset):
+        updated = regrade.regrade_marks(queryset)
+        self.message_user(request, f'Recalculated grades for {updated} marks.')
+    recalculate_grades.short_description = "Recalculate grades for selected marks"
+
+    def build_results(self, request, queryset):
+        exams = queryset.values_list('exam_type', 'academic_year', 'student__student_class').order_by().distinct()
+        built = 0
+        for exam_type, academic_year, student_class in exams:
+            built += pipeline.build_results(exam_type, academic_year, student_class=student_class)['students']
+        self.message_user(request, f'Built results for {built} students with changed marks.')
+    build_results.short_description = "Build results from marks for the selected classes"
+
 @admin.register(Resource)
 class ResourceAdmin(admin.ModelAdmin):
     list_display = ('title', 'class_name', 'subject', 'is_question_paper', 'is_published', 'created_at')
     list_filter = ('class_name', 'subject', 'is_question_paper', 'is_published')
     search_fields = ('title', 'description', 'tags')
 
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'progress', 'total', 'attempts', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status']
+    exclude = ['input_data', 'output_data']
+    readonly_fields = [
+        'kind', 'status', 'payload', 'input_name', 'output_name', 'output_content_type', 'progress', 'total',
+        'message', 'result', 'error', 'attempts', 'worker', 'created_by', 'created_at', 'started_at',
+        'heartbeat_at', 'finished_at',
+    ]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('input_data', 'output_data')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['to_email', 'subject', 'status', 'attempts', 'exam_type', 'academic_year', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'kind', 'exam_type', 'academic_year']
+    search_fields = ['to_email', 'subject', 'student__full_name', 'student__symbol_number']
+    readonly_fields = ['student', 'attempts', 'last_error', 'created_at', 'updated_at', 'sent_at']
+    actions = ['retry_emails']
+
+    def retry_emails(self, request, queryset):
+        updated = queryset.exclude(status=OutboundEmail.SENT).update(
+            status=OutboundEmail.PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} emails queued to send again.')
+    retry_emails.short_description = "Retry selected emails (including dead letters)"
+
 # Register models that don't have @admin.register decorator
 admin.site.register(ContactMessage)
 admin.site.register(Profile)
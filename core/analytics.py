@@ -0,0 +1,281 @@
+"""Incremental maintenance of the ResultAnalytics and SubjectPerformance rollups.
+
+Instead of re-scanning every rollup row, callers report which Result or
+Marks rows changed; only the affected buckets are recomputed, each set of
+buckets with a single grouped aggregate query, and written back with one
+upsert.
+
+Buckets:
+    ResultAnalytics     (class_name, exam_type, academic_year)   from Result
+    SubjectPerformance  (subject_name, class_name, exam_type, academic_year)   from Marks
+"""
+from functools import reduce
+import hashlib
+import operator
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import grading
+
+# Safety net for caches that are not shared between worker processes
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# Marks with a score entered.  Rows without one (the placeholders created by
+# set_subjects_for_class) are not graded yet and stay out of every rollup.
+ENTERED_MARKS = Q(theory_marks__isnull=False) | Q(practical_marks__isnull=False)
+
+
+def bucket_filter(buckets, fields):
+    """Build an OR of exact-match filters, one per bucket."""
+    return reduce(operator.or_, (Q(**dict(zip(fields, bucket))) for bucket in buckets))
+
+
+def _pass_percentage(passed, total):
+    return (passed / total * 100) if total > 0 else 0.0
+
+
+def refresh_result_analytics(buckets=None):
+    """Recompute ResultAnalytics rows for the given (class, exam_type, year) buckets.
+
+    ``buckets=None`` recomputes every bucket.
+    """
+    from .models import Result, ResultAnalytics
+
+    results = Result.objects.all()
+    if buckets is not None:
+        buckets = set(buckets)
+        if not buckets:
+            return 0
+        results = results.filter(bucket_filter(buckets, ['student_class', 'exam_type', 'academic_year']))
+
+    rows = (
+        results
+        .values('student_class', 'exam_type', 'academic_year')
+        .annotate(
+            total_students=Count('id'),
+            passed_students=Count('id', filter=Q(gpa__gte=2.0)),
+            failed_students=Count('id', filter=Q(gpa__lt=2.0)),
+            average_gpa=Avg('gpa'),
+            highest_gpa=Max('gpa'),
+            lowest_gpa=Min('gpa'),
+        )
+        .order_by()
+    )
+
+    analytics = []
+    for row in rows:
+        analytics.append(ResultAnalytics(
+            class_name=row['student_class'],
+            exam_type=row['exam_type'],
+            academic_year=row['academic_year'],
+            total_students=row['total_students'],
+            passed_students=row['passed_students'],
+            failed_students=row['failed_students'],
+            average_gpa=row['average_gpa'] or 0.0,
+            highest_gpa=row['highest_gpa'] or 0.0,
+            lowest_gpa=row['lowest_gpa'] or 0.0,
+            pass_percentage=_pass_percentage(row['passed_students'], row['total_students']),
+        ))
+
+    ResultAnalytics.objects.bulk_create(
+        analytics,
+        update_conflicts=True,
+        unique_fields=['class_name', 'exam_type', 'academic_year'],
+        update_fields=[
+            'total_students', 'passed_students', 'failed_students', 'average_gpa',
+            'highest_gpa', 'lowest_gpa', 'pass_percentage', 'updated_at',
+        ],
+    )
+
+    # Buckets whose last result was deleted
+    present = {(a.class_name, a.exam_type, a.academic_year) for a in analytics}
+    if buckets is None:
+        stale = ResultAnalytics.objects.exclude(pk__in=[
+            pk for pk, *key in ResultAnalytics.objects.values_list('pk', 'class_name', 'exam_type', 'academic_year')
+            if tuple(key) in present
+        ])
+        stale.delete()
+    elif buckets - present:
+        ResultAnalytics.objects.filter(bucket_filter(buckets - present, ['class_name', 'exam_type', 'academic_year'])).delete()
+    return len(analytics)
+
+
+def refresh_subject_performance(buckets=None):
+    """Recompute SubjectPerformance rows for the given (subject, class, exam_type, year) buckets.
+
+    ``buckets=None`` recomputes every bucket.
+    """
+    from .models import Marks, SubjectPerformance
+
+    marks = Marks.objects.filter(ENTERED_MARKS)
+    if buckets is not None:
+        buckets = set(buckets)
+        if not buckets:
+            return 0
+        marks = marks.filter(bucket_filter(
+            buckets, ['subject__name', 'student__student_class', 'exam_type', 'academic_year']
+        ))
+
+    rows = (
+        marks
+        .values('subject__name', 'student__student_class', 'exam_type', 'academic_year')
+        .annotate(
+            total_students=Count('id'),
+            passed_students=Count('id', filter=Q(is_passed=True)),
+            average_marks=Avg('total_marks'),
+            highest_marks=Max('total_marks'),
+            lowest_marks=Min('total_marks'),
+        )
+        .order_by()
+    )
+
+    performances = []
+    for row in rows:
+        performances.append(SubjectPerformance(
+            subject_name=row['subject__name'],
+            class_name=row['student__student_class'],
+            exam_type=row['exam_type'],
+            academic_year=row['academic_year'],
+            total_students=row['total_students'],
+            passed_students=row['passed_students'],
+            failed_students=row['total_students'] - row['passed_students'],
+            average_marks=row['average_marks'] or 0.0,
+            highest_marks=row['highest_marks'] or 0.0,
+            lowest_marks=row['lowest_marks'] or 0.0,
+            pass_percentage=_pass_percentage(row['passed_students'], row['total_students']),
+        ))
+
+    SubjectPerformance.objects.bulk_create(
+        performances,
+        update_conflicts=True,
+        unique_fields=['subject_name', 'class_name', 'exam_type', 'academic_year'],
+        update_fields=[
+            'total_students', 'passed_students', 'failed_students', 'average_marks',
+            'highest_marks', 'lowest_marks', 'pass_percentage',
+        ],
+    )
+
+    present = {(p.subject_name, p.class_name, p.exam_type, p.academic_year) for p in performances}
+    if buckets is None:
+        stale = SubjectPerformance.objects.exclude(pk__in=[
+            pk for pk, *key in SubjectPerformance.objects.values_list(
+                'pk', 'subject_name', 'class_name', 'exam_type', 'academic_year'
+            )
+            if tuple(key) in present
+        ])
+        stale.delete()
+    elif buckets - present:
+        SubjectPerformance.objects.filter(
+            bucket_filter(buckets - present, ['subject_name', 'class_name', 'exam_type', 'academic_year'])
+        ).delete()
+    return len(performances)
+
+
+def results_changed(results):
+    """Refresh the ResultAnalytics buckets touched by ``results``."""
+    return refresh_result_analytics(
+        (r.student_class, r.exam_type, r.academic_year) for r in results
+    )
+
+
+def marks_changed(marks):
+    """Refresh the SubjectPerformance buckets touched by ``marks``.
+
+    Class and subject names are resolved with one query each, so this is
+    safe to call with instances that only carry ``student_id``/``subject_id``.
+    """
+    from .models import Student, Subject
+
+    marks = list(marks)
+    if not marks:
+        return 0
+    invalidate_dashboard({(m.exam_type, m.academic_year) for m in marks})
+    classes = dict(
+        Student.objects.filter(id__in={m.student_id for m in marks}).values_list('id', 'student_class')
+    )
+    subjects = dict(
+        Subject.objects.filter(id__in={m.subject_id for m in marks}).values_list('id', 'name')
+    )
+    return refresh_subject_performance(
+        (subjects[m.subject_id], classes[m.student_id], m.exam_type, m.academic_year)
+        for m in marks
+        if m.student_id in classes and m.subject_id in subjects
+    )
+
+
+def _dashboard_cache_key(exam_type, academic_year):
+    return 'analytics_dashboard:' + hashlib.md5(f'{exam_type}|{academic_year}'.encode()).hexdigest()
+
+
+def invalidate_dashboard(exams):
+    """Drop cached dashboard summaries for (exam_type, academic_year) pairs."""
+    cache.delete_many([_dashboard_cache_key(*exam) for exam in exams])
+
+
+def dashboard_summary(exam_type, academic_year):
+    """Marks statistics for one exam, computed with two aggregate queries.
+
+    Returns ``None`` when no marks exist.  Results are cached until the
+    exam's marks change (see ``marks_changed``).
+    """
+    from .models import Marks
+
+    key = _dashboard_cache_key(exam_type, academic_year)
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+
+    marks = Marks.objects.filter(ENTERED_MARKS, exam_type=exam_type, academic_year=academic_year)
+    obtained = Coalesce('theory_marks', Value(0.0)) + Coalesce('practical_marks', Value(0.0))
+    possible = Coalesce('theory_total', Value(0.0)) + Coalesce('practical_total', Value(0.0))
+    grades = [grade for _, grade, _ in grading.DEFAULT_GRADE_BOUNDARIES] + [grading.FAIL_GRADE]
+
+    totals = marks.aggregate(
+        records=Count('id'),
+        total_students=Count('student', distinct=True),
+        total_subjects=Count('subject', distinct=True),
+        obtained=Sum(obtained),
+        possible=Sum(possible),
+        pass_count=Count('id', filter=Q(is_passed=True)),
+        fail_count=Count('id', filter=Q(is_passed=False)),
+        **{f'grade_{i}': Count('id', filter=Q(grade=grade)) for i, grade in enumerate(grades)},
+    )
+    if not totals['records']:
+        return None
+
+    subjects = (
+        marks.values('subject__name')
+        .annotate(obtained=Sum(obtained), possible=Sum(possible), total_students=Count('id'))
+        .order_by('subject__name')
+    )
+
+    def percentage(row):
+        return round(row['obtained'] / row['possible'] * 100, 2) if row['possible'] else 0
+
+    judged = totals['pass_count'] + totals['fail_count']
+    summary = {
+        'total_students': totals['total_students'],
+        'total_subjects': totals['total_subjects'],
+        'overall_percentage': percentage(totals),
+        'pass_count': totals['pass_count'],
+        'fail_count': totals['fail_count'],
+        'pass_rate': round(totals['pass_count'] / judged * 100, 2) if judged else 0,
+        'subject_performance': [
+            {
+                'subject_name': row['subject__name'],
+                'average_percentage': percentage(row),
+                'total_students': row['total_students'],
+            }
+            for row in subjects
+        ],
+        'grade_distribution': {grade: totals[f'grade_{i}'] for i, grade in enumerate(grades)},
+    }
+    cache.set(key, summary, DASHBOARD_CACHE_TIMEOUT)
+    return summary
+
+
+def rebuild_all():
+    """Recompute every bucket from scratch (backfill / repair)."""
+    return refresh_result_analytics(), refresh_subject_performance()
@@ -0,0 +1,228 @@
+"""Streaming export helpers.
+
+Exports iterate their querysets with ``.iterator()`` and never hold the
+whole result set in memory.  Excel files are written by xlsxwriter in
+``constant_memory`` mode (one row buffered at a time) into a private,
+already-unlinked temporary file that is then streamed back with
+``FileResponse``, so concurrent exports never share a file.
+
+CSV and NDJSON dumps go further: rows come from ``values_list()`` over a
+server-side cursor and are encoded by a generator behind a
+``StreamingHttpResponse``, so the first bytes leave before the query has
+finished and memory stays bounded whatever the row count.
+"""
+import csv
+import tempfile
+import zlib
+
+import xlsxwriter
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, StreamingHttpResponse
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+ITERATOR_CHUNK_SIZE = 2000
+
+HEADER_FORMAT = {'bold': True, 'text_wrap': True, 'valign': 'top', 'fg_color': '#D7E4BC', 'border': 1}
+CELL_FORMAT = {'text_wrap': True, 'valign': 'top', 'border': 1}
+
+
+def xlsx_response(filename, sheets, column_width=15, cell_format=CELL_FORMAT):
+    """Write ``sheets`` to an xlsx file and return it as a download.
+
+    ``sheets`` is an iterable of ``(title, headers, rows)`` where ``rows``
+    is any iterable of row sequences, consumed lazily.
+    """
+    output = tempfile.TemporaryFile()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    header_format = workbook.add_format(HEADER_FORMAT)
+    row_format = workbook.add_format(cell_format) if cell_format else None
+
+    for title, headers, rows in sheets:
+        worksheet = workbook.add_worksheet(title)
+        # Column options must be set before any rows in constant_memory mode
+        worksheet.set_column(0, len(headers) - 1, column_width)
+        worksheet.write_row(0, 0, headers, header_format)
+        for row_number, row in enumerate(rows, start=1):
+            worksheet.write_row(row_number, 0, row, row_format)
+
+    workbook.close()
+    output.seek(0)
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+STREAM_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+# Flush to the client roughly every 64 KiB instead of once per row
+STREAM_FLUSH_SIZE = 64 * 1024
+
+# (column name, values_list lookup)
+MARKS_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('symbol_number', 'student__symbol_number'),
+    ('student_name', 'student__full_name'),
+    ('student_class', 'student__student_class'),
+    ('subject', 'subject__name'),
+    ('subject_code', 'subject__code'),
+    ('exam_type', 'exam_type'),
+    ('academic_year', 'academic_year'),
+    ('theory_marks', 'theory_marks'),
+    ('theory_total', 'theory_total'),
+    ('practical_marks', 'practical_marks'),
+    ('practical_total', 'practical_total'),
+    ('total_marks', 'total_marks'),
+    ('percentage', 'percentage'),
+    ('grade', 'grade'),
+    ('grade_point', 'grade_point'),
+    ('is_passed', 'is_passed'),
+    ('updated_at', 'updated_at'),
+]
+RESULT_EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('roll_number', 'roll_number'),
+    ('student_name', 'student_name'),
+    ('student_class', 'student_class'),
+    ('exam_type', 'exam_type'),
+    ('academic_year', 'academic_year'),
+    ('total', 'total'),
+    ('gpa', 'gpa'),
+    ('percentage', 'percentage'),
+    ('total_subjects', 'total_subjects'),
+    ('passed_subjects', 'passed_subjects'),
+    ('failed_subjects', 'failed_subjects'),
+    ('class_position', 'class_position'),
+    ('total_students', 'total_students'),
+    ('is_published', 'is_published'),
+    ('uploaded_at', 'uploaded_at'),
+]
+# Query param -> lookup accepted by the marks / results dumps
+MARKS_EXPORT_FILTERS = {
+    'student_id': 'student_id',
+    'subject_id': 'subject_id',
+    'exam_type': 'exam_type',
+    'academic_year': 'academic_year',
+}
+RESULT_EXPORT_FILTERS = {
+    'class': 'student_class',
+    'exam_type': 'exam_type',
+    'academic_year': 'academic_year',
+}
+
+
+# Filters on primary keys; anything else in the query string is a bad request
+INTEGER_FILTERS = {'student_id', 'subject_id'}
+
+
+class FilterError(ValueError):
+    """A query parameter cannot be used as a filter."""
+
+
+def filter_queryset(queryset, params, filters):
+    """Apply the ``params`` named in ``filters`` ({param: lookup}) that are present.
+
+    Raises FilterError for a non-integer value of an INTEGER_FILTERS param.
+    """
+    for param, lookup in filters.items():
+        value = params.get(param)
+        if value:
+            if param in INTEGER_FILTERS:
+                try:
+                    value = int(value)
+                except (TypeError, ValueError):
+                    raise FilterError(f'{param} must be an integer')
+            queryset = queryset.filter(**{lookup: value})
+    return queryset
+
+
+class _Echo:
+    """File-like object whose write() just returns the line (csv.writer target)."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(names, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(names)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(names, rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+def _chunked(lines):
+    """Join encoded lines into ~STREAM_FLUSH_SIZE byte chunks.
+
+    The first line is sent on its own so the download starts at once.
+    """
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is not None:
+        yield first.encode('utf-8')
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= STREAM_FLUSH_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _counted(rows, progress):
+    """Pass ``rows`` through, calling ``progress(done)`` every ITERATOR_CHUNK_SIZE rows."""
+    done = 0
+    for row in rows:
+        yield row
+        done += 1
+        if done % ITERATOR_CHUNK_SIZE == 0:
+            progress(done)
+
+
+def stream_chunks(queryset, columns, fmt, compress=False, progress=None):
+    """Encode ``queryset`` as CSV or NDJSON (optionally gzipped).
+
+    ``fmt`` must be a key of STREAM_FORMATS.  Returns (chunks, content_type,
+    extension) where ``chunks`` is a lazy iterable of bytes.  ``progress``,
+    if given, is called with the number of rows encoded so far as the
+    chunks are consumed.
+    """
+    content_type, extension = STREAM_FORMATS[fmt]
+    names = [name for name, _ in columns]
+    rows = queryset.order_by('id').values_list(*[lookup for _, lookup in columns]).iterator(
+        chunk_size=ITERATOR_CHUNK_SIZE
+    )
+    if progress:
+        rows = _counted(rows, progress)
+    lines = _csv_lines(names, rows) if fmt == 'csv' else _ndjson_lines(names, rows)
+    chunks = _chunked(lines)
+    if compress:
+        return _gzipped(chunks), 'application/gzip', f'{extension}.gz'
+    return chunks, content_type, extension
+
+
+def streaming_response(queryset, columns, fmt, filename, compress=False):
+    """Stream ``queryset`` as CSV or NDJSON (optionally gzipped).
+
+    ``fmt`` must be a key of STREAM_FORMATS; ``filename`` has no extension.
+    """
+    chunks, content_type, extension = stream_chunks(queryset, columns, fmt, compress)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
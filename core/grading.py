@@ -0,0 +1,389 @@
+"""Vectorized grading engine for Marks and SubjectResult.
+
+Every grading path in the app (model ``save()``, the admin, the bulk save
+endpoints and the import/calculator APIs) goes through this module so the
+thresholds live in exactly one place.  The functions take NumPy arrays (or
+anything ``np.asarray`` accepts, with ``None`` meaning "not entered") and
+grade a whole class in a single call.
+
+Scales come from the ``GradeScale`` rows of the student's class, compiled
+once per process.  Saving or deleting a ``GradeScale`` (see
+``core.signals``) bumps a version number in the shared cache; every
+process (gunicorn workers, run_jobs, send_outbox) compares it at most
+every ``SCALE_CHECK_SECONDS`` and recompiles when it changed.  Scales are
+also recompiled after ``SCALE_MAX_AGE`` seconds regardless, for edits that
+bypass the signals (``queryset.update()``, raw SQL).  Classes without rows
+use ``DEFAULT_GRADE_BOUNDARIES``.
+"""
+import time
+import uuid
+from collections import defaultdict
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+# Pass rules shared by Marks and SubjectResult
+THEORY_PASS_RATIO = 0.4
+PASS_GRADE_POINT = 2.0
+FAIL_GRADE = 'NG'
+
+# (minimum percentage, grade, grade point), highest first.  A fourth
+# element may say whether the grade is a pass; by default a grade passes
+# when its grade point reaches PASS_GRADE_POINT.
+DEFAULT_GRADE_BOUNDARIES = [
+    (90, 'A+', 4.0),
+    (80, 'A', 3.6),
+    (70, 'B+', 3.2),
+    (60, 'B', 2.8),
+    (50, 'C+', 2.4),
+    (40, 'C', 2.0),
+    (30, 'D', 1.6),
+]
+
+# Fields written back by bulk_update() after grading
+MARKS_UNIQUE_FIELDS = ['student', 'subject', 'exam_type', 'academic_year']
+MARKS_INPUT_FIELDS = ['theory_marks', 'theory_total', 'practical_marks', 'practical_total']
+MARKS_GRADED_FIELDS = ['total_marks', 'percentage', 'grade', 'grade_point', 'is_passed', 'updated_at']
+SUBJECT_RESULT_GRADED_FIELDS = [
+    'theory_grade', 'theory_grade_point', 'practical_grade', 'practical_grade_point',
+    'grade_point', 'final_grade', 'is_passed',
+]
+
+
+class CompiledScale:
+    """A grade table compiled into sorted threshold arrays.
+
+    ``lookup()`` maps scores to grades with one ``np.searchsorted`` call
+    instead of an if-chain per value.  Scores below the lowest threshold
+    get ``fail_grade``.
+    """
+
+    def __init__(self, boundaries, fail_grade=FAIL_GRADE, fail_point=0.0):
+        ordered = sorted(boundaries, key=lambda b: b[0])
+        self.thresholds = np.array([b[0] for b in ordered], dtype=float)
+        self.grades = np.array([fail_grade] + [b[1] for b in ordered], dtype=object)
+        self.points = np.array([fail_point] + [b[2] for b in ordered], dtype=float)
+        self.passing = np.array(
+            [False] + [b[3] if len(b) > 3 else b[2] >= PASS_GRADE_POINT for b in ordered], dtype=bool
+        )
+
+    @classmethod
+    def from_grade_scales(cls, grade_scales):
+        """Compile ``GradeScale`` rows (only ``min_marks`` is used as the boundary)."""
+        return cls([(g.min_marks, g.grade, g.grade_point, g.is_pass) for g in grade_scales])
+
+    def _index(self, scores):
+        return np.searchsorted(self.thresholds, np.nan_to_num(scores, nan=-np.inf), side='right')
+
+    def passed(self, scores):
+        """Return a boolean array: does each score earn a passing grade?"""
+        scores = as_float_array(scores)
+        return self.passing[self._index(scores)] & ~np.isnan(scores)
+
+    def lookup(self, scores):
+        """Return (grades, grade_points) arrays for an array of scores.
+
+        NaN scores get ``None`` grades and NaN points.
+        """
+        scores = as_float_array(scores)
+        idx = self._index(scores)
+        grades = self.grades[idx]
+        points = self.points[idx]
+        missing = np.isnan(scores)
+        if missing.any():
+            grades = grades.copy()
+            grades[missing] = None
+            points = np.where(missing, np.nan, points)
+        return grades, points
+
+
+DEFAULT_SCALE = CompiledScale(DEFAULT_GRADE_BOUNDARIES)
+
+SCALE_VERSION_KEY = 'grading:scale_version'
+SCALE_CHECK_SECONDS = 5
+SCALE_MAX_AGE = 300
+
+# class_name -> CompiledScale, filled on first use
+_scale_cache = None
+_scale_version = None
+_scale_loaded_at = 0.0
+_scale_checked_at = 0.0
+
+
+def clear_scale_cache():
+    """Forget the compiled scales here and, within SCALE_CHECK_SECONDS, in every other process."""
+    global _scale_cache
+    _scale_cache = None
+    cache.set(SCALE_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _compiled_scales():
+    global _scale_cache, _scale_version, _scale_loaded_at, _scale_checked_at
+    now = time.monotonic()
+    if _scale_cache is not None and now - _scale_checked_at >= SCALE_CHECK_SECONDS:
+        _scale_checked_at = now
+        if now - _scale_loaded_at >= SCALE_MAX_AGE or cache.get(SCALE_VERSION_KEY) != _scale_version:
+            _scale_cache = None
+    if _scale_cache is None:
+        from .models import GradeScale
+
+        # Read before loading, so a change made while loading triggers another reload
+        version = cache.get(SCALE_VERSION_KEY)
+        rows = defaultdict(list)
+        for grade_scale in GradeScale.objects.all():
+            rows[grade_scale.class_name].append(grade_scale)
+        _scale_cache = {class_name: CompiledScale.from_grade_scales(r) for class_name, r in rows.items()}
+        _scale_version, _scale_loaded_at, _scale_checked_at = version, now, now
+    return _scale_cache
+
+
+def class_scales():
+    """{class_name: CompiledScale} for every class that has GradeScale rows."""
+    return dict(_compiled_scales())
+
+
+def scale_for_class(class_name):
+    """Compiled scale for a class, falling back to DEFAULT_SCALE."""
+    return _compiled_scales().get(class_name, DEFAULT_SCALE)
+
+
+def as_float_array(values):
+    """Convert a sequence that may contain ``None`` into a float array (None -> NaN)."""
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'f':
+        return values
+    return np.array([np.nan if v is None else v for v in np.atleast_1d(values)], dtype=float)
+
+
+def _or(values, default):
+    """Vectorized ``value or default`` (None, NaN and 0 fall back to default)."""
+    values = as_float_array(values)
+    return np.where(np.isnan(values) | (values == 0), default, values)
+
+
+def _to_python(value):
+    """Convert a NumPy scalar into a plain Python value for model fields."""
+    if value is None:
+        return None
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    return value
+
+
+def get_grade_and_point(score, scale=DEFAULT_SCALE):
+    """Scalar convenience wrapper: grade a single score.
+
+    Returns ``('', None)`` when the score is missing.
+    """
+    if score is None:
+        return '', None
+    grades, points = scale.lookup([score])
+    return grades[0], float(points[0])
+
+
+def grade_marks(theory_marks, theory_total, practical_marks, practical_total, scale=DEFAULT_SCALE):
+    """Grade a batch of Marks rows.
+
+    Mirrors the rules of ``Marks``: the percentage is taken over theory +
+    practical totals, and a theory score below 40% of the theory total is
+    an automatic NG regardless of the practical.
+
+    Returns a dict of arrays: total_marks, percentage, grade, grade_point,
+    is_passed.
+    """
+    theory = np.nan_to_num(as_float_array(theory_marks))
+    practical = np.nan_to_num(as_float_array(practical_marks))
+    t_total = np.nan_to_num(as_float_array(theory_total))
+    p_total = np.nan_to_num(as_float_array(practical_total))
+
+    total_marks = theory + practical
+    possible = t_total + p_total
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentage = np.where(possible > 0, total_marks / np.where(possible > 0, possible, 1) * 100, 0.0)
+
+    theory_failed = theory < _or(theory_total, 100) * THEORY_PASS_RATIO
+    grades, points = scale.lookup(percentage)
+    grades = np.where(theory_failed, FAIL_GRADE, grades)
+    points = np.where(theory_failed, 0.0, points)
+
+    return {
+        'total_marks': total_marks,
+        'percentage': percentage,
+        'grade': grades,
+        'grade_point': points,
+        'is_passed': ~theory_failed & scale.passed(percentage),
+    }
+
+
+def grade_subject_results(theory_marks, theory_total, practical_marks, scale=DEFAULT_SCALE):
+    """Grade a batch of SubjectResult rows.
+
+    Theory and practical marks are graded on their own, the combined grade
+    point is their mean, and the final grade is looked up from the grade
+    point on a percentage scale (gp * 25); the subject passes when that
+    grade is a pass on the scale, as for Marks.  Failing theory makes
+    every component NG.
+    """
+    theory = as_float_array(theory_marks)
+    practical = as_float_array(practical_marks)
+
+    theory_failed = np.nan_to_num(theory) < _or(theory_total, 100) * THEORY_PASS_RATIO
+    theory_grade, theory_point = scale.lookup(theory)
+    practical_grade, practical_point = scale.lookup(practical)
+
+    grade_point = np.where(np.isnan(practical_point), theory_point, (theory_point + practical_point) / 2)
+    final_score = grade_point * 25
+    final_grade, _ = scale.lookup(final_score)
+
+    fail_grades = np.full(theory.shape, FAIL_GRADE, dtype=object)
+    return {
+        'theory_grade': np.where(theory_failed, fail_grades, theory_grade),
+        'theory_grade_point': np.where(theory_failed, 0.0, theory_point),
+        'practical_grade': np.where(theory_failed, fail_grades, practical_grade),
+        'practical_grade_point': np.where(theory_failed, 0.0, practical_point),
+        'grade_point': np.where(theory_failed, 0.0, grade_point),
+        'final_grade': np.where(theory_failed, fail_grades, final_grade),
+        'is_passed': ~theory_failed & scale.passed(final_score),
+    }
+
+
+def _assign(objs, graded):
+    for i, obj in enumerate(objs):
+        for field, values in graded.items():
+            setattr(obj, field, _to_python(values[i]))
+    return objs
+
+
+def _related_classes(objs, relation, model, class_field):
+    """Class name of each object, via ``relation`` (loaded or fetched in one query)."""
+    missing = {getattr(o, f'{relation}_id') for o in objs if not getattr(type(o), relation).is_cached(o)}
+    fetched = dict(model.objects.filter(id__in=missing).values_list('id', class_field)) if missing else {}
+    return [
+        getattr(getattr(o, relation), class_field) if getattr(type(o), relation).is_cached(o)
+        else fetched.get(getattr(o, f'{relation}_id'))
+        for o in objs
+    ]
+
+
+def _grade_by_scale(objs, class_names, scale, grade):
+    """Run ``grade(objs, scale)`` once per distinct scale and assign the results."""
+    if scale is not None:
+        return _assign(objs, grade(objs, scale))
+    groups = defaultdict(list)
+    for obj, class_name in zip(objs, class_names):
+        groups[class_name].append(obj)
+    for class_name, group in groups.items():
+        _assign(group, grade(group, scale_for_class(class_name)))
+    return objs
+
+
+def apply_marks_grades(marks, scale=None, class_names=None):
+    """Grade a list of Marks instances in place (no database writes).
+
+    Without ``scale`` each row uses the scale of its student's class;
+    ``class_names`` (aligned with ``marks``) saves looking the classes up.
+    """
+    from .models import Student
+
+    marks = list(marks)
+    if not marks:
+        return marks
+    if scale is None and class_names is None:
+        class_names = _related_classes(marks, 'student', Student, 'student_class')
+
+    def grade(rows, row_scale):
+        return grade_marks(
+            [m.theory_marks for m in rows],
+            [m.theory_total for m in rows],
+            [m.practical_marks for m in rows],
+            [m.practical_total for m in rows],
+            scale=row_scale,
+        )
+
+    now = timezone.now()
+    for m in marks:
+        m.updated_at = now
+    return _grade_by_scale(marks, class_names, scale, grade)
+
+
+def apply_subject_result_grades(subject_results, scale=None, class_names=None):
+    """Grade a list of SubjectResult instances in place (no database writes).
+
+    Without ``scale`` each row uses the scale of its result's class.
+    """
+    from .models import Result
+
+    subject_results = list(subject_results)
+    if not subject_results:
+        return subject_results
+    if scale is None and class_names is None:
+        class_names = _related_classes(subject_results, 'result', Result, 'student_class')
+
+    def grade(rows, row_scale):
+        return grade_subject_results(
+            [s.theory_marks for s in rows],
+            [s.theory_total for s in rows],
+            [s.practical_marks for s in rows],
+            scale=row_scale,
+        )
+
+    return _grade_by_scale(subject_results, class_names, scale, grade)
+
+
+def regrade_marks(queryset, batch_size=500):
+    """Recompute grades for every Marks row in ``queryset`` with bulk writes.
+
+    Returns the number of rows updated.
+    """
+    from . import analytics, result_documents
+
+    marks = apply_marks_grades(queryset.select_related('student'))
+    if marks:
+        queryset.model.objects.bulk_update(marks, MARKS_GRADED_FIELDS, batch_size=batch_size)
+        # bulk_update() does not send post_save
+        analytics.marks_changed(marks)
+        result_documents.marks_changed(marks)
+    return len(marks)
+
+
+def regrade_subject_results(queryset, batch_size=500):
+    """Recompute grades for every SubjectResult row in ``queryset`` with bulk writes."""
+    subject_results = apply_subject_result_grades(queryset.select_related('result'))
+    if subject_results:
+        queryset.model.objects.bulk_update(subject_results, SUBJECT_RESULT_GRADED_FIELDS, batch_size=batch_size)
+    return len(subject_results)
+
+
+def save_marks_bulk(to_create, to_update, batch_size=500):
+    """Grade and persist Marks instances with one bulk_create and one bulk_update.
+
+    ``to_create`` are unsaved instances, ``to_update`` are existing rows
+    whose marks fields have been changed in memory.
+    """
+    from django.db import transaction
+    from . import analytics, result_documents
+    from .models import Marks
+
+    to_create = apply_marks_grades(to_create)
+    to_update = apply_marks_grades(to_update)
+    fields = MARKS_INPUT_FIELDS + MARKS_GRADED_FIELDS
+    with transaction.atomic():
+        if to_create:
+            # ON CONFLICT DO UPDATE, so a row inserted concurrently by another
+            # request is overwritten instead of raising IntegrityError
+            Marks.objects.bulk_create(
+                to_create,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=MARKS_UNIQUE_FIELDS,
+                update_fields=fields,
+            )
+        if to_update:
+            Marks.objects.bulk_update(to_update, fields, batch_size=batch_size)
+        # Bulk writes do not send post_save
+        # Positions follow Result.gpa; build_results re-ranks once the results are rebuilt
+        analytics.marks_changed(to_create + to_update)
+        result_documents.marks_changed(to_create + to_update)
+    return to_create, to_update
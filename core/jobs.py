@@ -0,0 +1,232 @@
+"""Database-backed background jobs.
+
+Views ``enqueue()`` a ``Job`` and return its id straight away; one or more
+``python manage.py run_jobs`` workers claim queued jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED`` (so workers never pick the same
+job), run the registered handler and store its result.  Clients poll
+``api/jobs/<id>/`` and download any generated file from
+``api/jobs/<id>/download/``.
+
+A handler is ``handler(job, progress) -> result`` where ``result`` is a
+JSON-serialisable dict and ``progress(done, total=None, message='')``
+records progress (and doubles as the worker's heartbeat).  Handlers that
+produce a file call ``attach_output()``.
+
+A worker that is slow rather than dead can have its job requeued and
+claimed by another worker.  Every write a claim makes is filtered on that
+claim (worker and attempt), so the old worker can no longer change the
+job: its next ``progress()`` or ``attach_output()`` raises
+``JobTakenOver``, which stops the handler, and its final status is
+dropped.
+"""
+import io
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+class JobTakenOver(Exception):
+    """The job was requeued (or failed) while this worker was still running it."""
+
+
+def handler(kind):
+    """Register the decorated function as the handler for ``kind`` jobs."""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload=None, user=None, input_name='', input_data=None):
+    from .models import Job
+
+    if kind not in _handlers:
+        raise ValueError(f'Unknown job kind: {kind}')
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        created_by=user if user is not None and user.is_authenticated else None,
+        input_name=input_name,
+        input_data=input_data,
+    )
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker):
+    """Mark the oldest queued job as running and return it (None if the queue is empty)."""
+    from .models import Job
+
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        now = timezone.now()
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, worker=worker, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1
+        )
+    job.refresh_from_db()
+    return job
+
+
+def _owned(job):
+    """The job's row while this claim of it still runs it."""
+    from .models import Job
+
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker, attempts=job.attempts)
+
+
+def report_progress(job, done, total=None, message=''):
+    fields = {'progress': done, 'heartbeat_at': timezone.now()}
+    if total is not None:
+        fields['total'] = total
+    if message:
+        fields['message'] = message[:255]
+    if not _owned(job).update(**fields):
+        raise JobTakenOver(f'Job {job.pk} was taken over by another worker')
+
+
+def attach_output(job, name, content_type, data):
+    if not _owned(job).update(output_name=name, output_content_type=content_type, output_data=data):
+        raise JobTakenOver(f'Job {job.pk} was taken over by another worker')
+
+
+def run(job):
+    """Run a claimed job and record the outcome; returns True on success."""
+    from .models import Job
+
+    try:
+        result = _handlers[job.kind](job, partial(report_progress, job))
+    except JobTakenOver:
+        logger.warning('Job %s (%s) was taken over by another worker; stopped', job.pk, job.kind)
+        return False
+    except Exception:
+        logger.exception('Job %s (%s) failed', job.pk, job.kind)
+        _owned(job).update(status=Job.FAILED, error=traceback.format_exc(), finished_at=timezone.now())
+        return False
+    if not _owned(job).update(status=Job.SUCCEEDED, result=result, finished_at=timezone.now()):
+        logger.warning('Job %s (%s) was taken over by another worker; result dropped', job.pk, job.kind)
+        return False
+    return True
+
+
+def requeue_stale(stale_after, max_attempts):
+    """Requeue running jobs whose worker has not reported for ``stale_after`` seconds.
+
+    Jobs that already had ``max_attempts`` are failed instead.  Returns
+    (requeued, failed).
+    """
+    from .models import Job
+
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=timezone.now() - timedelta(seconds=stale_after))
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=Job.FAILED, error='Worker stopped responding', finished_at=timezone.now()
+    )
+    requeued = stale.update(status=Job.QUEUED, worker='')
+    return requeued, failed
+
+
+# ---------------------------------------------------------------- handlers
+
+@handler('import_students')
+def import_students(job, progress):
+    from . import student_import
+
+    create_accounts = job.payload.get('create_accounts', False)
+    upload = io.BytesIO(bytes(job.input_data))
+    if job.input_name.endswith('.csv'):
+        summary, errors = {}, []
+        for summary in student_import.import_csv_chunks(upload, create_accounts=create_accounts):
+            if 'error' in summary:
+                raise ValueError(summary['error'])
+            errors += summary['errors']
+            progress(summary['rows'], message=f"{summary['imported']} imported, {summary['failed']} failed")
+        return {**{key: summary.get(key, 0) for key in ('rows', 'imported', 'failed')}, 'errors': errors}
+
+    import pandas as pd
+    df = pd.read_excel(upload, dtype=str).dropna(how='all')
+    df.columns = [str(col).strip() for col in df.columns]
+    missing_columns = [col for col in student_import.REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f'Missing required columns: {", ".join(missing_columns)}')
+    results = student_import.import_students(df, create_accounts=create_accounts)
+    errors = [r for r in results if r['status'] == 'error']
+    progress(len(results), len(results))
+    return {'rows': len(results), 'imported': len(results) - len(errors), 'failed': len(errors), 'errors': errors}
+
+
+@handler('send_result_notifications')
+def send_result_notifications(job, progress):
+    from . import notifications
+
+    results = notifications.send_result_notifications(progress=progress, **job.payload)
+    success_count = sum(1 for r in results if r['status'] == 'success')
+    return {
+        'total_students': len(results),
+        'success_count': success_count,
+        'error_count': len(results) - success_count,
+        'results': results,
+    }
+
+
+@handler('export')
+def export(job, progress):
+    from . import exports
+    from .models import Marks, Result
+
+    datasets = {
+        'marks': (Marks, exports.MARKS_EXPORT_COLUMNS, exports.MARKS_EXPORT_FILTERS),
+        'results': (Result, exports.RESULT_EXPORT_COLUMNS, exports.RESULT_EXPORT_FILTERS),
+    }
+    dataset = job.payload['dataset']
+    model, columns, filters = datasets[dataset]
+    queryset = exports.filter_queryset(model.objects.all(), job.payload.get('params', {}), filters)
+    total = queryset.count()
+    progress(0, total)
+    # Reported every few thousand rows so a long export keeps its heartbeat
+    chunks, content_type, extension = exports.stream_chunks(
+        queryset, columns, job.payload['fmt'], job.payload.get('compress', False), progress=progress
+    )
+    attach_output(job, f'{dataset}_export.{extension}', content_type, b''.join(chunks))
+    progress(total, total)
+    return {'rows': total}
+
+
+@handler('class_result_cards')
+def class_result_cards(job, progress):
+    from django.conf import settings
+
+    from . import result_cards
+    from .models import Marks
+
+    p = job.payload
+    cards = result_cards.class_cards(Marks.objects.filter(
+        student__student_class=p['class'], exam_type=p['exam_type'], academic_year=p['academic_year']
+    ))
+    progress(0, len(cards))
+    filename = f"result_cards_{p['class']}_{p['exam_type']}_{p['academic_year']}"
+    args = (cards, p['exam_type'], p['academic_year'], p['date'], settings.RESULT_CARD_WORKERS, progress)
+    if p.get('mode') == 'zip':
+        attach_output(job, f'{filename}.zip', 'application/zip', b''.join(result_cards.zip_stream(*args)))
+    else:
+        attach_output(job, f'{filename}.pdf', 'application/pdf', result_cards.merged_pdf(*args))
+    progress(len(cards), len(cards))
+    return {'cards': len(cards)}
@@ -0,0 +1,74 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.template.loader import render_to_string
+
+from core import notifications
+from core.models import Marks, Student
+
+
+class Command(BaseCommand):
+    help = 'Time rendering result notification emails: per-message template loading vs templates compiled once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Messages rendered per strategy')
+        parser.add_argument('--subjects', type=int, default=8, help='Marks per student')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per strategy; the fastest is reported')
+
+    def contexts(self, count, subjects):
+        """Per-student contexts built from unsaved model instances, so no database is needed."""
+        marks = [
+            Marks(theory_marks=60 + i, theory_total=75, practical_marks=20, practical_total=25)
+            for i in range(subjects)
+        ]
+        return [
+            notifications.notification_context(
+                Student(full_name=f'Student {i}', symbol_number=f'{i:08d}', email=f'student{i}@example.com'),
+                marks, 'Final Term', '2024-25', 'student', 'https://example.com'
+            )
+            for i in range(count)
+        ]
+
+    def handle(self, *args, **options):
+        contexts = self.contexts(options['count'], options['subjects'])
+        engine = engines['django']
+        text_template, html_template = notifications.notification_templates()
+        sources = [Path(t.origin.name).read_text(encoding='utf-8') for t in (text_template, html_template)]
+
+        def compile_each_time(context):
+            # What every message costs without the cached template loader
+            return [engine.from_string(source).render(context) for source in sources]
+
+        def render_to_string_each_time(context):
+            # The previous code path: a loader lookup for both templates per message
+            return [render_to_string(name, context)
+                    for name in (notifications.TEXT_TEMPLATE, notifications.HTML_TEMPLATE)]
+
+        def precompiled(context):
+            return [text_template.render(context), html_template.render(context)]
+
+        strategies = [
+            ('compile per message', compile_each_time),
+            ('render_to_string per message', render_to_string_each_time),
+            ('compiled once per batch', precompiled),
+        ]
+        per_thousand = {}
+        for name, render in strategies:
+            best = float('inf')
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                for context in contexts:
+                    render(context)
+                best = min(best, time.perf_counter() - started)
+            per_thousand[name] = best / len(contexts) * 1000
+            self.stdout.write(f'{name:32} {per_thousand[name] * 1000:8.1f} ms per 1,000 messages')
+
+        baseline = per_thousand['render_to_string per message']
+        self.stdout.write(self.style.SUCCESS(
+            f"Compiled once per batch: {baseline / per_thousand['compiled once per batch']:.2f}x faster than "
+            f"render_to_string per message, "
+            f"{per_thousand['compile per message'] / per_thousand['compiled once per batch']:.2f}x faster than "
+            f"compiling per message"
+        ))
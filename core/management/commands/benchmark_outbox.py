@@ -0,0 +1,111 @@
+import asyncio
+import random
+import socket
+import time
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from core import outbox
+from core.models import OutboundEmail
+
+try:
+    from aiosmtpd.controller import Controller
+    AIOSMTPD_AVAILABLE = True
+except ImportError:
+    AIOSMTPD_AVAILABLE = False
+
+BENCHMARK_KIND = 'benchmark'
+
+
+class _StandIn:
+    """aiosmtpd handler that accepts mail after ``latency`` seconds, refusing ``fail_rate`` of it."""
+
+    def __init__(self, latency, fail_rate):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            return '451 4.3.0 Temporary failure (simulated)'
+        self.received += 1
+        return '250 OK'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark outbox delivery (messages/sec) against a local aiosmtpd SMTP stand-in'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500, help='Emails to queue')
+        parser.add_argument('--rate', type=float, default=0, help='Token bucket rate, messages/sec (0 = unlimited)')
+        parser.add_argument('--burst', type=int, default=10, help='Token bucket burst size')
+        parser.add_argument('--latency', type=float, default=0, help='Seconds the stand-in takes per message')
+        parser.add_argument('--fail-rate', type=float, default=0, help='Fraction of messages the stand-in refuses')
+        parser.add_argument('--size', type=int, default=20000, help='Approximate HTML body size in bytes')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark emails in the outbox')
+
+    def handle(self, *args, **options):
+        if not AIOSMTPD_AVAILABLE:
+            raise CommandError('aiosmtpd is not installed. Install it with: pip install -r requirements-dev.txt')
+
+        handler = _StandIn(options['latency'], options['fail_rate'])
+        controller = Controller(handler, hostname='127.0.0.1', port=_free_port())
+        controller.start()
+        smtp = {
+            'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': controller.hostname,
+            'EMAIL_PORT': controller.port,
+            'EMAIL_USE_TLS': False,
+            'EMAIL_USE_SSL': False,
+            'EMAIL_HOST_USER': '',
+            'EMAIL_HOST_PASSWORD': '',
+            # Retry refused messages straight away so the run measures throughput
+            'OUTBOX_RETRY_BASE': 0,
+        }
+        try:
+            with override_settings(**smtp):
+                self.run(options, handler)
+        finally:
+            controller.stop()
+            if not options['keep']:
+                OutboundEmail.objects.filter(kind=BENCHMARK_KIND).delete()
+
+    def run(self, options, handler):
+        html = '<p>' + 'x' * options['size'] + '</p>'
+        messages = []
+        for i in range(options['count']):
+            message = EmailMultiAlternatives(
+                subject=f'Outbox benchmark {i}', body='Benchmark', from_email='benchmark@localhost',
+                to=[f'student{i}@example.com'],
+            )
+            message.attach_alternative(html, 'text/html')
+            messages.append(message)
+
+        started = time.perf_counter()
+        rows = outbox.queue(messages, kind=BENCHMARK_KIND, exam_type=BENCHMARK_KIND)
+        queued = time.perf_counter() - started
+        self.stdout.write(f'Queued {len(rows)} emails in {queued:.2f}s')
+
+        bucket = outbox.TokenBucket(options['rate'], options['burst'])
+        started = time.perf_counter()
+        # Only this run's emails: real ones in the outbox are left for send_outbox
+        counts = outbox.drain(bucket, connection=get_connection(), kind=BENCHMARK_KIND)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"Sent {counts['sent']}, retrying {counts['retrying']}, dead {counts['dead']} "
+            f"({handler.received} accepted by the stand-in)"
+        )
+        self.stdout.write(self.style.SUCCESS(f"{counts['sent'] / elapsed:.1f} messages/sec over {elapsed:.2f}s"))
+        for metrics in outbox.delivery_metrics(kind=BENCHMARK_KIND):
+            self.stdout.write(str(metrics))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core import pipeline
+
+
+class Command(BaseCommand):
+    help = 'Build Result and SubjectResult rows from the Marks of an exam'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam-type', default='Final Term', help='Exam type (default: Final Term)')
+        parser.add_argument('--academic-year', default='2024-25', help='Academic year (default: 2024-25)')
+        parser.add_argument('--class', dest='student_class', help='Only build results for this class')
+        parser.add_argument('--full', action='store_true', help='Rebuild every student, not only those with changed marks')
+
+    def handle(self, *args, **options):
+        stats = pipeline.build_results(
+            options['exam_type'],
+            options['academic_year'],
+            student_class=options['student_class'],
+            full=options['full'],
+        )
+        if not stats['students']:
+            self.stdout.write(self.style.SUCCESS('All results are up to date.'))
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Built {stats['students']} results ({stats['created']} created, {stats['updated']} updated) "
+                f"with {stats['subjects']} subject rows"
+            )
+        )
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.models import Marks, Result, StudentResultDocument
+
+
+class Command(BaseCommand):
+    help = 'Print query plans (EXPLAIN ANALYZE on PostgreSQL) for the hot result and marks lookups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam-type', help='Exam type to plan against (default: most common in Marks)')
+        parser.add_argument('--academic-year', help='Academic year to plan against (default: most common in Marks)')
+        parser.add_argument('--no-analyze', action='store_true', help='Plan only, do not execute the queries')
+
+    def sample_values(self, options):
+        """Pick real filter values so the plans reflect the seeded data."""
+        exam = Marks.objects.values_list('exam_type', 'academic_year').order_by('-id').first() or ('Final Term', '2024-25')
+        result = Result.objects.filter(is_published=True).values_list('roll_number', 'student_class').first() or ('1', '10')
+        marks = Marks.objects.values_list('subject_id', 'student__student_class').first() or (1, '10')
+        return {
+            'exam_type': options['exam_type'] or exam[0],
+            'academic_year': options['academic_year'] or exam[1],
+            'roll_number': result[0],
+            'result_class': result[1],
+            'subject_id': marks[0],
+            'marks_class': marks[1],
+            'symbol_number': StudentResultDocument.objects.values_list('symbol_number', flat=True).first() or '1',
+        }
+
+    def hot_queries(self, v):
+        published = Result.objects.filter(is_published=True)
+        exam_marks = Marks.objects.filter(exam_type=v['exam_type'], academic_year=v['academic_year'])
+        return [
+            ('ResultSearch by roll number', published.filter(roll_number=v['roll_number']).order_by('-uploaded_at')),
+            ('ResultSearch by class and exam', published.filter(
+                student_class=v['result_class'], exam_type=v['exam_type'], academic_year=v['academic_year'],
+            ).order_by('-uploaded_at')),
+            ('ResultSearch latest published', published.order_by('-uploaded_at')[:50]),
+            ('student_result_api document', StudentResultDocument.objects.filter(symbol_number=v['symbol_number'])),
+            ('subject_marks_api', exam_marks.filter(subject_id=v['subject_id'])
+                .select_related('student', 'subject').order_by('student__full_name')),
+            ('MarksListCreate by exam', exam_marks),
+            ('Marks export', exam_marks.select_related('student', 'subject').order_by('student__full_name')),
+            ('Class marks matrix', exam_marks.filter(student__student_class=v['marks_class']).order_by('subject__name')),
+        ]
+
+    def handle(self, *args, **options):
+        analyze = connection.vendor == 'postgresql' and not options['no_analyze']
+        values = self.sample_values(options)
+        self.stdout.write(f"Backend: {connection.vendor}; filters: {values}")
+
+        for name, queryset in self.hot_queries(values):
+            self.stdout.write('')
+            self.stdout.write(self.style.SUCCESS(f'== {name}'))
+            self.stdout.write(str(queryset.query))
+            if analyze:
+                plan = queryset.explain(analyze=True, buffers=True)
+            else:
+                plan = queryset.explain()
+            self.stdout.write(plan)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from core import result_snapshot
+from core.models import Result
+
+
+class Command(BaseCommand):
+    help = (
+        'Write published results as sharded static JSON files under STATIC_ROOT. '
+        'Run at deploy time, before the web process starts (build.sh does): WhiteNoise '
+        'serves files rewritten under it truncated or stale. The files are a point-in-time '
+        'copy until the next deploy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam-type', help='Only export students with a published result for this exam type')
+        parser.add_argument('--academic-year', help='Only export students with a published result for this year')
+        parser.add_argument('--full', action='store_true', help='Rewrite every file, not only changed ones')
+
+    def handle(self, *args, **options):
+        results = Result.objects.filter(is_published=True)
+        if options['exam_type']:
+            results = results.filter(exam_type=options['exam_type'])
+        if options['academic_year']:
+            results = results.filter(academic_year=options['academic_year'])
+
+        written, unchanged = result_snapshot.export(results, full=options['full'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Snapshot written for {written} students ({unchanged} unchanged)')
+        )
+        if written:
+            self.stdout.write('Start (or restart) the web process so WhiteNoise indexes the new files.')
+        self.stdout.write(self.style.WARNING(
+            'The snapshot does not follow later marks changes; re-run this command after editing published results.'
+        ))
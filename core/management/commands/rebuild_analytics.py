@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core import analytics
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ResultAnalytics and SubjectPerformance rollups from scratch'
+
+    def handle(self, *args, **options):
+        result_buckets, subject_buckets = analytics.rebuild_all()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rebuilt {result_buckets} result analytics and {subject_buckets} subject performance rows'
+            )
+        )
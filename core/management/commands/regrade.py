@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core import regrade
+
+
+class Command(BaseCommand):
+    help = 'Regrade Marks and SubjectResult rows in the database after grading rules change'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--academic-year', help='Only regrade this academic year')
+        parser.add_argument('--exam-type', help='Only regrade this exam type')
+
+    def handle(self, *args, **options):
+        marks, subject_results = regrade.regrade_exam(
+            academic_year=options['academic_year'],
+            exam_type=options['exam_type'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Regraded {marks} marks and {subject_results} subject results')
+        )
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (imports, exports, bulk emails, result card batches)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=1800,
+                            help='Requeue running jobs whose worker has not reported for this many seconds')
+        parser.add_argument('--max-attempts', type=int, default=3, help='Fail a job after this many stale runs')
+
+    def handle(self, *args, **options):
+        worker = jobs.worker_name()
+        self.stdout.write(f'Worker {worker} started')
+        while True:
+            close_old_connections()
+            requeued, failed = jobs.requeue_stale(options['stale_after'], options['max_attempts'])
+            if requeued or failed:
+                self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale jobs, failed {failed}'))
+
+            job = jobs.claim(worker)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Running {job}')
+            if jobs.run(job):
+                self.stdout.write(self.style.SUCCESS(f'Finished {job.kind} #{job.pk}'))
+            else:
+                self.stdout.write(self.style.ERROR(f'Failed {job.kind} #{job.pk}'))
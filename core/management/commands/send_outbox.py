@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import outbox
+
+
+class Command(BaseCommand):
+    help = 'Send queued emails from the outbox, rate limited, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when no email is due instead of polling')
+        parser.add_argument('--rate', type=float, help='Messages per second (default: OUTBOX_RATE)')
+        parser.add_argument('--burst', type=int, help='Messages that may go out back to back (default: OUTBOX_BURST)')
+        parser.add_argument('--batch-size', type=int, default=100, help='Emails claimed per query')
+        parser.add_argument('--poll-interval', type=float, default=10.0, help='Seconds to sleep when no email is due')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help="Requeue emails left 'sending' for this many seconds by a stopped worker")
+
+    def handle(self, *args, **options):
+        # One bucket for the life of the worker, so polling does not reset the rate
+        bucket = outbox.TokenBucket(options['rate'] or settings.OUTBOX_RATE, options['burst'] or settings.OUTBOX_BURST)
+        while True:
+            close_old_connections()
+            requeued = outbox.requeue_stale(options['stale_after'])
+            if requeued:
+                self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale emails'))
+
+            counts = outbox.drain(bucket, options['batch_size'])
+            if any(counts.values()):
+                self.stdout.write(self.style.SUCCESS(
+                    f"Sent {counts['sent']} emails, {counts['retrying']} to retry, {counts['dead']} dead"
+                ))
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0047_auto_20250825_1731'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='marks_synced_at',
+            field=models.DateTimeField(blank=True, help_text='When this result was last built from Marks', null=True),
+        ),
+    ]
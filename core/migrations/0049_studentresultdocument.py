@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0048_result_marks_synced_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentResultDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol_number', models.CharField(max_length=30, unique=True)),
+                ('body', models.TextField()),
+                ('etag', models.CharField(max_length=64)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='result_document', to='core.student')),
+            ],
+        ),
+    ]
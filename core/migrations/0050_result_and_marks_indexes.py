@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0049_studentresultdocument'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='marks',
+            index=models.Index(fields=['exam_type', 'academic_year', 'subject'], name='marks_exam_subject_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['roll_number', '-uploaded_at'], name='result_pub_roll_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['student_class', 'exam_type', 'academic_year', '-uploaded_at'], name='result_pub_class_exam_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-uploaded_at'], name='result_pub_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['exam_type', 'academic_year', 'student_class'], name='result_exam_class_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+def restart_sequences(apps, schema_editor):
+    # Started past the highest stored number, the old row may already be
+    # beyond 8 digits; it is recreated at the first free block on next use
+    apps.get_model('core', 'SymbolNumberSequence').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0053_symbolnumbersequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='symbolnumbersequence',
+            name='block_end',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(restart_sequences, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.utils import timezone
 import uuid
 import base36
 
+from . import grading
+
 # Import website content models
 from .models_website_content import AboutPage, CoreValue, Achievement, ContactInfo, SocialMedia, Facility, Banner, WelcomeMessage, SchoolInfo
 
@@ -53,6 +56,32 @@ class Subject(models.Model):
                 counter += 1
         super().save(*args, **kwargs)
 
+    @classmethod
+    def bulk_get_or_create(cls, names, credit_hour=4.0):
+        """Return {name: Subject} for ``names``, creating the missing ones in bulk.
+
+        Codes for new subjects follow the same rule as ``save()`` but are
+        resolved against one query of existing codes instead of one query
+        per attempt.
+        """
+        names = list(dict.fromkeys(names))
+        subjects = {s.name: s for s in cls.objects.filter(name__in=names)}
+        missing = [name for name in names if name not in subjects]
+        if missing:
+            taken = set(cls.objects.exclude(code__isnull=True).values_list('code', flat=True))
+            new_subjects = []
+            for name in missing:
+                base_code = name.upper()[:3]
+                code, counter = base_code, 0
+                while code in taken:
+                    counter += 1
+                    code = f"{base_code}{counter}"
+                taken.add(code)
+                new_subjects.append(cls(name=name, code=code, credit_hour=credit_hour))
+            cls.objects.bulk_create(new_subjects, ignore_conflicts=True)
+            subjects.update({s.name: s for s in cls.objects.filter(name__in=missing)})
+        return subjects
+
 class Teacher(models.Model):
     username = models.CharField(max_length=50, unique=True)
     password = models.CharField(max_length=128)  # plain text for now, can be hashed later
@@ -189,10 +218,23 @@ class Result(models.Model):
     class_position = models.PositiveIntegerField(null=True, blank=True)
     total_students = models.PositiveIntegerField(null=True, blank=True)
     percentage = models.FloatField(null=True, blank=True)
+    marks_synced_at = models.DateTimeField(null=True, blank=True, help_text='When this result was last built from Marks')
     
     class Meta:
         unique_together = ('roll_number', 'student_class', 'exam_type', 'academic_year')
         ordering = ['-uploaded_at']
+        indexes = [
+            # ResultSearch: published results by roll number / class + exam, newest first
+            models.Index(fields=['roll_number', '-uploaded_at'], condition=models.Q(is_published=True), name='result_pub_roll_idx'),
+            models.Index(
+                fields=['student_class', 'exam_type', 'academic_year', '-uploaded_at'],
+                condition=models.Q(is_published=True),
+                name='result_pub_class_exam_idx',
+            ),
+            models.Index(fields=['-uploaded_at'], condition=models.Q(is_published=True), name='result_pub_recent_idx'),
+            # Whole-exam passes (build_results, ranking, analytics)
+            models.Index(fields=['exam_type', 'academic_year', 'student_class'], name='result_exam_class_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student_name} - {self.student_class} - {self.exam_type}"
@@ -254,59 +296,13 @@ class SubjectResult(models.Model):
         return f"{self.result.student_name} - {self.subject_name}"
 
     def save(self, *args, **kwargs):
-        # Check if theory marks are below pass mark (40% of theory total)
-        theory_pass_mark = (self.theory_total or 100) * 0.4  # 40% pass mark
-        theory_failed = (self.theory_marks or 0) < theory_pass_mark
-        
-        # If theory marks are below pass mark, mark entire result as NG
-        if theory_failed:
-            self.theory_grade = 'NG'
-            self.theory_grade_point = 0.0
-            self.practical_grade = 'NG'
-            self.practical_grade_point = 0.0
-            self.grade_point = 0.0
-            self.final_grade = 'NG'
-            self.is_passed = False
-        else:
-            # Auto-calculate grades and points normally
-            if self.theory_marks is not None:
-                self.theory_grade, self.theory_grade_point = self.get_grade_and_point(self.theory_marks)
-            
-            if self.practical_marks is not None:
-                self.practical_grade, self.practical_grade_point = self.get_grade_and_point(self.practical_marks)
-            
-            # Calculate combined grade point
-            if self.theory_grade_point is not None and self.practical_grade_point is not None:
-                self.grade_point = (self.theory_grade_point + self.practical_grade_point) / 2
-            elif self.theory_grade_point is not None:
-                self.grade_point = self.theory_grade_point
-            elif self.practical_grade_point is not None:
-                self.grade_point = self.practical_grade_point
-            
-            # Set final grade based on combined grade point
-            if self.grade_point is not None:
-                self.final_grade, _ = self.get_grade_and_point(self.grade_point * 25)  # Convert to percentage scale
-                self.is_passed = self.grade_point >= 2.0
-            
+        # Theory below 40% of theory total makes the whole subject NG
+        grading.apply_subject_result_grades([self])
         super().save(*args, **kwargs)
     
     def get_grade_and_point(self, marks):
         """Get grade and grade point based on marks"""
-        if marks >= 90:
-            return 'A+', 4.0
-        if marks >= 80:
-            return 'A', 3.6
-        if marks >= 70:
-            return 'B+', 3.2
-        if marks >= 60:
-            return 'B', 2.8
-        if marks >= 50:
-            return 'C+', 2.4
-        if marks >= 40:
-            return 'C', 2.0
-        if marks >= 30:
-            return 'D', 1.6
-        return 'NG', 0.0
+        return grading.get_grade_and_point(marks, grading.scale_for_class(self.result.student_class))
 
 class Notice(models.Model):
     title = models.CharField(max_length=200)
@@ -357,20 +353,20 @@ class Student(models.Model):
         return f"{self.full_name} ({self.symbol_number})"
     
     def save(self, *args, **kwargs):
-        if not self.symbol_number:
-            self.symbol_number = self.generate_symbol_number()
-        super().save(*args, **kwargs)
+        from . import symbol_numbers
+        with transaction.atomic():
+            if self._state.adding and self.symbol_number:
+                # Before the insert and in its transaction: the sequence row stays
+                # locked until commit, so nobody can be handed this number meanwhile
+                symbol_numbers.observe([self.symbol_number])
+            elif not self.symbol_number:
+                self.symbol_number = self.generate_symbol_number()
+            super().save(*args, **kwargs)
     
     def generate_symbol_number(self):
-        """Generate a unique 8-digit numeric symbol number"""
-        import random
-        while True:
-            # Generate 8-digit numeric number
-            symbol = str(random.randint(10000000, 99999999))
-            
-            # Check if it already exists
-            if not Student.objects.filter(symbol_number=symbol).exists():
-                return symbol
+        """Allocate the next unique numeric symbol number"""
+        from . import symbol_numbers
+        return symbol_numbers.allocate()
 
 class Marks(models.Model):
     """Model to store individual subject marks for students"""
@@ -407,55 +403,33 @@ class Marks(models.Model):
     class Meta:
         unique_together = ('student', 'subject', 'exam_type', 'academic_year')
         ordering = ['student__full_name', 'subject__name']
+        indexes = [
+            # subject_marks_api, MarksListCreate and the exports filter on exam + year (+ subject)
+            models.Index(fields=['exam_type', 'academic_year', 'subject'], name='marks_exam_subject_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.full_name} - {self.subject.name} - {self.exam_type}"
     
     def save(self, *args, **kwargs):
-        # Calculate total marks
-        self.total_marks = (self.theory_marks or 0) + (self.practical_marks or 0)
-        
-        # Calculate percentage
-        total_possible = (self.theory_total or 0) + (self.practical_total or 0)
-        if total_possible > 0:
-            self.percentage = (self.total_marks / total_possible) * 100
-        else:
-            self.percentage = 0
-        
-        # Check if theory marks are below pass mark (40% of theory total)
-        theory_pass_mark = (self.theory_total or 100) * 0.4  # 40% pass mark
-        theory_failed = (self.theory_marks or 0) < theory_pass_mark
-        
-        # If theory marks are below pass mark, mark entire result as NG
-        if theory_failed:
-            self.grade = 'NG'
-            self.grade_point = 0.0
-            self.is_passed = False
-        else:
-            # Calculate grade and grade point normally
-            self.grade, self.grade_point = self.get_grade_and_point(self.percentage)
-            # Determine if passed
-            self.is_passed = self.grade_point >= 2.0
-        
+        # Totals, percentage, grade and pass flag are computed by the grading engine
+        grading.apply_marks_grades([self])
         super().save(*args, **kwargs)
     
     def get_grade_and_point(self, percentage):
         """Get grade and grade point based on percentage"""
-        if percentage >= 90:
-            return 'A+', 4.0
-        if percentage >= 80:
-            return 'A', 3.6
-        if percentage >= 70:
-            return 'B+', 3.2
-        if percentage >= 60:
-            return 'B', 2.8
-        if percentage >= 50:
-            return 'C+', 2.4
-        if percentage >= 40:
-            return 'C', 2.0
-        if percentage >= 30:
-            return 'D', 1.6
-        return 'NG', 0.0
+        return grading.get_grade_and_point(percentage, grading.scale_for_class(self.student.student_class))
+
+class StudentResultDocument(models.Model):
+    """Pre-rendered student_result_api response, served as-is with an ETag"""
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, related_name='result_document')
+    symbol_number = models.CharField(max_length=30, unique=True)
+    body = models.TextField()
+    etag = models.CharField(max_length=64)
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Result document {self.symbol_number}"
 
 class HomeworkSubmission(models.Model):
     homework = models.ForeignKey(Homework, on_delete=models.CASCADE, related_name='submissions')
@@ -752,3 +726,105 @@ class GradeScale(models.Model):
 
     def __str__(self):
         return f"{self.class_name} - {self.grade} ({self.min_marks}-{self.max_marks})"
+
+class Job(models.Model):
+    """Long-running admin operation, executed by ``manage.py run_jobs`` (see core.jobs)"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    payload = models.JSONField(default=dict, blank=True)
+    # Uploads and generated files live in the database so the web and worker
+    # processes do not need a shared disk
+    input_name = models.CharField(max_length=255, blank=True)
+    input_data = models.BinaryField(null=True, blank=True)
+    output_name = models.CharField(max_length=255, blank=True)
+    output_content_type = models.CharField(max_length=100, blank=True)
+    output_data = models.BinaryField(null=True, blank=True)
+
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # run_jobs claims the oldest queued job
+            models.Index(fields=['created_at'], condition=models.Q(status='queued'), name='job_queued_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class OutboundEmail(models.Model):
+    """Email waiting in (or delivered from) the outbox drained by ``manage.py send_outbox`` (see core.outbox)"""
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        # Gave up after OUTBOX_MAX_ATTEMPTS; requeue from the admin
+        (DEAD, 'Dead letter'),
+    ]
+    kind = models.CharField(max_length=50, default='result_notification')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    from_email = models.CharField(max_length=255)
+    to_email = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+
+    student = models.ForeignKey(Student, on_delete=models.SET_NULL, null=True, blank=True)
+    exam_type = models.CharField(max_length=50, blank=True)
+    academic_year = models.CharField(max_length=20, blank=True)
+
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # send_outbox claims pending emails that are due
+            models.Index(fields=['next_attempt_at'], condition=models.Q(status='pending'), name='outbox_due_idx'),
+            models.Index(fields=['exam_type', 'academic_year', 'status'], name='outbox_exam_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email} ({self.status})"
+
+
+class SymbolNumberSequence(models.Model):
+    """Next free numeric symbol number, handed out by core.symbol_numbers"""
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField()
+    # First number past the free block being handed out
+    block_end = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: next {self.next_value}"
@@ -0,0 +1,213 @@
+"""Result notification emails.
+
+Bulk sends load every selected student's marks in one query and render
+all messages before sending any, compiling the two templates once per
+batch so only the per-student context is rendered.  The messages are
+recorded in the outbox (core.outbox) and then go out over a single SMTP
+connection, ``RESULT_EMAIL_BATCH_SIZE`` at a time, with a pause of
+``RESULT_EMAIL_BATCH_DELAY`` seconds between batches to stay under the
+provider's sending rate.  Each batch is claimed from the outbox just
+before it goes out and every email is marked sent as soon as it is
+delivered, so ``send_outbox`` never picks up a row this sender still
+intends to send.  Failed sends stay in the outbox for retry.
+"""
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import get_template
+
+from . import outbox
+
+TEXT_TEMPLATE = 'emails/result_notification.txt'
+HTML_TEMPLATE = 'emails/result_notification.html'
+
+
+def result_url(base_url, symbol_number, exam_type, academic_year):
+    return f"{base_url}/print-result-card/{symbol_number}/?exam_type={exam_type}&academic_year={academic_year}"
+
+
+def recipient_for(student, recipient_type):
+    """Email address for 'parent' or 'student', or None."""
+    if recipient_type == 'parent' and student.parent_contact:
+        # parent_contact holds a phone number or an email address
+        if '@' in student.parent_contact:
+            return student.parent_contact
+    elif recipient_type == 'student' and student.email:
+        return student.email
+    return None
+
+
+def marks_by_student(student_ids, exam_type, academic_year):
+    """{student_id: [Marks]} for all the students, in one query."""
+    from .models import Marks
+
+    grouped = defaultdict(list)
+    for mark in Marks.objects.filter(
+        student_id__in=student_ids,
+        exam_type=exam_type,
+        academic_year=academic_year
+    ).select_related('subject'):
+        grouped[mark.student_id].append(mark)
+    return grouped
+
+
+def notification_templates():
+    """The (text, html) notification templates, loaded and compiled once for a batch."""
+    return get_template(TEXT_TEMPLATE), get_template(HTML_TEMPLATE)
+
+
+def notification_context(student, marks, exam_type, academic_year, recipient_type, base_url):
+    """Template context for one student; raises ValueError if no email can be sent."""
+    if not marks:
+        raise ValueError('No results found')
+
+    total_marks = 0
+    total_obtained = 0
+    for mark in marks:
+        total_marks += (mark.theory_total or 0) + (mark.practical_total or 0)
+        total_obtained += (mark.theory_marks or 0) + (mark.practical_marks or 0)
+    percentage = (total_obtained / total_marks * 100) if total_marks > 0 else 0
+
+    recipient_email = recipient_for(student, recipient_type)
+    if not recipient_email:
+        raise ValueError(f'No {recipient_type} email found')
+
+    return {
+        'student': student,
+        'marks': marks,
+        'exam_type': exam_type,
+        'academic_year': academic_year,
+        'total_obtained': total_obtained,
+        'total_marks': total_marks,
+        'percentage': percentage,
+        'overall_result': 'PASS' if percentage >= 40 else 'FAIL',
+        'parent_name': student.parent_name or f"Parent of {student.full_name}",
+        'recipient_email': recipient_email,
+        'generated_date': datetime.now().strftime('%Y-%m-%d %H:%M'),
+        'result_url': result_url(base_url, student.symbol_number, exam_type, academic_year),
+    }
+
+
+def build_message(student, marks, exam_type, academic_year, recipient_type, base_url, templates=None):
+    """The notification for one student; raises ValueError if it cannot be sent.
+
+    Pass ``templates`` from notification_templates() when building many
+    messages so only the per-student context is rendered each time.
+    """
+    text_template, html_template = templates or notification_templates()
+    context = notification_context(student, marks, exam_type, academic_year, recipient_type, base_url)
+    email = EmailMultiAlternatives(
+        subject=f"Result Notification - {student.full_name} ({exam_type})",
+        body=text_template.render(context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[context['recipient_email']]
+    )
+    email.attach_alternative(html_template.render(context), "text/html")
+    return email
+
+
+def send_result_notifications(student_ids, exam_type, academic_year, recipient_type, base_url,
+                              progress=None, batch_size=None, batch_delay=None):
+    """Email each student's result to them or their parent.
+
+    Every message is recorded in the outbox first; a send that fails is
+    reported as 'queued' and retried by ``send_outbox``.
+    ``progress(done, total)`` is called after every batch.  Returns the
+    per-student results reported by bulk_send_result_notifications.
+    """
+    from .models import Student
+
+    batch_size = batch_size or settings.RESULT_EMAIL_BATCH_SIZE
+    batch_delay = settings.RESULT_EMAIL_BATCH_DELAY if batch_delay is None else batch_delay
+
+    students = list(Student.objects.filter(id__in=student_ids))
+    marks = marks_by_student([student.id for student in students], exam_type, academic_year)
+
+    templates = notification_templates()
+    results = [None] * len(students)
+    positions, messages = [], []
+    for position, student in enumerate(students):
+        try:
+            messages.append((build_message(
+                student, marks.get(student.id), exam_type, academic_year, recipient_type, base_url, templates
+            ), student))
+            positions.append(position)
+        except Exception as e:
+            results[position] = _failed(student, str(e))
+
+    done = len(students) - len(positions)
+    if progress and done:
+        progress(done, len(students))
+    if not messages:
+        return results
+
+    rows = outbox.queue(messages, exam_type=exam_type, academic_year=academic_year)
+    position_of = {row.pk: position for position, row in zip(positions, rows)}
+    # Opened by the first send; a failed open fails only that message
+    connection = get_connection()
+    try:
+        for start in range(0, len(rows), batch_size):
+            if start and batch_delay:
+                time.sleep(batch_delay)
+            batch = rows[start:start + batch_size]
+            # Rows send_outbox claimed first are left to it
+            for row in batch:
+                results[position_of[row.pk]] = _handed_off(students[position_of[row.pk]], row.to_email)
+            for row in outbox.claim(len(batch), pk__in=[row.pk for row in batch]):
+                position = position_of[row.pk]
+                try:
+                    outbox.send(connection, outbox.to_message(row))
+                except Exception as e:
+                    outbox.mark_failed(row, e)
+                    results[position] = _queued(students[position], row.to_email, str(e))
+                    continue
+                outbox.mark_sent([row])
+                results[position] = _sent(students[position], row.to_email)
+            done += len(batch)
+            if progress:
+                progress(done, len(students))
+    finally:
+        connection.close()
+    return results
+
+
+def _sent(student, recipient_email):
+    return {
+        'student_name': student.full_name,
+        'symbol_number': student.symbol_number,
+        'recipient_email': recipient_email,
+        'status': 'success',
+        'message': 'Email sent successfully'
+    }
+
+
+def _queued(student, recipient_email, error):
+    return {
+        'student_name': student.full_name,
+        'symbol_number': student.symbol_number,
+        'recipient_email': recipient_email,
+        'status': 'queued',
+        'message': f'Sending failed, will retry: {error}'
+    }
+
+
+def _handed_off(student, recipient_email):
+    return {
+        'student_name': student.full_name,
+        'symbol_number': student.symbol_number,
+        'recipient_email': recipient_email,
+        'status': 'queued',
+        'message': 'Queued for delivery by the outbox'
+    }
+
+
+def _failed(student, message):
+    return {
+        'student_name': student.full_name,
+        'symbol_number': student.symbol_number,
+        'status': 'error',
+        'message': message
+    }
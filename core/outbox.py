@@ -0,0 +1,254 @@
+"""Persistent outbox for outgoing email.
+
+Every result notification is stored as an ``OutboundEmail`` before it is
+sent, so a failed send is never lost.  A failed email is retried with
+exponential backoff (``OUTBOX_RETRY_BASE`` seconds, doubling per attempt
+up to ``OUTBOX_RETRY_MAX``, with jitter).  After ``OUTBOX_MAX_ATTEMPTS``
+it becomes a dead letter and stays put until requeued from the admin.
+
+``manage.py send_outbox`` drains due emails over one SMTP connection,
+paced by a token bucket (``OUTBOX_RATE`` messages per second, bursts of
+up to ``OUTBOX_BURST``).  ``delivery_metrics()`` summarises delivery per
+exam.
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q
+from django.utils import timezone
+
+
+class TokenBucket:
+    """Allow ``rate`` events per second on average and bursts of up to ``burst``.
+
+    A rate of 0 means no limit.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self.tokens = self.burst
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        """Wait until a token is available and use it."""
+        if not self.rate:
+            return
+        self._refill()
+        if self.tokens < 1:
+            self.sleep((1 - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= 1
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying after ``attempts`` failed sends."""
+    delay = min(settings.OUTBOX_RETRY_BASE * 2 ** (attempts - 1), settings.OUTBOX_RETRY_MAX)
+    # Jitter keeps retries after an outage from all arriving at once
+    return delay * random.uniform(0.5, 1.0)
+
+
+def queue(messages, status=None, **fields):
+    """Store EmailMultiAlternatives as OutboundEmails, one per recipient.
+
+    ``fields`` (kind, exam_type, academic_year) apply to every row;
+    ``messages`` may also be (message, student) pairs.  Returns the saved
+    rows in order.
+    """
+    from .models import OutboundEmail
+
+    rows = []
+    for item in messages:
+        message, student = item if isinstance(item, tuple) else (item, None)
+        html_body = next((content for content, mimetype in getattr(message, 'alternatives', [])
+                          if mimetype == 'text/html'), '')
+        for recipient in message.to:
+            rows.append(OutboundEmail(
+                status=status or OutboundEmail.PENDING,
+                from_email=message.from_email,
+                to_email=recipient,
+                subject=message.subject,
+                body=message.body,
+                html_body=html_body,
+                student=student,
+                **fields
+            ))
+    return OutboundEmail.objects.bulk_create(rows)
+
+
+def to_message(row):
+    message = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.body,
+        from_email=row.from_email,
+        to=[row.to_email],
+    )
+    if row.html_body:
+        message.attach_alternative(row.html_body, 'text/html')
+    return message
+
+
+def mark_sent(rows):
+    from .models import OutboundEmail
+
+    now = timezone.now()
+    OutboundEmail.objects.filter(pk__in=[row.pk for row in rows]).update(
+        status=OutboundEmail.SENT, attempts=F('attempts') + 1, sent_at=now, last_error='', updated_at=now
+    )
+
+
+def mark_failed(row, error):
+    """Schedule a retry for ``row``, or dead-letter it; returns the new status."""
+    from .models import OutboundEmail
+
+    attempts = row.attempts + 1
+    now = timezone.now()
+    if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        status, next_attempt_at = OutboundEmail.DEAD, now
+    else:
+        status, next_attempt_at = OutboundEmail.PENDING, now + timedelta(seconds=retry_delay(attempts))
+    OutboundEmail.objects.filter(pk=row.pk).update(
+        status=status, attempts=attempts, next_attempt_at=next_attempt_at, last_error=str(error), updated_at=now
+    )
+    row.status, row.attempts, row.next_attempt_at, row.last_error = status, attempts, next_attempt_at, str(error)
+    return status
+
+
+def send(connection, message):
+    """Send one message over an open connection, reconnecting after a failure.
+
+    One message per call so a refused recipient fails only that email;
+    ``open()`` is a no-op while the connection is still up.
+    """
+    connection.open()
+    try:
+        connection.send_messages([message])
+    except Exception:
+        # The server may have dropped the session: reconnect for the next message
+        try:
+            connection.close()
+        except Exception:
+            pass
+        raise
+
+
+def send_now(message, student=None, **fields):
+    """Queue ``message`` and try to deliver it straight away.
+
+    Returns (row, error); on failure the row stays in the outbox and is
+    retried by ``send_outbox``.
+    """
+    from .models import OutboundEmail
+
+    row, = queue([(message, student)], status=OutboundEmail.SENDING, **fields)
+    connection = get_connection()
+    try:
+        send(connection, to_message(row))
+    except Exception as e:
+        mark_failed(row, e)
+        return row, str(e)
+    finally:
+        connection.close()
+    mark_sent([row])
+    return row, None
+
+
+def claim(limit, **filters):
+    """Mark up to ``limit`` due pending emails (matching ``filters``) as sending and return them."""
+    from .models import OutboundEmail
+
+    with transaction.atomic():
+        rows = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.PENDING, next_attempt_at__lte=timezone.now(), **filters)
+            .order_by('next_attempt_at')[:limit]
+        )
+        OutboundEmail.objects.filter(pk__in=[row.pk for row in rows]).update(
+            status=OutboundEmail.SENDING, updated_at=timezone.now()
+        )
+    return rows
+
+
+def requeue_stale(stale_after):
+    """Put back emails left 'sending' by a worker that died mid-batch."""
+    from .models import OutboundEmail
+
+    return OutboundEmail.objects.filter(
+        status=OutboundEmail.SENDING, updated_at__lt=timezone.now() - timedelta(seconds=stale_after)
+    ).update(status=OutboundEmail.PENDING)
+
+
+def drain(bucket=None, batch_size=100, connection=None, **filters):
+    """Send every email that is due; returns {'sent', 'retrying', 'dead'}.
+
+    Emails are paced by ``bucket`` (a TokenBucket; defaults to
+    OUTBOX_RATE / OUTBOX_BURST) and share one connection.  ``filters``
+    narrow the emails sent, e.g. ``kind='result_notification'``.
+    """
+    from .models import OutboundEmail
+
+    bucket = bucket or TokenBucket(settings.OUTBOX_RATE, settings.OUTBOX_BURST)
+    counts = {'sent': 0, 'retrying': 0, 'dead': 0}
+    connection = connection or get_connection()
+    try:
+        while rows := claim(batch_size, **filters):
+            for row in rows:
+                bucket.take()
+                try:
+                    send(connection, to_message(row))
+                except Exception as e:
+                    status = mark_failed(row, e)
+                    counts['dead' if status == OutboundEmail.DEAD else 'retrying'] += 1
+                    continue
+                # Straight away, so a worker killed mid-batch never re-sends it
+                mark_sent([row])
+                counts['sent'] += 1
+    finally:
+        connection.close()
+    return counts
+
+
+def delivery_metrics(**filters):
+    """Delivery counts per exam, e.g. delivery_metrics(exam_type='Final Term').
+
+    One dict per (exam_type, academic_year) with the number of emails per
+    status, how many needed retries, the mean attempts per sent email and
+    the mean seconds from queueing to delivery.
+    """
+    from .models import OutboundEmail
+
+    sent = Q(status=OutboundEmail.SENT)
+    rows = (
+        OutboundEmail.objects.filter(**filters)
+        .values('exam_type', 'academic_year')
+        .annotate(
+            total=Count('id'),
+            sent=Count('id', filter=sent),
+            pending=Count('id', filter=Q(status__in=[OutboundEmail.PENDING, OutboundEmail.SENDING])),
+            dead=Count('id', filter=Q(status=OutboundEmail.DEAD)),
+            retried=Count('id', filter=sent & Q(attempts__gt=1)),
+            mean_attempts=Avg('attempts', filter=sent),
+            mean_delivery=Avg(
+                ExpressionWrapper(F('sent_at') - F('created_at'), output_field=DurationField()), filter=sent
+            ),
+        )
+        .order_by('academic_year', 'exam_type')
+    )
+    metrics = []
+    for row in rows:
+        delivery = row.pop('mean_delivery')
+        row['mean_delivery_seconds'] = round(delivery.total_seconds(), 3) if delivery is not None else None
+        row['mean_attempts'] = round(row['mean_attempts'], 2) if row['mean_attempts'] is not None else None
+        metrics.append(row)
+    return metrics
@@ -0,0 +1,198 @@
+"""Build Result / SubjectResult rows from the Marks teachers enter.
+
+The public result search, the result emails and the result card views all
+read ``Result`` and ``SubjectResult``.  ``build_results()`` turns a whole
+exam's ``Marks`` into those rows with a fixed number of queries:
+
+1. latest Marks change per student (one grouped query)
+2. existing Results for the affected classes
+3. the Marks of the students that need rebuilding
+4. one upsert of Result, one delete + one insert of SubjectResult
+
+Results are matched to students by ``roll_number = symbol_number`` and the
+student's class.  A student is rebuilt only if one of their Marks rows was
+saved after their Result's ``marks_synced_at``.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import analytics, grading, ranking
+
+RESULT_UNIQUE_FIELDS = ['roll_number', 'student_class', 'exam_type', 'academic_year']
+RESULT_BUILT_FIELDS = [
+    'student_name', 'total', 'gpa', 'percentage', 'total_subjects',
+    'passed_subjects', 'failed_subjects', 'marks_synced_at',
+]
+MARKS_VALUES = [
+    'student_id', 'subject__name', 'subject__code', 'subject__credit_hour',
+    'theory_marks', 'theory_total', 'practical_marks', 'practical_total',
+]
+
+
+def weighted_gpa(student_index, grade_points, credit_hours, n_students):
+    """Credit-hour-weighted GPA per student.
+
+    ``student_index[i]`` says which student subject row ``i`` belongs to.
+    Missing grade points count as 0.
+    """
+    points = np.nan_to_num(grading.as_float_array(grade_points))
+    credits = grading.as_float_array(credit_hours)
+    weighted = np.bincount(student_index, weights=points * credits, minlength=n_students)
+    total_credits = np.bincount(student_index, weights=credits, minlength=n_students)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(total_credits > 0, weighted / np.where(total_credits > 0, total_credits, 1), 0.0)
+
+
+def save_results(results, subject_results, result_index, update_fields, batch_size=500):
+    """Upsert ``results`` and replace their SubjectResult rows.
+
+    ``result_index[i]`` says which result ``subject_results[i]`` belongs to.
+    Existing results (same roll number, class and exam) get ``update_fields``
+    overwritten.  Call inside a transaction.
+    """
+    from .models import Result, SubjectResult
+
+    Result.objects.bulk_create(
+        results,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=RESULT_UNIQUE_FIELDS,
+        update_fields=update_fields,
+    )
+    # Primary keys are not returned by every backend for upserts
+    result_ids = {
+        tuple(key): pk
+        for pk, *key in Result.objects.filter(
+            student_class__in={r.student_class for r in results},
+            exam_type__in={r.exam_type for r in results},
+            academic_year__in={r.academic_year for r in results},
+        ).values_list('id', *RESULT_UNIQUE_FIELDS)
+    }
+    for result in results:
+        result.pk = result_ids[tuple(getattr(result, field) for field in RESULT_UNIQUE_FIELDS)]
+    for subject_result, i in zip(subject_results, result_index):
+        subject_result.result_id = results[i].pk
+
+    SubjectResult.objects.filter(result_id__in=[r.pk for r in results]).delete()
+    SubjectResult.objects.bulk_create(subject_results, batch_size=batch_size)
+
+    # Bulk writes do not send post_save
+    analytics.results_changed(results)
+    ranking.rank_results({(r.student_class, r.exam_type, r.academic_year) for r in results})
+
+
+def _stale_students(marks, exam_type, academic_year, full):
+    """Return ({student_id: (symbol, name, class)}, existing results) for students to rebuild."""
+    from .models import Result
+
+    latest = list(
+        marks.values('student_id', 'student__symbol_number', 'student__full_name', 'student__student_class')
+        .annotate(changed_at=Max('updated_at'))
+        .order_by()
+    )
+    if not latest:
+        return {}, {}
+
+    existing = {
+        (r.roll_number, r.student_class): r
+        for r in Result.objects.filter(
+            exam_type=exam_type,
+            academic_year=academic_year,
+            student_class__in={row['student__student_class'] for row in latest},
+        )
+    }
+
+    stale = {}
+    for row in latest:
+        key = (row['student__symbol_number'], row['student__student_class'])
+        result = existing.get(key)
+        if full or result is None or result.marks_synced_at is None or row['changed_at'] > result.marks_synced_at:
+            stale[row['student_id']] = (row['student__symbol_number'], row['student__full_name'], row['student__student_class'])
+    return stale, existing
+
+
+def build_results(exam_type, academic_year, student_class=None, full=False, batch_size=500):
+    """Build Result + SubjectResult rows for one exam from its Marks.
+
+    Only students whose marks changed since the last build are processed
+    unless ``full`` is set.  Returns a dict of counts.
+    """
+    from .models import Marks, Result, SubjectResult
+
+    # Placeholder rows without a score are not results yet
+    marks = Marks.objects.filter(analytics.ENTERED_MARKS, exam_type=exam_type, academic_year=academic_year)
+    if student_class:
+        marks = marks.filter(student__student_class=student_class)
+
+    started_at = timezone.now()
+    stale, existing = _stale_students(marks, exam_type, academic_year, full)
+    if not stale:
+        return {'students': 0, 'created': 0, 'updated': 0, 'subjects': 0}
+
+    rows = list(marks.filter(student_id__in=list(stale)).values(*MARKS_VALUES).order_by('student_id', 'subject__name'))
+    student_ids = list(stale)
+    position = {student_id: i for i, student_id in enumerate(student_ids)}
+    student_index = np.array([position[row['student_id']] for row in rows], dtype=int)
+
+    subject_results = grading.apply_subject_result_grades(
+        [SubjectResult(
+            subject_name=row['subject__name'],
+            subject_code=row['subject__code'],
+            credit_hour=row['subject__credit_hour'],
+            theory_marks=row['theory_marks'],
+            theory_total=row['theory_total'],
+            practical_marks=row['practical_marks'],
+            practical_total=row['practical_total'],
+            total_marks=(row['theory_total'] or 0) + (row['practical_total'] or 0),
+            total_obtained=(row['theory_marks'] or 0) + (row['practical_marks'] or 0),
+        )
+        for row in rows
+    ], class_names=[stale[row['student_id']][2] for row in rows])
+    for subject_result in subject_results:
+        subject_result.grade = subject_result.final_grade
+        subject_result.remarks = 'Passed' if subject_result.is_passed else 'Failed'
+
+    n = len(student_ids)
+    gpa = weighted_gpa(
+        student_index,
+        [s.grade_point for s in subject_results],
+        [s.credit_hour for s in subject_results],
+        n,
+    )
+    obtained = np.bincount(student_index, weights=[s.total_obtained for s in subject_results], minlength=n)
+    passed = np.bincount(student_index, weights=[s.is_passed for s in subject_results], minlength=n).astype(int)
+    subject_count = np.bincount(student_index, minlength=n)
+
+    results = []
+    for i, student_id in enumerate(student_ids):
+        symbol_number, full_name, class_name = stale[student_id]
+        result_gpa = round(float(gpa[i]), 2)
+        total = int(round(obtained[i]))
+        results.append(Result(
+            student_name=full_name,
+            roll_number=symbol_number,
+            student_class=class_name,
+            exam_type=exam_type,
+            academic_year=academic_year,
+            total=total,
+            gpa=result_gpa,
+            # Same rule as Result.save()
+            percentage=(result_gpa / 4.0) * 100 if total > 0 and result_gpa else None,
+            total_subjects=int(subject_count[i]),
+            passed_subjects=int(passed[i]),
+            failed_subjects=int(subject_count[i] - passed[i]),
+            marks_synced_at=started_at,
+        ))
+
+    with transaction.atomic():
+        save_results(results, subject_results, student_index, RESULT_BUILT_FIELDS, batch_size)
+
+    created = sum(1 for r in results if (r.roll_number, r.student_class) not in existing)
+    return {
+        'students': len(results),
+        'created': created,
+        'updated': len(results) - created,
+        'subjects': len(subject_results),
+    }
@@ -0,0 +1,81 @@
+"""Class ranking for Result and StudentPerformanceHistory.
+
+Positions for every (class, exam_type, academic_year) bucket are computed
+with one window-function query per model and written back with one
+``bulk_update``.  Ties share a position and the next position is skipped
+(1, 2, 2, 4); rows without a GPA are counted in ``total_students`` but get
+no position.
+
+Result positions follow ``Result.gpa``, so they are refreshed by
+``pipeline.build_results`` once it has rebuilt the results, not when Marks
+are saved.
+"""
+from django.db.models import Count, F, Window
+from django.db.models.functions import Rank
+
+from .analytics import bucket_filter
+
+RESULT_BUCKET_FIELDS = ['student_class', 'exam_type', 'academic_year']
+HISTORY_BUCKET_FIELDS = ['class_name', 'exam_type', 'academic_year']
+
+
+def _rank(queryset, bucket_fields, order_by, batch_size):
+    partition = [F(field) for field in bucket_fields]
+    rows = queryset.annotate(
+        position=Window(Rank(), partition_by=partition, order_by=order_by),
+        class_size=Window(Count('id'), partition_by=partition),
+    )
+
+    changed = []
+    for row in rows:
+        position = row.position if row.gpa is not None else None
+        if (row.class_position, row.total_students) != (position, row.class_size):
+            row.class_position = position
+            row.total_students = row.class_size
+            changed.append(row)
+    if changed:
+        queryset.model.objects.bulk_update(changed, ['class_position', 'total_students'], batch_size=batch_size)
+    return len(changed)
+
+
+def rank_results(buckets=None, batch_size=500):
+    """Rank Result rows by GPA, then total, within each bucket.
+
+    ``buckets`` are (student_class, exam_type, academic_year) tuples;
+    ``None`` ranks every bucket.  Returns the number of rows updated.
+    """
+    from .models import Result
+
+    results = Result.objects.all()
+    if buckets is not None:
+        buckets = set(buckets)
+        if not buckets:
+            return 0
+        results = results.filter(bucket_filter(buckets, RESULT_BUCKET_FIELDS))
+    return _rank(
+        results, RESULT_BUCKET_FIELDS,
+        [F('gpa').desc(nulls_last=True), F('total').desc()], batch_size,
+    )
+
+
+def rank_performance_history(buckets=None, batch_size=500):
+    """Rank StudentPerformanceHistory rows by GPA, then total marks, within each bucket."""
+    from .models import StudentPerformanceHistory
+
+    history = StudentPerformanceHistory.objects.all()
+    if buckets is not None:
+        buckets = set(buckets)
+        if not buckets:
+            return 0
+        history = history.filter(bucket_filter(buckets, HISTORY_BUCKET_FIELDS))
+    return _rank(
+        history, HISTORY_BUCKET_FIELDS,
+        [F('gpa').desc(nulls_last=True), F('total_marks').desc()], batch_size,
+    )
+
+
+def rank_exams(buckets):
+    """Re-rank both models for the given (class, exam_type, academic_year) buckets."""
+    buckets = set(buckets)
+    return rank_results(buckets), rank_performance_history(buckets)
+
@@ -0,0 +1,143 @@
+"""Database-side regrading of Marks and SubjectResult.
+
+``grading.regrade_marks()`` loads every row into Python; the functions
+here instead translate each class's ``CompiledScale`` into SQL ``CASE``
+expressions and let the database rewrite the grades with one ``UPDATE``
+per distinct scale.  Used after grade boundaries or pass rules change.
+
+The expressions mirror ``grading.grade_marks`` and
+``grading.grade_subject_results``, including the theory pass rule.  Marks
+are graded from their stored ``percentage``, which does not depend on the
+scale.
+"""
+from django.db.models import BooleanField, Case, CharField, F, FloatField, Value, When
+from django.db.models.functions import Coalesce, Now
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual, IsNull, LessThan
+
+from . import analytics, grading, result_documents
+
+
+def _score_case(scale, score, values, output_field):
+    """CASE mapping ``score`` onto ``values`` (aligned with ``scale.grades``)."""
+    whens = [When(IsNull(score, True), then=Value(None, output_field=output_field))]
+    # Highest threshold first, like the if-chain it replaces
+    for threshold, value in reversed(list(zip(scale.thresholds, values[1:]))):
+        whens.append(When(GreaterThanOrEqual(score, float(threshold)), then=Value(value, output_field=output_field)))
+    return Case(*whens, default=Value(values[0], output_field=output_field), output_field=output_field)
+
+
+def grade_expression(scale, score):
+    return _score_case(scale, score, [str(g) for g in scale.grades], CharField())
+
+
+def point_expression(scale, score):
+    return _score_case(scale, score, [float(p) for p in scale.points], FloatField())
+
+
+def pass_expression(scale, score):
+    """Passing grade?  A NULL score is not a pass."""
+    return Coalesce(
+        _score_case(scale, score, [bool(p) for p in scale.passing], BooleanField()),
+        Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def _theory_failed():
+    """theory_marks below THEORY_PASS_RATIO of the theory total (0/NULL total -> 100)."""
+    theory_total = Case(
+        When(GreaterThan(F('theory_total'), 0), then=F('theory_total')),
+        default=Value(100.0),
+        output_field=FloatField(),
+    )
+    return LessThan(
+        Coalesce(F('theory_marks'), Value(0.0), output_field=FloatField()),
+        theory_total * Value(grading.THEORY_PASS_RATIO),
+    )
+
+
+def _unless_theory_failed(failed_value, expression, output_field):
+    return Case(
+        When(_theory_failed(), then=Value(failed_value, output_field=output_field)),
+        default=expression,
+        output_field=output_field,
+    )
+
+
+def marks_updates(scale):
+    """UPDATE ... SET values that regrade Marks with ``scale``."""
+    percentage = F('percentage')
+    return {
+        'grade': _unless_theory_failed(grading.FAIL_GRADE, grade_expression(scale, percentage), CharField()),
+        'grade_point': _unless_theory_failed(0.0, point_expression(scale, percentage), FloatField()),
+        'is_passed': _unless_theory_failed(False, pass_expression(scale, percentage), BooleanField()),
+        'updated_at': Now(),
+    }
+
+
+def subject_result_updates(scale):
+    """UPDATE ... SET values that regrade SubjectResult with ``scale``."""
+    theory_point = point_expression(scale, F('theory_marks'))
+    practical_point = point_expression(scale, F('practical_marks'))
+    grade_point = Case(
+        When(IsNull(F('practical_marks'), True), then=theory_point),
+        default=(theory_point + practical_point) / Value(2.0),
+        output_field=FloatField(),
+    )
+    final_score = grade_point * Value(25.0)
+    fail = grading.FAIL_GRADE
+    return {
+        'theory_grade': _unless_theory_failed(fail, grade_expression(scale, F('theory_marks')), CharField()),
+        'theory_grade_point': _unless_theory_failed(0.0, theory_point, FloatField()),
+        'practical_grade': _unless_theory_failed(fail, grade_expression(scale, F('practical_marks')), CharField()),
+        'practical_grade_point': _unless_theory_failed(0.0, practical_point, FloatField()),
+        'grade_point': _unless_theory_failed(0.0, grade_point, FloatField()),
+        'final_grade': _unless_theory_failed(fail, grade_expression(scale, final_score), CharField()),
+        'is_passed': _unless_theory_failed(False, pass_expression(scale, final_score), BooleanField()),
+    }
+
+
+def _update_per_scale(queryset, class_field, updates):
+    """One UPDATE per class with its own GradeScale, one for everything else."""
+    scales = grading.class_scales()
+    updated = 0
+    for class_name, scale in scales.items():
+        updated += queryset.filter(**{class_field: class_name}).update(**updates(scale))
+    updated += queryset.exclude(**{f'{class_field}__in': list(scales)}).update(**updates(grading.DEFAULT_SCALE))
+    return updated
+
+
+def regrade_marks(queryset):
+    """Regrade ``queryset`` of Marks in SQL; returns the number of rows updated."""
+    buckets = set(
+        queryset.values_list('subject__name', 'student__student_class', 'exam_type', 'academic_year').order_by().distinct()
+    )
+    updated = _update_per_scale(queryset, 'student__student_class', marks_updates)
+    # QuerySet.update() does not send post_save
+    analytics.refresh_subject_performance(buckets)
+    analytics.invalidate_dashboard({(exam_type, academic_year) for _, _, exam_type, academic_year in buckets})
+    result_documents.invalidate(queryset.values_list('student_id', flat=True).distinct())
+    return updated
+
+
+def regrade_subject_results(queryset):
+    """Regrade ``queryset`` of SubjectResult in SQL; returns the number of rows updated."""
+    return _update_per_scale(queryset, 'result__student_class', subject_result_updates)
+
+
+def regrade_exam(academic_year=None, exam_type=None):
+    """Regrade all Marks and SubjectResult rows of a year and/or exam type.
+
+    Returns (marks updated, subject results updated).
+    """
+    from .models import Marks, SubjectResult
+
+    marks = Marks.objects.all()
+    subject_results = SubjectResult.objects.all()
+    if academic_year:
+        marks = marks.filter(academic_year=academic_year)
+        subject_results = subject_results.filter(result__academic_year=academic_year)
+    if exam_type:
+        marks = marks.filter(exam_type=exam_type)
+        subject_results = subject_results.filter(result__exam_type=exam_type)
+    return regrade_marks(marks), regrade_subject_results(subject_results)
@@ -0,0 +1,131 @@
+"""On-disk cache for rendered result cards and reports.
+
+Entries are content-addressed: the key is a hash of everything the
+rendering depends on (student, exam, the Marks rows' ``updated_at``
+values, the layout version), so a changed mark simply produces a new key
+and stale entries are never served, only aged out.
+
+Files live under ``RENDER_CACHE_DIR/<kind>/<aa>/<key>`` and are shared by
+all web processes.  A hit bumps the file's mtime; once the directory
+grows past ``RENDER_CACHE_MAX_BYTES`` the least recently used files are
+deleted until it is back under the low-water mark.  Temporary files are
+left alone until they are ``TMP_FILE_MAX_AGE`` seconds old: until then
+another process may still be writing them.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Bump a layout's version whenever its rendering code changes
+LAYOUT_VERSIONS = {
+    'result_card_pdf': 1,
+    'result_card_xlsx': 1,
+    'comprehensive_pdf': 1,
+}
+# Evict down to this fraction of RENDER_CACHE_MAX_BYTES
+LOW_WATER_RATIO = 0.8
+TMP_PREFIX = '.tmp-'
+# Older temporary files were left behind by a crashed writer
+TMP_FILE_MAX_AGE = 3600
+
+# Bytes this process has written since it last measured the directory
+_written_since_scan = 0
+
+
+def cache_key(kind, *parts):
+    data = json.dumps([kind, LAYOUT_VERSIONS[kind], *parts], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _path(kind, key):
+    return os.path.join(settings.RENDER_CACHE_DIR, kind, key[:2], key)
+
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        # Evicted by another process in between; the bytes are still good
+        pass
+    return data
+
+
+def _write(path, data):
+    global _written_since_scan
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=TMP_PREFIX)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    # Atomic, so a reader never sees a half-written entry
+    os.replace(tmp_path, path)
+
+    _written_since_scan += len(data)
+    # Walking the directory costs far more than a write, so only measure
+    # once this process has written a slice of the budget
+    if _written_since_scan >= settings.RENDER_CACHE_MAX_BYTES * (1 - LOW_WATER_RATIO) / 2:
+        _written_since_scan = 0
+        evict()
+
+
+def _entries():
+    now = time.time()
+    for root, _, files in os.walk(settings.RENDER_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.startswith(TMP_PREFIX) and now - stat.st_mtime < TMP_FILE_MAX_AGE:
+                continue
+            yield stat.st_mtime, stat.st_size, path
+
+
+def evict(max_bytes=None):
+    """Delete least recently used entries while the cache exceeds ``max_bytes``.
+
+    Returns the number of files removed.
+    """
+    max_bytes = settings.RENDER_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = sorted(_entries())
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return 0
+
+    target = max_bytes * LOW_WATER_RATIO
+    removed = 0
+    for _, size, path in entries:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return removed
+
+
+def get_or_render(kind, parts, render):
+    """Return the cached bytes for ``(kind, *parts)``, calling ``render()`` on a miss.
+
+    ``parts`` must be JSON-serialisable (DjangoJSONEncoder) and capture every
+    input of ``render``.
+    """
+    path = _path(kind, cache_key(kind, *parts))
+    data = _read(path)
+    if data is None:
+        data = render()
+        _write(path, data)
+    return data
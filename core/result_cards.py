@@ -0,0 +1,239 @@
+"""Result card rendering, one student or a whole class at once.
+
+Rendering functions here take only plain tuples, never model instances,
+so a class's cards can be rendered in a ``ProcessPoolExecutor`` (ReportLab
+layout is CPU-bound) from data fetched with a single query.  With one
+worker (what web requests use) the cards are rendered in-process instead,
+so a gunicorn worker never forks; the ``run_jobs`` worker uses
+``RESULT_CARD_WORKERS`` processes.
+
+    student = (full_name, symbol_number, student_class)
+    row     = (subject, theory, practical, theory_total, practical_total, grade, is_passed)
+"""
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from itertools import groupby
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+try:
+    from pypdf import PdfWriter
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+STUDENT_FIELDS = ['student__full_name', 'student__symbol_number', 'student__student_class']
+ROW_FIELDS = [
+    'subject__name', 'theory_marks', 'practical_marks', 'theory_total', 'practical_total',
+    'grade', 'is_passed',
+]
+# Cards handed to a worker per round trip
+WORKER_CHUNK_SIZE = 8
+# Processes when no count is given; os.cpu_count() reports the host's CPUs,
+# not the instance's share of them
+DEFAULT_WORKERS = 2
+
+
+def _card_elements(student, exam_type, academic_year, rows, date):
+    full_name, symbol_number, student_class = student
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=30,
+        alignment=TA_CENTER
+    )
+    subtitle_style = ParagraphStyle(
+        'Subtitle',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=20,
+        alignment=TA_CENTER
+    )
+
+    elements = [
+        Paragraph("NAWA PRATIVA SECONDARY SCHOOL", title_style),
+        Paragraph("STUDENT RESULT CARD", subtitle_style),
+        Spacer(1, 20),
+    ]
+
+    student_info = [
+        ['Student Name:', full_name],
+        ['Symbol Number:', symbol_number],
+        ['Class:', student_class],
+        ['Exam Type:', exam_type],
+        ['Academic Year:', academic_year],
+        ['Date:', date]
+    ]
+    student_table = Table(student_info, colWidths=[2*inch, 4*inch])
+    student_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    elements += [student_table, Spacer(1, 20)]
+
+    results_data = [['Subject', 'Theory', 'Practical', 'Total', 'Grade', 'Status']]
+    total_marks = 0
+    total_obtained = 0
+    passed_subjects = 0
+    for subject, theory, practical, theory_total, practical_total, grade, is_passed in rows:
+        theory = theory or 0
+        practical = practical or 0
+        total = theory + practical
+        status = 'Pass' if is_passed else 'Fail' if is_passed is False else 'N/A'
+        results_data.append([subject, str(theory), str(practical), str(total), grade or 'N/A', status])
+
+        total_marks += (theory_total or 0) + (practical_total or 0)
+        total_obtained += total
+        if is_passed:
+            passed_subjects += 1
+
+    percentage = (total_obtained / total_marks * 100) if total_marks > 0 else 0
+
+    results_table = Table(results_data)
+    results_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ]))
+    elements += [results_table, Spacer(1, 20)]
+
+    summary_data = [
+        ['Total Marks Obtained:', str(total_obtained)],
+        ['Total Marks Possible:', str(total_marks)],
+        ['Percentage:', f"{percentage:.2f}%"],
+        ['Passed Subjects:', str(passed_subjects)],
+        ['Total Subjects:', str(len(rows))],
+        ['Overall Result:', 'PASS' if percentage >= 40 else 'FAIL']
+    ]
+    summary_table = Table(summary_data, colWidths=[2*inch, 2*inch])
+    summary_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    elements.append(summary_table)
+    return elements
+
+
+def render_card_pdf(student, exam_type, academic_year, rows, date):
+    """Render one result card and return the PDF bytes."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    doc.build(_card_elements(student, exam_type, academic_year, rows, date))
+    return buffer.getvalue()
+
+
+def _render_card_args(args):
+    return render_card_pdf(*args)
+
+
+def class_cards(marks):
+    """Group a Marks queryset into [(student, rows)] with one query."""
+    values = marks.order_by('student__full_name', 'student__symbol_number', 'subject__name').values_list(
+        *STUDENT_FIELDS, *ROW_FIELDS
+    )
+    n = len(STUDENT_FIELDS)
+    return [
+        (student, [row[n:] for row in rows])
+        for student, rows in groupby(values, key=lambda row: row[:n])
+    ]
+
+
+def render_cards(cards, exam_type, academic_year, date, max_workers=None):
+    """Yield (student, pdf bytes) for each card, in order.
+
+    Rendered across ``max_workers`` processes (DEFAULT_WORKERS when None),
+    or in this process when ``max_workers`` is 1.
+    """
+    jobs = [(student, exam_type, academic_year, rows, date) for student, rows in cards]
+    workers = max_workers or DEFAULT_WORKERS
+    if workers <= 1:
+        for job in jobs:
+            yield job[0], _render_card_args(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for (student, *_), pdf in zip(jobs, executor.map(_render_card_args, jobs, chunksize=WORKER_CHUNK_SIZE)):
+            yield student, pdf
+
+
+def merged_pdf(cards, exam_type, academic_year, date, max_workers=None, progress=None):
+    """All cards in one PDF.
+
+    With pypdf the cards are rendered in parallel and concatenated;
+    without it they are laid out in a single document, one per page.
+    ``progress(done)``, if given, is called as each card is finished.
+    """
+    buffer = BytesIO()
+    if PYPDF_AVAILABLE:
+        writer = PdfWriter()
+        for done, (_, pdf) in enumerate(render_cards(cards, exam_type, academic_year, date, max_workers), 1):
+            writer.append(BytesIO(pdf))
+            if progress:
+                progress(done)
+        writer.write(buffer)
+    else:
+        elements = []
+        for student, rows in cards:
+            if elements:
+                elements.append(PageBreak())
+            elements += _card_elements(student, exam_type, academic_year, rows, date)
+        doc = SimpleDocTemplate(buffer, pagesize=A4)
+        if progress:
+            # Each card starts a new page, so pages laid out approximate cards done
+            doc.setProgressCallBack(
+                lambda kind, value: progress(min(value, len(cards))) if kind == 'PAGE' else None
+            )
+        doc.build(elements)
+    return buffer.getvalue()
+
+
+class _ZipStream:
+    """Unseekable sink for ZipFile; the response generator drains it after each card."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_stream(cards, exam_type, academic_year, date, max_workers=None, progress=None):
+    """Yield a ZIP archive of per-student PDFs as the cards finish rendering.
+
+    ``progress(done)``, if given, is called as each card is added.
+    """
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        cards_done = render_cards(cards, exam_type, academic_year, date, max_workers)
+        for done, ((_, symbol_number, _), pdf) in enumerate(cards_done, 1):
+            archive.writestr(f'result_card_{symbol_number}.pdf', pdf)
+            if progress:
+                progress(done)
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,145 @@
+"""Pre-rendered documents for the public ``student_result_api``.
+
+The endpoint is public and gets hammered the hour results go live, so the
+``StudentResultSerializer`` output for each student is rendered ahead of
+time (when results are published) and stored as JSON text with its ETag.
+Serving it is then a single lookup on the unique ``symbol_number``.
+
+Any write to a student's Marks or record, or to a Subject they have marks
+in, drops their document once the write commits; the next request
+rebuilds it.  Each drop also bumps the student's version in the shared
+cache.  A rebuild reads the version before rendering and checks it again
+after storing the document: if it changed, the render may have read the
+old marks and the document is deleted again, so a stale document is
+never kept.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+CHUNK_SIZE = 500
+
+
+def _version_key(student_id):
+    return f'result_document_version:{student_id}'
+
+
+def _versions(student_ids):
+    keys = {student_id: _version_key(student_id) for student_id in student_ids}
+    found = cache.get_many(list(keys.values()))
+    return {student_id: found.get(key) for student_id, key in keys.items()}
+
+
+def _discard_changed(versions):
+    """Delete the documents just stored for students invalidated since ``versions`` was read."""
+    from .models import StudentResultDocument
+
+    changed = [student_id for student_id, version in _versions(versions).items() if version != versions[student_id]]
+    if changed:
+        StudentResultDocument.objects.filter(student_id__in=changed).delete()
+    return changed
+
+
+def _students_with_marks(students):
+    from .models import Marks
+
+    return students.prefetch_related(
+        Prefetch('marks', queryset=Marks.objects.select_related('subject'))
+    )
+
+
+def render(student):
+    """Return (body, etag) for a student whose marks are prefetched."""
+    from .serializers import StudentResultSerializer
+
+    body = JSONRenderer().render(StudentResultSerializer(student).data)
+    return body.decode(), hashlib.sha1(body).hexdigest()
+
+
+def build(students):
+    """Render and upsert documents for a Student queryset, CHUNK_SIZE at a time.
+
+    Returns the number of documents written.
+    """
+    from .models import StudentResultDocument
+
+    ids = list(students.values_list('id', flat=True))
+    built = 0
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk_ids = ids[start:start + CHUNK_SIZE]
+        versions = _versions(chunk_ids)
+        chunk = _students_with_marks(students.model.objects.filter(id__in=chunk_ids))
+        documents = []
+        for student in chunk:
+            body, etag = render(student)
+            documents.append(StudentResultDocument(
+                student=student, symbol_number=student.symbol_number, body=body, etag=etag,
+            ))
+        StudentResultDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=['student'],
+            update_fields=['symbol_number', 'body', 'etag', 'built_at'],
+        )
+        built += len(documents) - len(_discard_changed(versions))
+    return built
+
+
+def get(symbol_number):
+    """Return the document for ``symbol_number``, building it on a miss.
+
+    Raises ``Student.DoesNotExist`` for unknown symbol numbers.
+    """
+    from .models import Student, StudentResultDocument
+
+    document = StudentResultDocument.objects.filter(symbol_number=symbol_number).first()
+    if document is None:
+        student_id = Student.objects.values_list('id', flat=True).get(symbol_number=symbol_number)
+        versions = _versions([student_id])
+        student = _students_with_marks(Student.objects.all()).get(id=student_id)
+        body, etag = render(student)
+        document, _ = StudentResultDocument.objects.update_or_create(
+            student=student,
+            defaults={'symbol_number': student.symbol_number, 'body': body, 'etag': etag},
+        )
+        # Still served: it was rendered from the data as of this request
+        _discard_changed(versions)
+    return document
+
+
+def results_published(results):
+    """Pre-build documents for the students behind a Result queryset."""
+    from .models import Student
+
+    return build(Student.objects.filter(symbol_number__in=results.values('roll_number')))
+
+
+def invalidate(student_ids):
+    """Drop the students' documents once the current transaction commits."""
+    from .models import StudentResultDocument
+
+    student_ids = set(student_ids)
+
+    def drop():
+        # Bump first: a rebuild storing after the delete then sees the new version
+        cache.set_many({_version_key(student_id): uuid.uuid4().hex for student_id in student_ids}, None)
+        StudentResultDocument.objects.filter(student_id__in=student_ids).delete()
+
+    if student_ids:
+        transaction.on_commit(drop)
+
+
+def subject_changed(subject):
+    """Drop the documents of every student with marks in ``subject``."""
+    from .models import Marks
+
+    invalidate(Marks.objects.filter(subject=subject).values_list('student_id', flat=True).distinct())
+
+
+def marks_changed(marks):
+    """Drop the documents of students whose marks were written."""
+    invalidate({m.student_id for m in marks})
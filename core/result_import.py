@@ -0,0 +1,252 @@
+"""Import a results sheet (CSV or Excel, one student per row).
+
+The subject columns of a row come from the active ``ResultTemplate`` for
+its class and exam type; classes without one use ``DEFAULT_SUBJECTS``,
+the columns of the spreadsheet view's download template.  The sheet is
+validated and graded column-wise with pandas/NumPy, grouped by class and
+exam, and saved with ``pipeline.save_results`` (one Result upsert, one
+SubjectResult replace).
+
+Every problem is reported as ``{'row', 'column', 'error'}`` with the row
+number as shown in the spreadsheet; nothing is saved unless the whole
+sheet is valid.
+
+Very large CSV files can instead go through ``import_csv_chunks()``,
+which reads the upload ``CSV_CHUNK_ROWS`` rows at a time and validates
+and saves each chunk in its own transaction, so memory stays flat.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from . import grading, pipeline
+
+DEFAULT_SUBJECTS = [
+    {'name': name, 'credit_hour': 4.0, 'total_marks': 100.0}
+    for name in ['Nepali', 'Math', 'Science', 'Computer', 'Social']
+]
+COLUMN_DEFAULTS = {'Class': '10', 'Exam Type': 'Final Term', 'Academic Year': '2024-25'}
+RESULT_IMPORT_FIELDS = [
+    'student_name', 'total', 'gpa', 'percentage', 'total_subjects', 'passed_subjects', 'failed_subjects',
+]
+# Header is spreadsheet row 1
+FIRST_DATA_ROW = 2
+CSV_CHUNK_ROWS = 2000
+
+
+class SheetError(ValueError):
+    """The file cannot be read as a results sheet at all."""
+
+
+def read_sheet(file):
+    """Read an uploaded .csv/.xlsx/.xls file into a DataFrame of strings."""
+    if file.name.endswith('.csv'):
+        df = pd.read_csv(io.StringIO(file.read().decode('utf-8-sig')), dtype=str)
+    elif file.name.endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(file, dtype=str)
+    else:
+        raise SheetError('Unsupported file format. Please upload CSV or Excel file.')
+    df.columns = [str(column).strip() for column in df.columns]
+    return df.dropna(how='all')
+
+
+def csv_chunks(file, chunk_rows=CSV_CHUNK_ROWS):
+    """Yield DataFrames of strings from an uploaded CSV without reading it all.
+
+    The index keeps counting across chunks, so ``index + FIRST_DATA_ROW``
+    is the spreadsheet row number.
+    """
+    file.seek(0)
+    # utf-8-sig: Excel's "CSV UTF-8" starts with a BOM that would stick to the first header
+    stream = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        for chunk in pd.read_csv(stream, dtype=str, chunksize=chunk_rows):
+            chunk.columns = [str(column).strip() for column in chunk.columns]
+            yield chunk.dropna(how='all')
+    finally:
+        # Leave the upload open for Django to clean up
+        stream.detach()
+
+
+def normalize_subjects(subjects):
+    """ResultTemplate.subjects as [{'name', 'credit_hour', 'total_marks'}].
+
+    Entries may be plain subject names or dicts; ``full_marks`` and
+    ``total`` are accepted for ``total_marks``.
+    """
+    normalized = []
+    for subject in subjects or []:
+        if isinstance(subject, str):
+            subject = {'name': subject}
+        total = subject.get('total_marks', subject.get('full_marks', subject.get('total')))
+        normalized.append({
+            'name': str(subject['name']).strip(),
+            'credit_hour': float(subject.get('credit_hour') or 4.0),
+            'total_marks': float(total or 100.0),
+        })
+    return normalized
+
+
+def template_subjects(groups):
+    """{(class_name, exam_type): subjects} for each group, in one query."""
+    from .models import ResultTemplate
+
+    templates = {}
+    # Newest template wins
+    for template in ResultTemplate.objects.filter(
+        is_active=True, class_name__in={class_name for class_name, _ in groups}
+    ).order_by('created_at'):
+        templates[(template.class_name, template.exam_type)] = normalize_subjects(template.subjects)
+    return {group: templates.get(group) or DEFAULT_SUBJECTS for group in groups}
+
+
+def _text(df, column, default=''):
+    if column not in df:
+        return pd.Series(default, index=df.index, dtype=object)
+    values = df[column].fillna('').astype(str).str.strip()
+    return values.where(values != '', default)
+
+
+def _errors(mask, rows, column, message):
+    return [{'row': int(row), 'column': column, 'error': message} for row in rows[mask]]
+
+
+def build(df):
+    """Validate and grade a sheet.
+
+    Returns (results, subject_results, result_index, rows, errors) where
+    ``rows`` is the per-student summary sent back to the spreadsheet view.
+    """
+    from .models import Result, Subject, SubjectResult
+
+    rows = df.index.to_numpy() + FIRST_DATA_ROW
+    sheet = pd.DataFrame({
+        'student_name': _text(df, 'Student Name'),
+        'roll_number': _text(df, 'Roll Number'),
+        'student_class': _text(df, 'Class', COLUMN_DEFAULTS['Class']),
+        'exam_type': _text(df, 'Exam Type', COLUMN_DEFAULTS['Exam Type']),
+        'academic_year': _text(df, 'Academic Year', COLUMN_DEFAULTS['Academic Year']),
+    }, index=df.index)
+    sheet['roll_number'] = sheet['roll_number'].where(
+        sheet['roll_number'] != '', pd.Series([f'R{i + 1:03d}' for i in df.index], index=df.index)
+    )
+
+    errors = _errors((sheet['student_name'] == '').to_numpy(), rows, 'Student Name', 'Student name is required')
+    duplicated = sheet.duplicated(pipeline.RESULT_UNIQUE_FIELDS, keep=False)
+    errors += _errors(duplicated.to_numpy(), rows, 'Roll Number', 'Roll number appears more than once for this class and exam')
+
+    groups = sheet.groupby(['student_class', 'exam_type'], sort=False).indices
+    subjects_by_group = template_subjects(list(groups))
+    subject_codes = dict(Subject.objects.filter(
+        name__in={s['name'] for subjects in subjects_by_group.values() for s in subjects}
+    ).values_list('name', 'code'))
+
+    results, subject_results, result_index, summaries = [], [], [], []
+    for (class_name, exam_type), positions in groups.items():
+        subjects = subjects_by_group[(class_name, exam_type)]
+        group = df.iloc[positions]
+        group_rows = rows[positions]
+
+        marks = np.zeros((len(positions), len(subjects)))
+        for j, subject in enumerate(subjects):
+            name = subject['name']
+            if name not in group:
+                errors.append({'row': None, 'column': name, 'error': f'Missing subject column for class {class_name} ({exam_type})'})
+                continue
+            raw = group[name].str.strip().replace('', np.nan)
+            values = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=float)
+            errors += _errors((raw.notna().to_numpy() & np.isnan(values)), group_rows, name, 'Marks must be a number')
+            out_of_range = (values < 0) | (values > subject['total_marks'])
+            errors += _errors(out_of_range, group_rows, name, f"Marks must be between 0 and {subject['total_marks']:g}")
+            # Blank cells count as 0, as they always have
+            marks[:, j] = np.nan_to_num(values)
+        if errors:
+            continue
+
+        n, k = marks.shape
+        student_index = np.repeat(np.arange(n), k)
+        group_subjects = grading.apply_subject_result_grades([
+            SubjectResult(
+                subject_name=subject['name'],
+                subject_code=subject_codes.get(subject['name']),
+                credit_hour=subject['credit_hour'],
+                theory_marks=float(marks[i, j]),
+                theory_total=subject['total_marks'],
+                total_marks=subject['total_marks'],
+                total_obtained=float(marks[i, j]),
+            )
+            for i in range(n) for j, subject in enumerate(subjects)
+        ], scale=grading.scale_for_class(class_name))
+        for subject_result in group_subjects:
+            subject_result.grade = subject_result.final_grade
+            subject_result.remarks = 'Passed' if subject_result.is_passed else 'Failed'
+
+        gpa = pipeline.weighted_gpa(
+            student_index,
+            [s.grade_point for s in group_subjects],
+            [s.credit_hour for s in group_subjects],
+            n,
+        ).round(2)
+        obtained = marks.sum(axis=1)
+        totals = obtained.round().astype(int)
+        passed = np.bincount(student_index, weights=[s.is_passed for s in group_subjects], minlength=n).astype(int)
+        # Marks obtained out of the marks possible, as the sheet has always reported
+        possible = sum(subject['total_marks'] for subject in subjects)
+        percentage = (obtained / possible * 100).round(2) if possible else np.zeros(n)
+
+        offset = len(results)
+        for i, info in enumerate(sheet.iloc[positions].to_dict('records')):
+            result = Result(
+                student_name=info['student_name'],
+                roll_number=info['roll_number'],
+                student_class=class_name,
+                exam_type=exam_type,
+                academic_year=info['academic_year'],
+                total=int(totals[i]),
+                gpa=float(gpa[i]),
+                percentage=float(percentage[i]),
+                total_subjects=k,
+                passed_subjects=int(passed[i]),
+                failed_subjects=k - int(passed[i]),
+            )
+            results.append(result)
+            summary = {field: getattr(result, field) for field in ['student_name', 'roll_number', 'student_class', 'exam_type', 'academic_year', 'total', 'gpa', 'percentage']}
+            summary['marks'] = {subject['name']: float(marks[i, j]) for j, subject in enumerate(subjects)}
+            # The spreadsheet view reads subjects as lower-case keys
+            for name, value in summary['marks'].items():
+                summary.setdefault(name.lower(), value)
+            summaries.append(summary)
+        subject_results += group_subjects
+        result_index += list(student_index + offset)
+
+    errors.sort(key=lambda e: (e['row'] is not None, e['row'] or 0))
+    return results, subject_results, result_index, summaries, errors
+
+
+def import_sheet(df, batch_size=500):
+    """Validate, grade and save a sheet; returns (rows, errors)."""
+    results, subject_results, result_index, rows, errors = build(df)
+    if errors:
+        return [], errors
+    if results:
+        with transaction.atomic():
+            pipeline.save_results(results, subject_results, result_index, RESULT_IMPORT_FIELDS, batch_size)
+    return rows, []
+
+
+def import_csv_chunks(file, chunk_rows=CSV_CHUNK_ROWS, batch_size=500):
+    """Import a CSV upload chunk by chunk, yielding a progress dict per chunk.
+
+    A chunk with errors is skipped as a whole; the other chunks are still
+    saved.  Roll numbers repeated in different chunks are not detected,
+    the later row wins.
+    """
+    totals = {'rows': 0, 'imported': 0, 'failed': 0}
+    for number, df in enumerate(csv_chunks(file, chunk_rows), start=1):
+        rows, errors = import_sheet(df, batch_size)
+        totals['rows'] += len(df)
+        totals['imported'] += len(rows)
+        totals['failed'] += len(df) - len(rows)
+        yield {'chunk': number, **totals, 'errors': errors}
@@ -0,0 +1,82 @@
+"""Static JSON snapshot of published results for results day.
+
+Every student with a published result gets their ``student_result_api``
+document written to::
+
+    STATIC_ROOT/results/<first two hex chars>/<sha256(symbol_number)>.json
+
+so ``results.js`` can fetch it straight from WhiteNoise without touching
+the database.  Files are only rewritten when the document's ETag changed,
+which makes re-running the export after a republish cheap.
+
+WhiteNoise indexes STATIC_ROOT when the web process starts, so export
+before starting (or restart after) to serve new files.
+
+The snapshot is a point-in-time copy, written only at deploy time
+(``build.sh``).  Nothing rewrites or deletes the files while the web
+process runs: WhiteNoise caches each file's size, ETag and
+Last-Modified when it indexes them, so a file changed underneath it
+would be served truncated or stale, and a deleted one would fail.
+Publishing, unpublishing or editing marks takes effect in the snapshot
+at the next deploy.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+
+from . import result_documents
+
+
+def snapshot_key(symbol_number):
+    return hashlib.sha256(str(symbol_number).encode()).hexdigest()
+
+
+def snapshot_path(symbol_number):
+    key = snapshot_key(symbol_number)
+    return os.path.join(settings.STATIC_ROOT, settings.RESULT_SNAPSHOT_DIR, key[:2], f'{key}.json')
+
+
+def _is_current(path, etag):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest() == etag
+    except FileNotFoundError:
+        return False
+
+
+def _write(path, body):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(body)
+    # Atomic, so a request never sees a half-written file
+    os.replace(tmp_path, path)
+
+
+def export(results, full=False):
+    """Write snapshot files for the students behind a published Result queryset.
+
+    Returns (written, unchanged).
+    """
+    from .models import Student, StudentResultDocument
+
+    students = Student.objects.filter(symbol_number__in=results.values('roll_number'))
+    missing = students.filter(result_document__isnull=True)
+    result_documents.build(missing)
+
+    written = unchanged = 0
+    documents = StudentResultDocument.objects.filter(student__in=students).values_list('symbol_number', 'etag', 'body')
+    for symbol_number, etag, body in documents.iterator(chunk_size=result_documents.CHUNK_SIZE):
+        path = snapshot_path(symbol_number)
+        if not full and _is_current(path, etag):
+            unchanged += 1
+            continue
+        _write(path, body)
+        written += 1
+    return written, unchanged
+
+
+def is_enabled():
+    """A snapshot has been exported on this host."""
+    return os.path.isdir(os.path.join(settings.STATIC_ROOT, settings.RESULT_SNAPSHOT_DIR))
@@ -37,6 +37,18 @@ class RegisterSerializer(serializers.Serializer):
             raise serializers.ValidationError("Username already exists.")
         return value
 
+    def validate_symbol_number(self, value):
+        from . import symbol_numbers
+        from .models import Student
+        value = value.strip()
+        if not value:
+            return value
+        if not symbol_numbers.valid(value):
+            raise serializers.ValidationError("Symbol number must be 8 digits.")
+        if Student.objects.filter(symbol_number=value).exists():
+            raise serializers.ValidationError("Symbol number already exists.")
+        return value
+
     def create(self, validated_data):
         role = validated_data['role']
         name = validated_data.get('name') or validated_data.get('full_name')
@@ -46,16 +58,9 @@ class RegisterSerializer(serializers.Serializer):
         user = User.objects.create_user(username=username, email=email, password=password, first_name=name)
         profile = Profile.objects.create(user=user, role=role)
         if role == 'student':
-            # Auto-generate unique symbol_number if not provided
+            # Left blank, Student.save() allocates a unique symbol_number
             from .models import Student
             symbol_number = validated_data.get('symbol_number', '')
-            if not symbol_number:
-                # Find the highest existing symbol_number (as int), increment by 1
-                last_student = Student.objects.order_by('-id').first()
-                if last_student and last_student.symbol_number and last_student.symbol_number.isdigit():
-                    symbol_number = str(int(last_student.symbol_number) + 1)
-                else:
-                    symbol_number = '1001'  # Start from 1001 if none exist
             student = Student.objects.create(
                 user=user,  # Always set user
                 profile=profile,
@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import analytics, grading, result_documents
+from .models import GradeScale, Marks, Result, Student, Subject
+
+
+@receiver(post_save, sender=Result)
+@receiver(post_delete, sender=Result)
+def refresh_result_analytics(sender, instance, **kwargs):
+    analytics.results_changed([instance])
+
+
+@receiver(post_save, sender=Marks)
+@receiver(post_delete, sender=Marks)
+def refresh_subject_performance(sender, instance, **kwargs):
+    analytics.marks_changed([instance])
+    result_documents.marks_changed([instance])
+
+
+@receiver(post_save, sender=Student)
+def drop_result_document(sender, instance, **kwargs):
+    result_documents.invalidate([instance.id])
+
+
+@receiver(post_save, sender=Subject)
+def drop_subject_result_documents(sender, instance, **kwargs):
+    # Documents embed the subject name and credit hours
+    result_documents.subject_changed(instance)
+
+
+@receiver(post_save, sender=GradeScale)
+@receiver(post_delete, sender=GradeScale)
+def clear_grade_scale_cache(sender, instance, **kwargs):
+    grading.clear_scale_cache()
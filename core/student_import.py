@@ -0,0 +1,196 @@
+"""Bulk import of students from a spreadsheet.
+
+The sheet is normalized and validated column-wise with pandas; symbol
+numbers and usernames are checked against the database with one query
+each, and the valid rows are written with ``bulk_create``.  Optionally a
+login ``User`` (and its ``Profile`` with role ``student``) is created for
+every imported student as well.
+
+Rows without a symbol number get consecutive numbers from one block
+reserved with ``symbol_numbers.reserve()``.  Rows that fail validation
+are reported and skipped; the rest are imported.  Row numbers are as shown in the spreadsheet.  Large CSV files
+can be imported chunk by chunk with ``import_csv_chunks()``.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import symbol_numbers
+from .result_import import CSV_CHUNK_ROWS, csv_chunks
+
+REQUIRED_COLUMNS = ['full_name', 'symbol_number', 'student_class', 'date_of_birth', 'gender']
+OPTIONAL_COLUMNS = ['email', 'parent_name', 'parent_contact', 'address', 'phone_number']
+# Must be filled in on every row (parent_name is not blank=True on Student)
+REQUIRED_VALUES = ['full_name', 'student_class', 'parent_name']
+# Checked against the Student field's max_length
+TEXT_COLUMNS = ['username', 'full_name', 'symbol_number', 'student_class', 'email', 'phone_number',
+                'address', 'parent_name', 'parent_contact']
+GENDERS = {'male': 'Male', 'female': 'Female', 'other': 'Other'}
+BATCH_SIZE = 500
+# Header is spreadsheet row 1
+FIRST_DATA_ROW = 2
+
+
+def _text(df, column):
+    if column not in df:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[column].fillna('').astype(str).str.strip()
+
+
+def normalize(df):
+    """One clean string (or date) column per Student field, same index as ``df``."""
+    students = pd.DataFrame({column: _text(df, column) for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}, index=df.index)
+    # Numeric symbol numbers read from Excel come back as "1234.0"
+    students['symbol_number'] = students['symbol_number'].str.replace(r'\.0$', '', regex=True)
+    students['gender'] = students['gender'].str.lower().map(GENDERS)
+    students['date_of_birth'] = pd.to_datetime(students['date_of_birth'].replace('', None), errors='coerce').dt.date
+    students['username'] = _text(df, 'username')
+    students['password'] = _text(df, 'password')
+    students['row'] = df.index + FIRST_DATA_ROW
+    return students
+
+
+def fill_defaults(students):
+    """Number the rows without a symbol number and give rows without a username the default one."""
+    blank = students['symbol_number'] == ''
+    if blank.any():
+        students.loc[blank, 'symbol_number'] = symbol_numbers.reserve(int(blank.sum()))
+    students['username'] = students['username'].where(
+        students['username'] != '', 'student_' + students['symbol_number']
+    )
+    return students
+
+
+def _existing_usernames(usernames, check_users):
+    from .models import Student
+
+    taken = Student.objects.filter(username__in=usernames).values_list('username', flat=True)
+    if check_users:
+        taken = taken.union(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    return set(taken)
+
+
+def validate(students, create_accounts=False):
+    """Series of error messages ('' for valid rows)."""
+    from .models import Student
+
+    errors = pd.Series('', index=students.index, dtype=object)
+
+    def flag(mask, message):
+        # Keep the first problem found for each row
+        errors[mask & (errors == '')] = message
+
+    for column in REQUIRED_VALUES:
+        flag(students[column] == '', f'{column} is required')
+    for column in TEXT_COLUMNS:
+        max_length = Student._meta.get_field(column).max_length
+        flag(students[column].str.len() > max_length, f'{column} is longer than {max_length} characters')
+    flag(students['date_of_birth'].isna(), 'date_of_birth is not a valid date')
+    flag(students['gender'].isna(), f"gender must be one of {', '.join(GENDERS.values())}")
+    flag(students['symbol_number'].duplicated(keep=False), 'Symbol number appears more than once in the file')
+    flag(students['username'].duplicated(keep=False), 'Username appears more than once in the file')
+
+    existing_symbols = set(
+        Student.objects.filter(symbol_number__in=list(students['symbol_number'])).values_list('symbol_number', flat=True)
+    )
+    flag(students['symbol_number'].isin(existing_symbols), 'Student with this symbol number already exists')
+    existing_usernames = _existing_usernames(list(students['username']), create_accounts)
+    flag(students['username'].isin(existing_usernames), 'Username already exists')
+    return errors
+
+
+def _create_accounts(students, batch_size):
+    """Bulk-create a User and a student Profile per row; returns {username: (user_id, profile_id)}."""
+    from .models import Profile
+
+    passwords = list(students['password'])
+    given = [password for password in passwords if password]
+    # PBKDF2 releases the GIL, so hashing scales across threads
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        hashed = iter(executor.map(make_password, given))
+    users = []
+    for student, password in zip(students.to_dict('records'), passwords):
+        first_name, _, last_name = student['full_name'].partition(' ')
+        users.append(User(
+            username=student['username'],
+            email=student['email'],
+            first_name=first_name,
+            last_name=last_name,
+            # No password column: the account is created without a usable password
+            password=next(hashed) if password else make_password(None),
+        ))
+    User.objects.bulk_create(users, batch_size=batch_size)
+
+    # Primary keys are not returned by every backend
+    user_ids = dict(User.objects.filter(username__in=list(students['username'])).values_list('username', 'id'))
+    Profile.objects.bulk_create(
+        [Profile(user_id=user_id, role='student') for user_id in user_ids.values()], batch_size=batch_size
+    )
+    profile_ids = dict(Profile.objects.filter(user_id__in=list(user_ids.values())).values_list('user_id', 'id'))
+    return {username: (user_id, profile_ids[user_id]) for username, user_id in user_ids.items()}
+
+
+def import_students(df, create_accounts=False, batch_size=BATCH_SIZE):
+    """Import the valid rows of ``df``; returns per-row results as the API reports them."""
+    from .models import Student
+
+    students = fill_defaults(normalize(df))
+    errors = validate(students, create_accounts)
+    valid = students[errors == '']
+
+    with transaction.atomic():
+        # Before the insert, so the sequence cannot hand out an imported number meanwhile
+        symbol_numbers.observe(valid['symbol_number'])
+        accounts = _create_accounts(valid, batch_size) if create_accounts and len(valid) else {}
+        Student.objects.bulk_create([
+            Student(
+                user_id=accounts.get(student['username'], (None, None))[0],
+                profile_id=accounts.get(student['username'], (None, None))[1],
+                username=student['username'],
+                full_name=student['full_name'],
+                symbol_number=student['symbol_number'],
+                student_class=student['student_class'],
+                date_of_birth=student['date_of_birth'],
+                gender=student['gender'],
+                email=student['email'],
+                phone_number=student['phone_number'],
+                parent_name=student['parent_name'],
+                parent_contact=student['parent_contact'],
+                address=student['address'],
+            )
+            for student in valid.to_dict('records')
+        ], batch_size=batch_size)
+
+    results = []
+    for student, error in zip(students.to_dict('records'), errors):
+        result = {'row': student['row'], 'symbol_number': student['symbol_number']}
+        if error:
+            result.update({'status': 'error', 'message': error})
+        else:
+            result.update({'student_name': student['full_name'], 'status': 'success', 'message': 'Student created successfully'})
+        results.append(result)
+    return results
+
+
+def import_csv_chunks(file, create_accounts=False, chunk_rows=CSV_CHUNK_ROWS, batch_size=BATCH_SIZE):
+    """Import a CSV upload chunk by chunk (one transaction each), yielding progress.
+
+    Each progress dict carries only that chunk's failed rows.  Duplicates
+    across chunks are caught by the database check of the later chunk.
+    """
+    totals = {'rows': 0, 'imported': 0, 'failed': 0}
+    for number, df in enumerate(csv_chunks(file, chunk_rows), start=1):
+        missing_columns = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+        if missing_columns:
+            yield {'chunk': number, **totals, 'error': f'Missing required columns: {", ".join(missing_columns)}'}
+            return
+        results = import_students(df, create_accounts, batch_size)
+        errors = [result for result in results if result['status'] == 'error']
+        totals['rows'] += len(results)
+        totals['imported'] += len(results) - len(errors)
+        totals['failed'] += len(errors)
+        yield {'chunk': number, **totals, 'errors': errors}
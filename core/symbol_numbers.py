@@ -0,0 +1,158 @@
+"""Symbol number allocation.
+
+Symbol numbers are 8 digits (``FIRST_SYMBOL_NUMBER`` to
+``LAST_SYMBOL_NUMBER``).  The existing numbers were picked at random
+across that whole range, so new ones are handed out in order from the
+free blocks between them: a ``SymbolNumberSequence`` row holds the next
+number and ``block_end``, the first number past the current block (the
+next number in use, or the end of the range).
+
+Within a block a number is taken with a single ``UPDATE ... RETURNING``
+statement.  The row lock taken by the update makes concurrent callers
+(several gunicorn workers, the job worker) queue up behind each other,
+so every number is handed out once without an ``exists()`` check or a
+retry loop.  ``reserve(n)`` takes a contiguous block for bulk imports in
+the same single statement.  Only when the block runs out is the row
+locked and the next free block looked up, with one query.  ``peek()``
+shows the next number without taking it.
+
+Numbers are never returned to the sequence: a number allocated for a
+form that is never submitted is simply skipped.  Numbers entered by hand
+are passed to ``observe()`` before they are inserted, in the same
+transaction; one that lies ahead in the current block ends the block
+there, so the sequence never hands it out.
+"""
+import re
+
+from django.db import IntegrityError, connection, transaction
+
+SEQUENCE = 'student'
+# Symbol numbers have always been 8 digits
+FIRST_SYMBOL_NUMBER = 10000000
+LAST_SYMBOL_NUMBER = 99999999
+_SYMBOL_NUMBER = re.compile(r'^[1-9][0-9]{7}$')
+
+
+class SymbolNumbersExhausted(RuntimeError):
+    """No free block of the requested size is left in the 8-digit range."""
+
+
+def valid(value):
+    """True for an 8-digit symbol number, the only kind the sequence hands out."""
+    return bool(_SYMBOL_NUMBER.match(str(value)))
+
+
+def _numeric(values):
+    # Anything else (letters, other lengths) cannot clash with the sequence
+    return [int(value) for value in values if value and valid(value)]
+
+
+def _free_block(start, count, extra=()):
+    """(first, block_end) of the first run of ``count`` free numbers from ``start``.
+
+    ``extra`` are numbers about to be inserted, counted as in use.
+    """
+    from .models import Student
+
+    if start > LAST_SYMBOL_NUMBER:
+        raise SymbolNumbersExhausted(f'No free block of {count} symbol numbers left')
+    # 8-digit strings sort like the numbers they hold
+    stored = Student.objects.filter(
+        symbol_number__regex=_SYMBOL_NUMBER.pattern, symbol_number__gte=str(start)
+    ).values_list('symbol_number', flat=True)
+    used = sorted(set(_numeric(stored)) | {number for number in extra if number >= start})
+    first = start
+    for number in used + [LAST_SYMBOL_NUMBER + 1]:
+        if number - first >= count:
+            return first, number
+        first = max(first, number + 1)
+    raise SymbolNumbersExhausted(f'No free block of {count} symbol numbers left')
+
+
+def _locked_sequence(extra=()):
+    """The sequence row, locked until the end of the transaction; created if missing."""
+    from .models import SymbolNumberSequence
+
+    sequence = SymbolNumberSequence.objects.select_for_update().filter(name=SEQUENCE).first()
+    if sequence is None:
+        first, block_end = _free_block(FIRST_SYMBOL_NUMBER, 1, extra)
+        try:
+            with transaction.atomic():
+                SymbolNumberSequence.objects.create(name=SEQUENCE, next_value=first, block_end=block_end)
+        except IntegrityError:
+            # Another worker created it first
+            pass
+        sequence = SymbolNumberSequence.objects.select_for_update().get(name=SEQUENCE)
+    return sequence
+
+
+def _advance(count):
+    """Take ``count`` numbers from the current block; returns the new next value.
+
+    None if the sequence does not exist yet or the block is too short.
+    """
+    from .models import SymbolNumberSequence
+
+    table = connection.ops.quote_name(SymbolNumberSequence._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET next_value = next_value + %s '
+            f'WHERE name = %s AND next_value + %s <= block_end RETURNING next_value',
+            [count, SEQUENCE, count],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def reserve(count):
+    """Reserve ``count`` consecutive symbol numbers; returns them as strings."""
+    if count <= 0:
+        return []
+    end = _advance(count)
+    if end is None:
+        with transaction.atomic():
+            sequence = _locked_sequence()
+            # Another worker may have moved on to a new block while we waited
+            end = _advance(count)
+            if end is None:
+                first, sequence.block_end = _free_block(sequence.next_value, count)
+                sequence.next_value = end = first + count
+                sequence.save(update_fields=['next_value', 'block_end'])
+    return [str(number) for number in range(end - count, end)]
+
+
+def allocate():
+    """One new symbol number."""
+    return reserve(1)[0]
+
+
+def peek():
+    """The number allocate() would hand out next, without taking it.
+
+    Only a preview: another caller may allocate it first.
+    """
+    from .models import SymbolNumberSequence
+
+    sequence = SymbolNumberSequence.objects.filter(name=SEQUENCE).first()
+    if sequence is None:
+        return str(_free_block(FIRST_SYMBOL_NUMBER, 1)[0])
+    if sequence.next_value < sequence.block_end:
+        return str(sequence.next_value)
+    return str(_free_block(sequence.next_value, 1)[0])
+
+
+def observe(symbol_numbers):
+    """Keep the sequence from handing out 8-digit symbol numbers chosen by hand.
+
+    Call it before inserting them, in the same transaction: the sequence
+    row stays locked until the insert commits.
+    """
+    used = _numeric(symbol_numbers)
+    if not used:
+        return
+    with transaction.atomic():
+        sequence = _locked_sequence(extra=used)
+        ahead = [number for number in used if sequence.next_value <= number < sequence.block_end]
+        if ahead:
+            sequence.block_end = min(ahead)
+            sequence.save(update_fields=['block_end'])
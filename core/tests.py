@@ -1,3 +1,704 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMultiAlternatives
+from django.db import IntegrityError
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from . import (
+    analytics, grading, jobs, outbox, pipeline, regrade, render_cache, result_documents, result_import,
+    student_import, symbol_numbers, views,
+)
+from .management.commands.benchmark_outbox import AIOSMTPD_AVAILABLE, _StandIn, _free_port
+from .models import (
+    GradeScale, Job, Marks, OutboundEmail, Result, Student, StudentResultDocument, Subject, SubjectPerformance,
+    SubjectResult,
+)
+from .serializers import RegisterSerializer
+
+if AIOSMTPD_AVAILABLE:
+    from aiosmtpd.controller import Controller
+
+
+class FakeClock:
+    """Stands in for time.monotonic/time.sleep: sleeping just moves the clock on."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def _message(to='student@example.com'):
+    message = EmailMultiAlternatives(subject='Result', body='Body', from_email='school@example.com', to=[to])
+    message.attach_alternative('<p>Body</p>', 'text/html')
+    return message
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_burst_is_free_then_paced_at_rate(self):
+        clock = FakeClock()
+        bucket = outbox.TokenBucket(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+        for _ in range(3):
+            bucket.take()
+        self.assertEqual(clock.slept, [])
+
+        bucket.take()
+        bucket.take()
+        self.assertEqual(clock.slept, [0.5, 0.5])
+
+    def test_refills_while_idle_up_to_burst(self):
+        clock = FakeClock()
+        bucket = outbox.TokenBucket(rate=1, burst=2, clock=clock, sleep=clock.sleep)
+        bucket.take()
+        bucket.take()
+        clock.now += 60
+        bucket.take()
+        bucket.take()
+        self.assertEqual(clock.slept, [])
+        bucket.take()
+        self.assertEqual(clock.slept, [1.0])
+
+    def test_zero_rate_never_waits(self):
+        clock = FakeClock()
+        bucket = outbox.TokenBucket(rate=0, clock=clock, sleep=clock.sleep)
+        for _ in range(100):
+            bucket.take()
+        self.assertEqual(clock.slept, [])
+
+
+@override_settings(OUTBOX_RETRY_BASE=60, OUTBOX_RETRY_MAX=600)
+class RetryDelayTests(SimpleTestCase):
+    def test_doubles_per_attempt_up_to_max(self):
+        with mock.patch('core.outbox.random.uniform', return_value=1.0):
+            self.assertEqual([outbox.retry_delay(n) for n in range(1, 6)], [60, 120, 240, 480, 600])
+
+    def test_jitter_stays_within_half_to_full_delay(self):
+        for attempts in range(1, 8):
+            delay = min(60 * 2 ** (attempts - 1), 600)
+            for _ in range(20):
+                self.assertTrue(delay / 2 <= outbox.retry_delay(attempts) <= delay)
+
+
+@override_settings(OUTBOX_MAX_ATTEMPTS=3, OUTBOX_RETRY_BASE=60, OUTBOX_RETRY_MAX=600)
+class MarkFailedTests(TestCase):
+    def setUp(self):
+        self.row, = outbox.queue([_message()], status=OutboundEmail.SENDING)
+
+    def test_failure_is_retried_later(self):
+        status = outbox.mark_failed(self.row, 'Connection refused')
+
+        self.assertEqual(status, OutboundEmail.PENDING)
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.status, OutboundEmail.PENDING)
+        self.assertEqual(self.row.attempts, 1)
+        self.assertEqual(self.row.last_error, 'Connection refused')
+        self.assertGreater(self.row.next_attempt_at, self.row.created_at)
+
+    def test_dead_letter_after_max_attempts(self):
+        statuses = [outbox.mark_failed(self.row, f'Failure {n}') for n in range(3)]
+
+        self.assertEqual(statuses, [OutboundEmail.PENDING, OutboundEmail.PENDING, OutboundEmail.DEAD])
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.status, OutboundEmail.DEAD)
+        self.assertEqual(self.row.attempts, 3)
+        self.assertEqual(self.row.last_error, 'Failure 2')
+
+    def test_dead_letters_are_not_claimed(self):
+        for _ in range(3):
+            outbox.mark_failed(self.row, 'Failure')
+
+        self.assertEqual(outbox.claim(10), [])
+
+
+@skipUnless(AIOSMTPD_AVAILABLE, 'aiosmtpd is not installed (pip install -r requirements-dev.txt)')
+class DrainTests(TestCase):
+    def setUp(self):
+        self.handler = _StandIn(latency=0, fail_rate=0)
+        self.controller = Controller(self.handler, hostname='127.0.0.1', port=_free_port())
+        self.controller.start()
+        self.addCleanup(self.controller.stop)
+        smtp = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST=self.controller.hostname,
+            EMAIL_PORT=self.controller.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_USE_SSL=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+        )
+        smtp.enable()
+        self.addCleanup(smtp.disable)
+
+    def test_drain_delivers_due_emails(self):
+        outbox.queue([_message(f'student{i}@example.com') for i in range(5)])
+
+        counts = outbox.drain(outbox.TokenBucket(0))
+
+        self.assertEqual(counts, {'sent': 5, 'retrying': 0, 'dead': 0})
+        self.assertEqual(self.handler.received, 5)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.SENT, attempts=1).count(), 5)
+
+    def test_refused_email_is_retried(self):
+        self.handler.fail_rate = 1
+        outbox.queue([_message()])
+
+        counts = outbox.drain(outbox.TokenBucket(0))
+
+        self.assertEqual(counts, {'sent': 0, 'retrying': 1, 'dead': 0})
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.PENDING)
+
+
+class SymbolNumberTests(TestCase):
+    def _student(self, username, symbol_number=''):
+        return Student.objects.create(
+            username=username, full_name=username, date_of_birth=date(2010, 1, 1), gender='Male',
+            student_class='10', parent_name='Parent', symbol_number=symbol_number,
+        )
+
+    def test_allocate_skips_numbers_in_use(self):
+        for username, symbol_number in [('a', '10000000'), ('b', '10000001'), ('c', '10000004'), ('d', 'X-1')]:
+            self._student(username, symbol_number)
+
+        self.assertEqual([symbol_numbers.allocate() for _ in range(3)], ['10000002', '10000003', '10000005'])
+
+    def test_numbers_stay_8_digits_when_the_top_of_the_range_is_used(self):
+        self._student('highest', str(symbol_numbers.LAST_SYMBOL_NUMBER))
+
+        self.assertEqual(symbol_numbers.allocate(), str(symbol_numbers.FIRST_SYMBOL_NUMBER))
+
+    def test_allocate_never_repeats(self):
+        numbers = [symbol_numbers.allocate() for _ in range(5)]
+
+        self.assertEqual(numbers, [str(symbol_numbers.FIRST_SYMBOL_NUMBER + i) for i in range(5)])
+
+    def test_reserve_takes_a_contiguous_block(self):
+        first = symbol_numbers.allocate()
+        block = symbol_numbers.reserve(3)
+
+        self.assertEqual(block, [str(int(first) + i) for i in (1, 2, 3)])
+        self.assertEqual(symbol_numbers.allocate(), str(int(first) + 4))
+        self.assertEqual(symbol_numbers.reserve(0), [])
+
+    def test_reserve_moves_to_a_free_block_that_fits(self):
+        self._student('a', '10000002')
+
+        self.assertEqual(symbol_numbers.reserve(3), ['10000003', '10000004', '10000005'])
+
+    def test_exhausted_range_raises(self):
+        with mock.patch.object(symbol_numbers, 'LAST_SYMBOL_NUMBER', symbol_numbers.FIRST_SYMBOL_NUMBER + 1):
+            self.assertEqual(symbol_numbers.reserve(2), ['10000000', '10000001'])
+            with self.assertRaises(symbol_numbers.SymbolNumbersExhausted):
+                symbol_numbers.allocate()
+
+    def test_peek_does_not_advance(self):
+        preview = symbol_numbers.peek()
+
+        self.assertEqual(symbol_numbers.peek(), preview)
+        self.assertEqual(symbol_numbers.allocate(), preview)
+
+    def test_observe_ends_the_block_before_a_number_entered_by_hand(self):
+        symbol_numbers.allocate()
+        symbol_numbers.observe(['10000002', 'X-7', ''])
+
+        self.assertEqual(symbol_numbers.allocate(), '10000001')
+
+    def test_save_skips_a_chosen_number(self):
+        self._student('first')
+        self._student('chosen', '10000002')
+
+        self.assertEqual(
+            [self._student(f'allocated{i}').symbol_number for i in range(2)], ['10000001', '10000003']
+        )
+
+    def test_numbers_that_are_not_8_digits_are_ignored(self):
+        self._student('huge', '99999999999999999999')
+        self._student('near_bigint_max', '9223372036854775806')
+        symbol_numbers.observe(['123', '012345678'])
+
+        self.assertEqual(self._student('allocated').symbol_number, str(symbol_numbers.FIRST_SYMBOL_NUMBER))
+
+    def test_signup_rejects_symbol_numbers_that_are_not_8_digits(self):
+        for symbol_number in ['9223372036854775806', '1234', 'ABC12345']:
+            serializer = RegisterSerializer(data={
+                'role': 'student', 'name': 'Asha', 'username': f'asha{symbol_number}', 'password': 'pw',
+                'symbol_number': symbol_number,
+            })
+            self.assertFalse(serializer.is_valid())
+            self.assertIn('symbol_number', serializer.errors)
+
+    def test_failed_insert_does_not_move_the_sequence(self):
+        self._student('taken')
+        expected = symbol_numbers.peek()
+
+        with self.assertRaises(IntegrityError):
+            self._student('taken', '10000900')
+
+        self.assertEqual(symbol_numbers.peek(), expected)
+
+
+# Only B and above pass: C keeps the default pass grade point but is a fail
+CUSTOM_SCALE = [(80, 'A', 4.0), (60, 'B', 3.0), (40, 'C', 2.0, False)]
+
+
+class GradingTests(TestCase):
+    def setUp(self):
+        for minimum, grade, point, *is_pass in CUSTOM_SCALE:
+            GradeScale.objects.create(
+                class_name='10', grade=grade, min_marks=minimum, max_marks=minimum + 19.99, grade_point=point,
+                is_pass=is_pass[0] if is_pass else True,
+            )
+        grading.clear_scale_cache()
+
+    def test_grade_boundaries(self):
+        # Theory only, so anything below 40% fails the theory rule before the scale's D band
+        scores = [100, 90, 89.99, 50, 40, 39.99, 30, 29.99, 0]
+
+        graded = grading.grade_marks(scores, [100] * 9, [None] * 9, [0] * 9)
+
+        self.assertEqual(list(graded['grade']), ['A+', 'A+', 'A', 'C+', 'C', 'NG', 'NG', 'NG', 'NG'])
+        self.assertEqual(list(graded['grade_point']), [4.0, 4.0, 3.6, 2.4, 2.0, 0.0, 0.0, 0.0, 0.0])
+        self.assertEqual(list(graded['is_passed']), [True, True, True, True, True, False, False, False, False])
+
+    def test_boundaries_on_the_combined_percentage(self):
+        # 30/75 theory passes the 40% theory rule; 30 + 5 of 100 is a D, below the pass grade point
+        graded = grading.grade_marks([30, 30, 29], [75, 75, 75], [5, 10, 25], [25, 25, 25])
+
+        self.assertEqual(list(graded['percentage']), [35.0, 40.0, 54.0])
+        self.assertEqual(list(graded['grade']), ['D', 'C', 'NG'])
+        self.assertEqual(list(graded['is_passed']), [False, True, False])
+
+    def test_subject_results_pass_on_the_same_scale_as_marks(self):
+        scale = grading.CompiledScale(CUSTOM_SCALE)
+
+        marks = grading.grade_marks([50, 70], [100, 100], [None, None], [0, 0], scale)
+        subject_results = grading.grade_subject_results([50, 70], [100, 100], [None, None], scale)
+
+        self.assertEqual(list(marks['is_passed']), [False, True])
+        self.assertEqual(list(subject_results['is_passed']), [False, True])
+
+    def test_sql_regrade_matches_numpy(self):
+        result = Result.objects.create(student_name='Asha Rai', roll_number='1', student_class='10', total=0)
+        rows = [(95, 100, 20), (50, 100, None), (70, 75, 15), (30, 100, 20), (None, 100, None)]
+        for i, (theory, theory_total, practical) in enumerate(rows):
+            SubjectResult.objects.create(
+                result=result, subject_name=f'Subject {i}', credit_hour=4,
+                theory_marks=theory, theory_total=theory_total, practical_marks=practical,
+            )
+        fields = ['subject_name'] + grading.SUBJECT_RESULT_GRADED_FIELDS
+        expected = list(SubjectResult.objects.values_list(*fields))
+        SubjectResult.objects.update(
+            theory_grade=None, theory_grade_point=None, practical_grade=None, practical_grade_point=None,
+            grade_point=None, final_grade=None, is_passed=True,
+        )
+
+        regrade.regrade_subject_results(SubjectResult.objects.all())
+
+        self.assertEqual(list(SubjectResult.objects.values_list(*fields)), expected)
+
+    def test_sql_regrade_of_marks_matches_numpy(self):
+        math = Subject.objects.create(name='Math')
+        for class_name in ('9', '10'):
+            for i, (theory, theory_total, practical, practical_total) in enumerate(
+                [(95, 100, None, 0), (50, 100, None, 0), (45, 75, 20, 25), (29, 75, 25, 25), (None, 100, None, 0)]
+            ):
+                student = Student.objects.create(
+                    username=f'{class_name}-{i}', full_name=f'Student {i}', date_of_birth=date(2010, 1, 1),
+                    gender='Female', student_class=class_name, parent_name='Parent',
+                )
+                Marks.objects.create(
+                    student=student, subject=math, theory_marks=theory, theory_total=theory_total,
+                    practical_marks=practical, practical_total=practical_total,
+                )
+        fields = ['student__username', 'grade', 'grade_point', 'is_passed']
+        expected = list(Marks.objects.order_by('student__username').values_list(*fields))
+        Marks.objects.update(grade=None, grade_point=None, is_passed=True)
+
+        self.assertEqual(regrade.regrade_marks(Marks.objects.all()), 10)
+
+        self.assertEqual(list(Marks.objects.order_by('student__username').values_list(*fields)), expected)
+        # Class 10 has its own scale: 50% is a C there, and C is a fail
+        self.assertEqual(Marks.objects.get(student__username='10-1').is_passed, False)
+        self.assertEqual(Marks.objects.get(student__username='9-1').is_passed, True)
+
+
+class PlaceholderMarksTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('admin', password='pw', is_staff=True)
+        self.students = [
+            Student.objects.create(
+                username=name, full_name=name, date_of_birth=date(2010, 1, 1), gender='Female',
+                student_class='10', parent_name='Parent',
+            )
+            for name in ('asha', 'bina')
+        ]
+
+    def _set_subjects(self, subjects):
+        request = APIRequestFactory().post('/api/subjects/set-for-class/', {
+            'class_name': '10', 'exam_type': 'Final Term', 'academic_year': '2081', 'subjects': subjects,
+        }, format='json')
+        force_authenticate(request, self.staff)
+        return views.set_subjects_for_class(request)
+
+    def test_placeholders_stay_out_of_rollups_and_results(self):
+        self.assertEqual(self._set_subjects(['Math', 'Science']).data['created'], 4)
+        entered = Marks.objects.get(student=self.students[0], subject=Subject.objects.get(name='Math'))
+        entered.theory_marks = 85
+        entered.save()
+
+        analytics.refresh_subject_performance()
+        counts = pipeline.build_results('Final Term', '2081')
+
+        performance = SubjectPerformance.objects.get()
+        self.assertEqual((performance.subject_name, performance.total_students, performance.failed_students), ('Math', 1, 0))
+        self.assertEqual(counts['students'], 1)
+        result = Result.objects.get()
+        self.assertEqual((result.total_subjects, result.failed_subjects), (1, 0))
+        self.assertEqual(analytics.dashboard_summary('Final Term', '2081')['fail_count'], 0)
+
+
+class PipelineRankingTests(TestCase):
+    def setUp(self):
+        self.math = Subject.objects.create(name='Math')
+        self.marks = {}
+        for name, score in [('asha', 90), ('bina', 60), ('chandra', 60)]:
+            student = Student.objects.create(
+                username=name, full_name=name, date_of_birth=date(2010, 1, 1), gender='Female',
+                student_class='10', parent_name='Parent',
+            )
+            self.marks[name] = Marks.objects.create(
+                student=student, subject=self.math, exam_type='Final Term', academic_year='2081', theory_marks=score,
+            )
+
+    def _positions(self):
+        return dict(Result.objects.values_list('student_name', 'class_position'))
+
+    def test_results_are_ranked_by_gpa_with_shared_ties(self):
+        pipeline.build_results('Final Term', '2081')
+
+        self.assertEqual(self._positions(), {'asha': 1, 'bina': 2, 'chandra': 2})
+        self.assertEqual(set(Result.objects.values_list('total_students', flat=True)), {3})
+
+    def test_rebuild_ranks_on_the_new_gpa(self):
+        pipeline.build_results('Final Term', '2081')
+        bina = self.marks['bina']
+        bina.theory_marks = 95
+        grading.save_marks_bulk([], [bina])
+
+        self.assertEqual(self._positions(), {'asha': 1, 'bina': 2, 'chandra': 2})
+        counts = pipeline.build_results('Final Term', '2081')
+
+        self.assertEqual(counts['students'], 1)
+        self.assertEqual(self._positions(), {'bina': 1, 'asha': 2, 'chandra': 3})
+
+
+class RenderCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.enterContext(override_settings(RENDER_CACHE_DIR=self.directory))
+
+    def _file(self, name, size, age):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_evict_removes_least_recently_used_entries(self):
+        old = self._file('old', 100, 60)
+        new = self._file('new', 100, 0)
+
+        self.assertEqual(render_cache.evict(max_bytes=150), 1)
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(new))
+
+    def test_evict_leaves_files_being_written_alone(self):
+        writing = self._file(render_cache.TMP_PREFIX + 'writing', 100, 60)
+        abandoned = self._file(render_cache.TMP_PREFIX + 'abandoned', 100, render_cache.TMP_FILE_MAX_AGE + 60)
+        entry = self._file('entry', 100, 0)
+
+        render_cache.evict(max_bytes=0)
+
+        self.assertTrue(os.path.exists(writing))
+        self.assertFalse(os.path.exists(abandoned))
+        self.assertFalse(os.path.exists(entry))
+
+
+class ClassMarksMatrixTests(TestCase):
+    def _student(self, name):
+        student = Student.objects.create(
+            username=name, full_name=name, date_of_birth=date(2010, 1, 1), gender='Female',
+            student_class='10', parent_name='Parent',
+        )
+        Marks.objects.create(
+            student=student, subject=self.math, exam_type='Final Term', academic_year='2081', theory_marks=70,
+        )
+        return student
+
+    def test_student_added_while_loading_is_left_out(self):
+        self.math = Subject.objects.create(name='Math')
+        asha = self._student('asha')
+        marks_filter = Marks.objects.filter
+
+        def add_student_first(*args, **kwargs):
+            # Saving bina runs Marks queries of its own
+            if not Student.objects.filter(username='bina').exists():
+                self._student('bina')
+            return marks_filter(*args, **kwargs)
+
+        request = APIRequestFactory().get('/', {'class': '10', 'exam_type': 'Final Term', 'academic_year': '2081'})
+        force_authenticate(request, User.objects.create_user('teacher', password='pw'))
+        with mock.patch.object(Marks.objects, 'filter', side_effect=add_student_first):
+            response = views.ClassMarksMatrixView.as_view()(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['students']['ids'], [asha.id])
+        self.assertEqual(response.data['cells']['student_index'], [0])
+
+
+class ResultDocumentTests(TestCase):
+    def setUp(self):
+        self.subject = Subject.objects.create(name='Math')
+        self.student = Student.objects.create(
+            username='asha', full_name='Asha Rai', date_of_birth=date(2010, 1, 1), gender='Female',
+            student_class='10', parent_name='Parent',
+        )
+        Marks.objects.create(
+            student=self.student, subject=self.subject, exam_type='Final Term', academic_year='2081', theory_marks=85,
+        )
+
+    def test_document_rendered_during_an_invalidation_is_not_kept(self):
+        render = result_documents.render
+
+        def render_while_marks_change(student):
+            body = render(student)
+            with self.captureOnCommitCallbacks(execute=True):
+                result_documents.invalidate([student.id])
+            return body
+
+        with mock.patch.object(result_documents, 'render', side_effect=render_while_marks_change):
+            result_documents.get(self.student.symbol_number)
+
+        self.assertFalse(StudentResultDocument.objects.exists())
+        result_documents.get(self.student.symbol_number)
+        self.assertTrue(StudentResultDocument.objects.exists())
+
+    def test_subject_rename_drops_documents(self):
+        result_documents.get(self.student.symbol_number)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subject.name = 'Mathematics'
+            self.subject.save()
+
+        self.assertFalse(StudentResultDocument.objects.exists())
+        self.assertIn('Mathematics', result_documents.get(self.student.symbol_number).body)
+
+
+RESULT_SHEET = (
+    'Student Name,Roll Number,Class,Exam Type,Academic Year,Nepali,Math,Science,Computer,Social\n'
+    'Asha Rai,1,10,Final Term,2081,85,85,85,85,85\n'
+)
+
+
+def _sheet(content=RESULT_SHEET, name='results.csv'):
+    return SimpleUploadedFile(name, content.encode('utf-8'), content_type='text/csv')
+
+
+class ImportResultsAuthTests(TestCase):
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+
+    def test_anonymous_import_is_refused(self):
+        for url in ['/api/results/import/', '/api/results/import/?stream=1']:
+            response = self.client.post(url, {'file': _sheet()})
+            self.assertEqual(response.status_code, 403)
+        self.assertFalse(Result.objects.exists())
+
+    def test_staff_import_needs_csrf_token(self):
+        self.client.force_login(User.objects.create_user('admin', password='pw', is_staff=True))
+
+        response = self.client.post('/api/results/import/', {'file': _sheet()})
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Result.objects.exists())
+
+    def test_staff_import_saves(self):
+        client = Client()
+        client.force_login(User.objects.create_user('admin', password='pw', is_staff=True))
+
+        response = client.post('/api/results/import/', {'file': _sheet()})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(Result.objects.get().roll_number, '1')
+
+    def test_student_import_is_refused(self):
+        client = Client()
+        client.force_login(User.objects.create_user('student', password='pw'))
+
+        response = client.post('/api/results/import/', {'file': _sheet()})
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Result.objects.exists())
+
+
+class ResultImportTests(TestCase):
+    def test_csv_saved_with_a_byte_order_mark(self):
+        upload = SimpleUploadedFile('results.csv', ('\ufeff' + RESULT_SHEET).encode('utf-8'))
+
+        chunk, = result_import.csv_chunks(upload)
+        self.assertEqual(chunk.columns[0], 'Student Name')
+
+        events = list(result_import.import_csv_chunks(upload))
+        self.assertEqual((events[-1]['imported'], events[-1]['errors']), (1, []))
+
+    def test_percentage_is_marks_obtained_over_marks_possible(self):
+        rows, errors = result_import.import_sheet(result_import.read_sheet(_sheet()))
+
+        self.assertEqual(errors, [])
+        self.assertEqual(rows[0]['total'], 425)
+        self.assertEqual(rows[0]['percentage'], 85.0)
+        self.assertEqual(Result.objects.get().percentage, 85.0)
+
+    def test_invalid_marks_are_reported_per_row_and_nothing_is_saved(self):
+        sheet = RESULT_SHEET + 'Bina Tamang,2,10,Final Term,2081,abc,85,120,85,85\n'
+
+        rows, errors = result_import.import_sheet(result_import.read_sheet(_sheet(sheet)))
+
+        self.assertEqual(rows, [])
+        self.assertEqual(
+            [(e['row'], e['column']) for e in errors], [(3, 'Nepali'), (3, 'Science')]
+        )
+        self.assertFalse(Result.objects.exists())
+
+
+STUDENT_SHEET = (
+    'full_name,symbol_number,student_class,date_of_birth,gender,parent_name,username,password\n'
+    'Asha Rai,10000001,10,2010-01-01,Female,Hari Rai,asha,secret-pw\n'
+)
+
+
+class BulkImportStudentsTests(TestCase):
+    def _post(self, user, create_accounts):
+        request = APIRequestFactory().post('/', {
+            'file': SimpleUploadedFile('students.csv', STUDENT_SHEET.encode('utf-8'), content_type='text/csv'),
+            'create_accounts': 'true' if create_accounts else '',
+        }, format='multipart')
+        force_authenticate(request, user=user)
+        return views.bulk_import_students(request)
+
+    def test_only_staff_can_create_accounts(self):
+        student = User.objects.create_user('student', password='pw')
+
+        response = self._post(student, create_accounts=True)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(User.objects.filter(username='asha').exists())
+        self.assertFalse(Student.objects.exists())
+
+    def test_overlong_and_missing_values_fail_only_their_rows(self):
+        df = pd.read_csv(io.StringIO(
+            STUDENT_SHEET
+            + f"{'x' * 101},10000002,10,2010-01-01,Male,Hari Rai,,\n"
+            + 'Bina Tamang,10000003,10,2010-01-01,Female,,,\n'
+            + 'Chandra Gurung,10000004,10,2010-01-01,Male,Hari Gurung,,\n'
+        ), dtype=str)
+
+        results = student_import.import_students(df)
+
+        self.assertEqual(
+            [(r['row'], r['status'], r['message']) for r in results if r['status'] == 'error'],
+            [(3, 'error', 'full_name is longer than 100 characters'), (4, 'error', 'parent_name is required')],
+        )
+        self.assertEqual(
+            sorted(Student.objects.values_list('symbol_number', flat=True)), ['10000001', '10000004']
+        )
+
+    def test_staff_stream_import_creates_linked_logins(self):
+        staff = User.objects.create_user('admin', password='pw', is_staff=True)
+        request = APIRequestFactory().post('/?stream=1', {
+            'file': SimpleUploadedFile('students.csv', STUDENT_SHEET.encode('utf-8'), content_type='text/csv'),
+            'create_accounts': 'true',
+        }, format='multipart')
+        force_authenticate(request, user=staff)
+
+        response = views.bulk_import_students(request)
+        events = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+        self.assertNotIn('error', events[-1])
+        student = Student.objects.get(symbol_number='10000001')
+        self.assertEqual((student.full_name, student.user.username), ('Asha Rai', 'asha'))
+        self.assertTrue(student.user.check_password('secret-pw'))
+
+
+@jobs.handler('test_slow')
+def _slow_job(job, progress):
+    # Stands in for a worker stuck in one long step while its job is requeued
+    Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+    jobs.requeue_stale(stale_after=60, max_attempts=3)
+    progress(1, 2)
+    return {'done': True}
+
+
+class JobTakeoverTests(TestCase):
+    def test_requeued_job_stops_the_old_worker(self):
+        job = jobs.enqueue('test_slow')
+        claimed = jobs.claim('worker-a')
+
+        with self.assertLogs('core.jobs', 'WARNING'):
+            self.assertFalse(jobs.run(claimed))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.worker, '')
+        self.assertIsNone(job.result)
+
+    def test_old_worker_cannot_overwrite_the_new_claim(self):
+        job = jobs.enqueue('test_slow')
+        old = jobs.claim('worker-a')
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        jobs.requeue_stale(stale_after=60, max_attempts=3)
+        new = jobs.claim('worker-b')
+
+        with self.assertRaises(jobs.JobTakenOver):
+            jobs.report_progress(old, 5, 10)
+        with self.assertRaises(jobs.JobTakenOver):
+            jobs.attach_output(old, 'out.csv', 'text/csv', b'old')
+        jobs.report_progress(new, 1, 10)
+
+        job.refresh_from_db()
+        self.assertEqual((job.worker, job.attempts, job.progress), ('worker-b', 2, 1))
+        self.assertIsNone(job.output_data)
+
+
+class ProgressResponseTests(SimpleTestCase):
+    def test_error_mid_stream_is_the_last_line(self):
+        def events():
+            yield {'chunk': 1, 'rows': 2000}
+            raise ValueError('Error tokenizing data')
+
+        response = views._progress_response(events())
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(lines, [{'chunk': 1, 'rows': 2000}, {'error': 'Error tokenizing data'}])
 
-# Create your tests here.
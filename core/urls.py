@@ -51,6 +51,11 @@ urlpatterns = [
     path('api/results/grade-scales/', views.GradeScaleView.as_view(), name='grade_scales'),
     path('api/results/import/', views.import_results_excel, name='import_results_excel'),
     path('api/results/export/', views.export_results_excel, name='export_results_excel'),
+    path('api/results/export/<str:fmt>/', views.export_results_stream, name='export_results_stream'),
+    path('api/marks/export/<str:fmt>/', views.export_marks_stream, name='export_marks_stream'),
+    path('api/results/cards/', views.export_class_result_cards, name='export_class_result_cards'),
+    path('api/jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('api/jobs/<int:job_id>/download/', views.job_download, name='job_download'),
     path('api/results/bulk-save/', views.bulk_save_results, name='bulk_save_results'),
     path('api/results/delete/', views.delete_result, name='delete_result'),
     path('api/notices/', views.NoticeList.as_view()),
@@ -102,10 +107,12 @@ urlpatterns = [
     path('api/generate-symbol-number/', views.generate_numeric_symbol_number_api, name='generate_numeric_symbol_number_api'),
     path('api/email-students-list/', views.email_students_list_api, name='email_students_list_api'),
     path('api/send-result-email/<str:symbol_number>/', views.send_result_notification_email, name='send_result_notification_email'),
+    path('api/email-metrics/', views.email_delivery_metrics, name='email_delivery_metrics'),
     
     # Enhanced Marks Entry System URLs
     path('api/students/search-enhanced/', views.StudentSearchView.as_view(), name='student_search_enhanced'),
     path('api/subjects/marks/', views.SubjectMarksView.as_view(), name='subject_marks'),
+    path('api/marks/matrix/', views.ClassMarksMatrixView.as_view(), name='class_marks_matrix'),
     path('api/results/enhanced/', views.EnhancedResultView.as_view(), name='enhanced_results'),
     path('api/marks/enhanced-bulk-save/', views.enhanced_bulk_save_marks, name='enhanced_bulk_save_marks'),
     path('api/subjects/for-class/', views.get_subjects_for_class, name='get_subjects_for_class'),
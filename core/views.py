@@ -1,7 +1,8 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from rest_framework import generics
-from django.db import models
-from .models import Teacher, Homework, Gallery, ContactMessage, Result, Notice, Student, HomeworkSubmission, ActivityLog, StudentAccount, LeadershipMessage, Subject, Marks, Resource
+from django.db import models, transaction
+from .models import Teacher, Homework, Gallery, ContactMessage, Result, Notice, Student, HomeworkSubmission, ActivityLog, StudentAccount, LeadershipMessage, Subject, Marks, Resource, GradeScale, ResultTemplate
+from . import analytics, exports, grading, jobs, notifications, outbox, render_cache, result_cards, result_documents, result_import, student_import, symbol_numbers
 from .serializers import TeacherSerializer, HomeworkSerializer, GallerySerializer, ContactMessageSerializer, ResultSerializer, NoticeSerializer, StudentSerializer, RegisterSerializer, HomeworkSubmissionSerializer, ActivityLogSerializer, GalleryLikeSerializer, GalleryCommentSerializer, SubjectSerializer, MarksSerializer, StudentResultSerializer, ResourceSerializer
 
 # Import website content views
@@ -47,7 +48,11 @@ except ImportError:
     PANDAS_AVAILABLE = False
 
 import io
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.urls import reverse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.http import parse_etags, quote_etag
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
@@ -1506,13 +1511,10 @@ def public_profile_view(request, username):
 
 @require_GET
 def next_symbol_number_api(request):
-    from .models import Student
-    last_student = Student.objects.order_by('-id').first()
-    if last_student and last_student.symbol_number and last_student.symbol_number.isdigit():
-        next_symbol = str(int(last_student.symbol_number) + 1)
-    else:
-        next_symbol = '1001'
-    return JsonResponse({'next_symbol_number': next_symbol})
+    from . import symbol_numbers
+    # A read-only preview: the signup form does not submit it and
+    # Student.save() allocates the real number
+    return JsonResponse({'next_symbol_number': symbol_numbers.peek()})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -1559,10 +1561,40 @@ def teacher_dashboard_api(request):
         'classes': [c.name for c in classes],
     })
 
-@csrf_exempt
+def _wants_stream(request):
+    return str(request.GET.get('stream', '')).lower() in ('1', 'true', 'yes')
+
+def _wants_background(request):
+    return str(request.GET.get('background', '')).lower() in ('1', 'true', 'yes')
+
+def _job_accepted(request, job):
+    """202 with the id and polling URL of a job just queued for the run_jobs worker"""
+    return Response({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': request.build_absolute_uri(reverse('job_status', args=[job.id])),
+    }, status=202)
+
+def _progress_response(events):
+    """Stream progress dicts from a chunked import as NDJSON, one line per chunk"""
+    encoder = DjangoJSONEncoder()
+
+    def lines():
+        # The 200 is already sent, so a failure mid-import becomes the last line
+        try:
+            for event in events:
+                yield encoder.encode(event) + '\n'
+        except Exception as e:
+            yield encoder.encode({'error': str(e)}) + '\n'
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
 @require_http_methods(["POST"])
 def import_results_excel(request):
     """Handle Excel/CSV import for results"""
+    # Saves (and can overwrite published) results, so staff only and CSRF-checked
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Access denied. Admin privileges required.'}, status=403)
     if not PANDAS_AVAILABLE:
         return JsonResponse({'success': False, 'error': 'Pandas is not installed. Please install pandas and openpyxl for Excel import functionality.'})
     
@@ -1570,86 +1602,27 @@ def import_results_excel(request):
         if 'file' not in request.FILES:
             return JsonResponse({'success': False, 'error': 'No file uploaded'})
         
-        file = request.FILES['file']
+        # ?stream=1: import a large CSV chunk by chunk, reporting progress as NDJSON
+        if _wants_stream(request) and request.FILES['file'].name.endswith('.csv'):
+            return _progress_response(result_import.import_csv_chunks(request.FILES['file']))
         
-        # Check file type
-        if file.name.endswith('.csv'):
-            # Handle CSV
-            content = file.read().decode('utf-8')
-            df = pd.read_csv(io.StringIO(content))
-        elif file.name.endswith(('.xlsx', '.xls')):
-            # Handle Excel
-            df = pd.read_excel(file)
-        else:
-            return JsonResponse({'success': False, 'error': 'Unsupported file format. Please upload CSV or Excel file.'})
+        try:
+            df = result_import.read_sheet(request.FILES['file'])
+        except result_import.SheetError as e:
+            return JsonResponse({'success': False, 'error': str(e)})
         
-        # Process the data
-        results_data = []
-        for index, row in df.iterrows():
-            try:
-                # Extract data from row
-                student_name = str(row.get('Student Name', '')).strip()
-                if not student_name or student_name == 'nan':
-                    continue
-                
-                # Get subject marks
-                nepali = float(row.get('Nepali', 0)) if pd.notna(row.get('Nepali')) else 0
-                math = float(row.get('Math', 0)) if pd.notna(row.get('Math')) else 0
-                science = float(row.get('Science', 0)) if pd.notna(row.get('Science')) else 0
-                computer = float(row.get('Computer', 0)) if pd.notna(row.get('Computer')) else 0
-                social = float(row.get('Social', 0)) if pd.notna(row.get('Social')) else 0
-                
-                # Calculate totals
-                total = nepali + math + science + computer + social
-                percentage = (total / 500) * 100 if total > 0 else 0
-                
-                # Calculate GPA
-                if percentage >= 90:
-                    gpa = 4.0
-                elif percentage >= 80:
-                    gpa = 3.6
-                elif percentage >= 70:
-                    gpa = 3.2
-                elif percentage >= 60:
-                    gpa = 2.8
-                elif percentage >= 50:
-                    gpa = 2.4
-                elif percentage >= 40:
-                    gpa = 2.0
-                elif percentage >= 20:
-                    gpa = 1.6
-                else:
-                    gpa = 0.8
-                
-                # Get other fields
-                roll_number = str(row.get('Roll Number', f'R{index+1:03d}')).strip()
-                student_class = str(row.get('Class', '10')).strip()
-                exam_type = str(row.get('Exam Type', 'Final Term')).strip()
-                academic_year = str(row.get('Academic Year', '2024-25')).strip()
-                
-                results_data.append({
-                    'student_name': student_name,
-                    'roll_number': roll_number,
-                    'student_class': student_class,
-                    'total': total,
-                    'gpa': gpa,
-                    'percentage': percentage,
-                    'exam_type': exam_type,
-                    'academic_year': academic_year,
-                    'nepali': nepali,
-                    'math': math,
-                    'science': science,
-                    'computer': computer,
-                    'social': social
-                })
-                
-            except Exception as e:
-                continue  # Skip problematic rows
+        results_data, errors = result_import.import_sheet(df)
+        if errors:
+            return JsonResponse({
+                'success': False,
+                'error': f'{len(errors)} problem(s) found, nothing was imported',
+                'errors': errors
+            })
         
         return JsonResponse({
             'success': True,
             'data': results_data,
-            'message': f'Successfully processed {len(results_data)} results'
+            'message': f'Successfully imported {len(results_data)} results'
         })
         
     except Exception as e:
@@ -1658,9 +1631,6 @@ def import_results_excel(request):
 @require_http_methods(["GET"])
 def export_results_excel(request):
     """Export results to Excel/CSV"""
-    if not PANDAS_AVAILABLE:
-        return JsonResponse({'success': False, 'error': 'Pandas is not installed. Please install pandas and openpyxl for Excel export functionality.'})
-    
     try:
         from .models import Result
         
@@ -1678,56 +1648,43 @@ def export_results_excel(request):
         if year_filter:
             results = results.filter(academic_year=year_filter)
         
-        # Create DataFrame
-        data = []
-        for result in results:
-            data.append({
-                'Student Name': result.student_name,
-                'Roll Number': result.roll_number,
-                'Class': result.student_class,
-                'Total': result.total,
-                'Percentage': result.percentage,
-                'GPA': result.gpa,
-                'Grade': result.get_performance_status(),
-                'Remarks': result.remarks or '',
-                'Exam Type': result.exam_type,
-                'Academic Year': result.academic_year,
-                'Published': 'Yes' if result.is_published else 'No',
-                'Upload Date': result.uploaded_at.strftime('%Y-%m-%d %H:%M')
-            })
-        
-        df = pd.DataFrame(data)
-        
-        # Create Excel file
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Results', index=False)
-            
-            # Add grading scale sheet
-            grading_data = [
-                {'Percentage': '90-100%', 'Grade': 'A+', 'Remarks': 'Outstanding', 'GPA': '4.0'},
-                {'Percentage': '80-90%', 'Grade': 'A', 'Remarks': 'Excellent', 'GPA': '3.6'},
-                {'Percentage': '70-80%', 'Grade': 'B+', 'Remarks': 'Very Good', 'GPA': '3.2'},
-                {'Percentage': '60-70%', 'Grade': 'B', 'Remarks': 'Good', 'GPA': '2.8'},
-                {'Percentage': '50-60%', 'Grade': 'C+', 'Remarks': 'Above Average', 'GPA': '2.4'},
-                {'Percentage': '40-50%', 'Grade': 'C', 'Remarks': 'Average', 'GPA': '2.0'},
-                {'Percentage': '20-40%', 'Grade': 'D', 'Remarks': 'Below Average', 'GPA': '1.6'},
-                {'Percentage': '1-20%', 'Grade': 'E', 'Remarks': 'Insufficient', 'GPA': '0.8'},
+        headers = [
+            'Student Name', 'Roll Number', 'Class', 'Total', 'Percentage', 'GPA', 'Grade',
+            'Remarks', 'Exam Type', 'Academic Year', 'Published', 'Upload Date',
+        ]
+        rows = (
+            [
+                result.student_name,
+                result.roll_number,
+                result.student_class,
+                result.total,
+                result.percentage,
+                result.gpa,
+                result.get_performance_status(),
+                result.remarks or '',
+                result.exam_type,
+                result.academic_year,
+                'Yes' if result.is_published else 'No',
+                result.uploaded_at.strftime('%Y-%m-%d %H:%M'),
             ]
-            grading_df = pd.DataFrame(grading_data)
-            grading_df.to_excel(writer, sheet_name='Grading Scale', index=False)
-        
-        output.seek(0)
-        
-        # Create response
-        filename = f'results_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        response = HttpResponse(
-            output.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            for result in results.iterator(chunk_size=exports.ITERATOR_CHUNK_SIZE)
         )
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        grading_scale = [
+            ['90-100%', 'A+', 'Outstanding', '4.0'],
+            ['80-90%', 'A', 'Excellent', '3.6'],
+            ['70-80%', 'B+', 'Very Good', '3.2'],
+            ['60-70%', 'B', 'Good', '2.8'],
+            ['50-60%', 'C+', 'Above Average', '2.4'],
+            ['40-50%', 'C', 'Average', '2.0'],
+            ['20-40%', 'D', 'Below Average', '1.6'],
+            ['1-20%', 'E', 'Insufficient', '0.8'],
+        ]
         
-        return response
+        filename = f'results_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+        return exports.xlsx_response(filename, [
+            ('Results', headers, rows),
+            ('Grading Scale', ['Percentage', 'Grade', 'Remarks', 'GPA'], grading_scale),
+        ], cell_format=None)
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
@@ -1835,6 +1792,90 @@ class MarksListCreate(generics.ListCreateAPIView):
             
         return queryset
 
+def _export_job_or_stream(request, dataset, fmt, model, columns, filters):
+    if fmt not in exports.STREAM_FORMATS:
+        return Response({'error': f'Unsupported format: {fmt}'}, status=400)
+    try:
+        queryset = exports.filter_queryset(model.objects.all(), request.GET, filters)
+    except exports.FilterError as e:
+        return Response({'error': str(e)}, status=400)
+    compress = request.GET.get('gzip') in ('1', 'true')
+    if _wants_background(request):
+        return _job_accepted(request, jobs.enqueue('export', {
+            'dataset': dataset,
+            'fmt': fmt,
+            'params': {param: request.GET[param] for param in filters if request.GET.get(param)},
+            'compress': compress,
+        }, request.user))
+    return exports.streaming_response(queryset, columns, fmt, f'{dataset}_export', compress=compress)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def export_marks_stream(request, fmt):
+    """Stream Marks as CSV or NDJSON; takes the MarksListCreate filters, ?gzip=1 and ?background=1"""
+    return _export_job_or_stream(
+        request, 'marks', fmt, Marks, exports.MARKS_EXPORT_COLUMNS, exports.MARKS_EXPORT_FILTERS
+    )
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def export_results_stream(request, fmt):
+    """Stream Results as CSV or NDJSON; filters: class, exam_type, academic_year, ?gzip=1 and ?background=1"""
+    return _export_job_or_stream(
+        request, 'results', fmt, Result, exports.RESULT_EXPORT_COLUMNS, exports.RESULT_EXPORT_FILTERS
+    )
+
+def _get_job(request, job_id):
+    from .models import Job
+    
+    job = get_object_or_404(Job.objects.defer('input_data', 'output_data'), pk=job_id)
+    if not (request.user.is_staff or job.created_by_id == request.user.id):
+        return None
+    return job
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_status(request, job_id):
+    """Progress and outcome of a background job (staff or the user who queued it)"""
+    job = _get_job(request, job_id)
+    if job is None:
+        return Response({'error': 'Not allowed to view this job'}, status=403)
+    
+    data = {
+        'job_id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'message': job.message,
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+        'attempts': job.attempts,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'download_url': None,
+    }
+    if job.output_name:
+        data['download_url'] = request.build_absolute_uri(reverse('job_download', args=[job.id]))
+    return Response(data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_download(request, job_id):
+    """The file produced by a finished background job"""
+    job = _get_job(request, job_id)
+    if job is None:
+        return Response({'error': 'Not allowed to view this job'}, status=403)
+    if not job.output_name:
+        return Response({'error': 'This job has no file to download yet'}, status=404)
+    
+    from .models import Job
+    data = Job.objects.filter(pk=job.pk).values_list('output_data', flat=True).get()
+    response = HttpResponse(bytes(data), content_type=job.output_content_type or 'application/octet-stream')
+    response['Content-Disposition'] = f'attachment; filename="{job.output_name}"'
+    return response
+
 class MarksRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
     """API endpoint for retrieving, updating, and deleting marks"""
     queryset = Marks.objects.all()
@@ -1948,8 +1989,8 @@ def submit_marks_api(request):
         if not marks_data:
             return Response({'error': 'No marks data provided'}, status=400)
         
-        created_count = 0
-        updated_count = 0
+        to_create = []
+        to_update = []
         
         for mark_info in marks_data:
             student_symbol = mark_info.get('student_symbol')
@@ -1965,34 +2006,36 @@ def submit_marks_api(request):
                 student = Student.objects.get(symbol_number=student_symbol)
                 subject = Subject.objects.get(name=subject_name)
                 
-                # Create or update marks
-                marks, created = Marks.objects.get_or_create(
+                marks = Marks.objects.filter(
                     student=student,
                     subject=subject,
                     exam_type=exam_type,
-                    academic_year=academic_year,
-                    defaults={
-                        'theory_marks': theory_marks,
-                        'practical_marks': practical_marks,
-                        'theory_total': theory_total,
-                        'practical_total': practical_total
-                    }
-                )
+                    academic_year=academic_year
+                ).first()
                 
-                if not created:
-                    # Update existing marks
-                    marks.theory_marks = theory_marks
-                    marks.practical_marks = practical_marks
-                    marks.theory_total = theory_total
-                    marks.practical_total = practical_total
-                    marks.save()
-                    updated_count += 1
+                if marks is None:
+                    marks = Marks(
+                        student=student,
+                        subject=subject,
+                        exam_type=exam_type,
+                        academic_year=academic_year
+                    )
+                    to_create.append(marks)
                 else:
-                    created_count += 1
+                    to_update.append(marks)
+                marks.theory_marks = theory_marks
+                marks.practical_marks = practical_marks
+                marks.theory_total = theory_total
+                marks.practical_total = practical_total
                     
             except (Student.DoesNotExist, Subject.DoesNotExist) as e:
                 continue
         
+        # Grade everything in one vectorized pass and write in bulk
+        grading.save_marks_bulk(to_create, to_update)
+        created_count = len(to_create)
+        updated_count = len(to_update)
+        
         return Response({
             'success': True,
             'message': f'Successfully processed {created_count + updated_count} marks (Created: {created_count}, Updated: {updated_count})'
@@ -2006,9 +2049,15 @@ def submit_marks_api(request):
 def student_result_api(request, symbol_number):
     """API endpoint for getting student result by symbol number"""
     try:
-        student = Student.objects.get(symbol_number=symbol_number)
-        serializer = StudentResultSerializer(student)
-        return Response(serializer.data)
+        document = result_documents.get(symbol_number)
+        etag = quote_etag(document.etag)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(document.body, content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
         
     except Student.DoesNotExist:
         return Response({'error': 'Student not found'}, status=404)
@@ -2138,19 +2187,7 @@ def subject_marks_api(request, subject_id):
 def generate_numeric_symbol_number_api(request):
     """API endpoint for generating unique numeric symbol numbers"""
     try:
-        import random
-        
-        def generate_numeric_symbol():
-            """Generate a unique 8-digit numeric symbol number"""
-            while True:
-                # Generate 8-digit number
-                symbol = str(random.randint(10000000, 99999999))
-                
-                # Check if it already exists
-                if not Student.objects.filter(symbol_number=symbol).exists():
-                    return symbol
-        
-        symbol_number = generate_numeric_symbol()
+        symbol_number = symbol_numbers.allocate()
         return Response({
             'success': True,
             'symbol_number': symbol_number
@@ -2194,68 +2231,81 @@ def export_comprehensive_results_pdf(request):
         if not marks_queryset.exists():
             return Response({'error': 'No data found for the specified criteria'}, status=404)
         
-        # Create PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        elements = []
-        
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=30,
-            alignment=TA_CENTER
+        # Any added, removed or edited row (or renamed student) changes the key
+        version = marks_queryset.order_by().aggregate(
+            rows=models.Count('id'),
+            last_id=models.Max('id'),
+            marks_updated=models.Max('updated_at'),
+            students_updated=models.Max('student__updated_at'),
         )
         
-        # Title
-        title_text = f"Comprehensive Results Report - {exam_type} ({academic_year})"
-        if subject_id:
-            subject = Subject.objects.get(id=subject_id)
-            title_text += f" - {subject.name}"
+        def render_pdf():
+            # Create PDF
+            buffer = BytesIO()
+            doc = SimpleDocTemplate(buffer, pagesize=A4)
+            elements = []
+        
+            # Styles
+            styles = getSampleStyleSheet()
+            title_style = ParagraphStyle(
+                'CustomTitle',
+                parent=styles['Heading1'],
+                fontSize=16,
+                spaceAfter=30,
+                alignment=TA_CENTER
+            )
+        
+            # Title
+            title_text = f"Comprehensive Results Report - {exam_type} ({academic_year})"
+            if subject_id:
+                subject = Subject.objects.get(id=subject_id)
+                title_text += f" - {subject.name}"
         
-        elements.append(Paragraph(title_text, title_style))
-        elements.append(Spacer(1, 20))
+            elements.append(Paragraph(title_text, title_style))
+            elements.append(Spacer(1, 20))
         
-        # Table data
-        table_data = [['Symbol No.', 'Student Name', 'Subject', 'Theory', 'Practical', 'Total', 'Grade', 'Status']]
+            # Table data
+            table_data = [['Symbol No.', 'Student Name', 'Subject', 'Theory', 'Practical', 'Total', 'Grade', 'Status']]
         
-        for mark in marks_queryset:
-            total_marks = (mark.theory_marks or 0) + (mark.practical_marks or 0)
-            grade = mark.grade or 'N/A'
-            status = 'Pass' if mark.is_passed else 'Fail' if mark.is_passed is False else 'N/A'
+            for mark in marks_queryset:
+                total_marks = (mark.theory_marks or 0) + (mark.practical_marks or 0)
+                grade = mark.grade or 'N/A'
+                status = 'Pass' if mark.is_passed else 'Fail' if mark.is_passed is False else 'N/A'
             
-            table_data.append([
-                mark.student.symbol_number,
-                mark.student.full_name,
-                mark.subject.name,
-                str(mark.theory_marks or 'N/A'),
-                str(mark.practical_marks or 'N/A'),
-                str(total_marks),
-                grade,
-                status
-            ])
-        
-        # Create table
-        table = Table(table_data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ]))
-        
-        elements.append(table)
-        
-        # Build PDF
-        doc.build(elements)
-        buffer.seek(0)
+                table_data.append([
+                    mark.student.symbol_number,
+                    mark.student.full_name,
+                    mark.subject.name,
+                    str(mark.theory_marks or 'N/A'),
+                    str(mark.practical_marks or 'N/A'),
+                    str(total_marks),
+                    grade,
+                    status
+                ])
+        
+            # Create table
+            table = Table(table_data)
+            table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 12),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('FONTSIZE', (0, 1), (-1, -1), 10),
+            ]))
+        
+            elements.append(table)
+        
+            # Build PDF
+            doc.build(elements)
+            return buffer.getvalue()
+        
+        pdf = render_cache.get_or_render(
+            'comprehensive_pdf', [exam_type, academic_year, subject_id, version], render_pdf
+        )
         
         # Create response
         filename = f"comprehensive_results_{exam_type}_{academic_year}.pdf"
@@ -2263,7 +2313,7 @@ def export_comprehensive_results_pdf(request):
             subject = Subject.objects.get(id=subject_id)
             filename = f"results_{subject.name}_{exam_type}_{academic_year}.pdf"
         
-        response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
+        response = HttpResponse(pdf, content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         
         return response
@@ -2294,72 +2344,40 @@ def export_comprehensive_results_excel(request):
         if not marks_queryset.exists():
             return Response({'error': 'No data found for the specified criteria'}, status=404)
         
-        # Create Excel workbook
-        workbook = xlsxwriter.Workbook('temp_results.xlsx')
-        worksheet = workbook.add_worksheet('Results')
+        def rows():
+            for mark in marks_queryset.iterator(chunk_size=exports.ITERATOR_CHUNK_SIZE):
+                total_marks = (mark.theory_marks or 0) + (mark.practical_marks or 0)
+                status = 'Pass' if mark.is_passed else 'Fail' if mark.is_passed is False else 'N/A'
+                yield [
+                    mark.student.symbol_number,
+                    mark.student.full_name,
+                    mark.subject.name,
+                    mark.theory_marks or 'N/A',
+                    mark.practical_marks or 'N/A',
+                    total_marks,
+                    mark.grade or 'N/A',
+                    status,
+                ]
         
-        # Styles
-        header_format = workbook.add_format({
-            'bold': True,
-            'text_wrap': True,
-            'valign': 'top',
-            'fg_color': '#D7E4BC',
-            'border': 1
-        })
-        
-        cell_format = workbook.add_format({
-            'text_wrap': True,
-            'valign': 'top',
-            'border': 1
-        })
-        
-        # Headers
         headers = ['Symbol No.', 'Student Name', 'Subject', 'Theory', 'Practical', 'Total', 'Grade', 'Status']
-        for col, header in enumerate(headers):
-            worksheet.write(0, col, header, header_format)
-        
-        # Data
-        for row, mark in enumerate(marks_queryset, start=1):
-            total_marks = (mark.theory_marks or 0) + (mark.practical_marks or 0)
-            grade = mark.grade or 'N/A'
-            status = 'Pass' if mark.is_passed else 'Fail' if mark.is_passed is False else 'N/A'
-            
-            worksheet.write(row, 0, mark.student.symbol_number, cell_format)
-            worksheet.write(row, 1, mark.student.full_name, cell_format)
-            worksheet.write(row, 2, mark.subject.name, cell_format)
-            worksheet.write(row, 3, mark.theory_marks or 'N/A', cell_format)
-            worksheet.write(row, 4, mark.practical_marks or 'N/A', cell_format)
-            worksheet.write(row, 5, total_marks, cell_format)
-            worksheet.write(row, 6, grade, cell_format)
-            worksheet.write(row, 7, status, cell_format)
         
-        # Auto-adjust column widths
-        for col in range(len(headers)):
-            worksheet.set_column(col, col, 15)
-        
-        workbook.close()
-        
-        # Read the file and create response
-        with open('temp_results.xlsx', 'rb') as f:
-            excel_data = f.read()
-        
-        # Clean up temporary file
-        os.remove('temp_results.xlsx')
-        
-        # Create response
         filename = f"comprehensive_results_{exam_type}_{academic_year}.xlsx"
         if subject_id:
             subject = Subject.objects.get(id=subject_id)
             filename = f"results_{subject.name}_{exam_type}_{academic_year}.xlsx"
         
-        response = HttpResponse(excel_data, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        return response
+        return exports.xlsx_response(filename, [('Results', headers, rows())])
         
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+def _result_card_cache_parts(student, marks, exam_type, academic_year):
+    """render_cache key parts for one student's card, or None when there are no marks"""
+    versions = list(marks.order_by('id').values_list('id', 'updated_at'))
+    if not versions:
+        return None
+    return [student.pk, student.updated_at, exam_type, academic_year, versions]
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def export_student_result_card_pdf(request, symbol_number):
@@ -2374,134 +2392,22 @@ def export_student_result_card_pdf(request, symbol_number):
             student=student,
             exam_type=exam_type,
             academic_year=academic_year
-        ).select_related('subject').order_by('subject__name')
-        
-        if not marks.exists():
-            return Response({'error': 'No results found for this student'}, status=404)
-        
-        # Create PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        elements = []
-        
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=30,
-            alignment=TA_CENTER
         )
+        cache_parts = _result_card_cache_parts(student, marks, exam_type, academic_year)
+        if cache_parts is None:
+            return Response({'error': 'No results found for this student'}, status=404)
         
-        subtitle_style = ParagraphStyle(
-            'Subtitle',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=20,
-            alignment=TA_CENTER
-        )
-        
-        # Title
-        elements.append(Paragraph("NAWA PRATIVA SECONDARY SCHOOL", title_style))
-        elements.append(Paragraph("STUDENT RESULT CARD", subtitle_style))
-        elements.append(Spacer(1, 20))
-        
-        # Student Information
-        student_info = [
-            ['Student Name:', student.full_name],
-            ['Symbol Number:', student.symbol_number],
-            ['Class:', student.student_class],
-            ['Exam Type:', exam_type],
-            ['Academic Year:', academic_year],
-            ['Date:', datetime.now().strftime('%Y-%m-%d')]
-        ]
-        
-        student_table = Table(student_info, colWidths=[2*inch, 4*inch])
-        student_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        
-        elements.append(student_table)
-        elements.append(Spacer(1, 20))
-        
-        # Results Table
-        results_data = [['Subject', 'Theory', 'Practical', 'Total', 'Grade', 'Status']]
-        
-        total_marks = 0
-        total_obtained = 0
-        passed_subjects = 0
-        
-        for mark in marks:
-            theory = mark.theory_marks or 0
-            practical = mark.practical_marks or 0
-            total = theory + practical
-            grade = mark.grade or 'N/A'
-            status = 'Pass' if mark.is_passed else 'Fail' if mark.is_passed is False else 'N/A'
-            
-            results_data.append([
-                mark.subject.name,
-                str(theory),
-                str(practical),
-                str(total),
-                grade,
-                status
-            ])
-            
-            total_marks += (mark.subject.theory_total or 0) + (mark.subject.practical_total or 0)
-            total_obtained += total
-            if mark.is_passed:
-                passed_subjects += 1
-        
-        # Calculate percentage
-        percentage = (total_obtained / total_marks * 100) if total_marks > 0 else 0
-        
-        results_table = Table(results_data)
-        results_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ]))
-        
-        elements.append(results_table)
-        elements.append(Spacer(1, 20))
-        
-        # Summary
-        summary_data = [
-            ['Total Marks Obtained:', str(total_obtained)],
-            ['Total Marks Possible:', str(total_marks)],
-            ['Percentage:', f"{percentage:.2f}%"],
-            ['Passed Subjects:', str(passed_subjects)],
-            ['Total Subjects:', str(len(marks))],
-            ['Overall Result:', 'PASS' if percentage >= 40 else 'FAIL']
-        ]
-        
-        summary_table = Table(summary_data, colWidths=[2*inch, 2*inch])
-        summary_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
+        today = datetime.now().strftime('%Y-%m-%d')
         
-        elements.append(summary_table)
+        def render_pdf():
+            (student_row, rows), = result_cards.class_cards(marks)
+            return result_cards.render_card_pdf(student_row, exam_type, academic_year, rows, today)
         
-        # Build PDF
-        doc.build(elements)
-        buffer.seek(0)
+        pdf = render_cache.get_or_render('result_card_pdf', [*cache_parts, today], render_pdf)
         
         # Create response
         filename = f"result_card_{student.symbol_number}_{exam_type}_{academic_year}.pdf"
-        response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
+        response = HttpResponse(pdf, content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         
         return response
@@ -2511,6 +2417,63 @@ def export_student_result_card_pdf(request, symbol_number):
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def export_class_result_cards(request):
+    """Result cards for a whole class: ?mode=pdf (one merged PDF) or ?mode=zip (one PDF per student)"""
+    try:
+        student_class = request.GET.get('class')
+        exam_type = request.GET.get('exam_type', 'Final Term')
+        academic_year = request.GET.get('academic_year', '2024-25')
+        mode = request.GET.get('mode', 'pdf')
+        if not student_class:
+            return Response({'error': 'class is required'}, status=400)
+        if mode not in ('pdf', 'zip'):
+            return Response({'error': "mode must be 'pdf' or 'zip'"}, status=400)
+        
+        marks = Marks.objects.filter(
+            student__student_class=student_class,
+            exam_type=exam_type,
+            academic_year=academic_year
+        )
+        today = datetime.now().strftime('%Y-%m-%d')
+        # ?background=1: render in the run_jobs worker and download from the job when done
+        if _wants_background(request):
+            if not marks.exists():
+                return Response({'error': 'No results found for this class'}, status=404)
+            return _job_accepted(request, jobs.enqueue('class_result_cards', {
+                'class': student_class,
+                'exam_type': exam_type,
+                'academic_year': academic_year,
+                'mode': mode,
+                'date': today,
+            }, request.user))
+        
+        # Every student's marks in one query; workers only ever see plain tuples
+        cards = result_cards.class_cards(marks)
+        if not cards:
+            return Response({'error': 'No results found for this class'}, status=404)
+        
+        # In-process: forking from a gunicorn worker multiplies per request;
+        # ?background=1 renders in parallel in the job worker instead
+        max_workers = 1
+        filename = f"result_cards_{student_class}_{exam_type}_{academic_year}"
+        if mode == 'zip':
+            response = StreamingHttpResponse(
+                result_cards.zip_stream(cards, exam_type, academic_year, today, max_workers),
+                content_type='application/zip'
+            )
+            response['Content-Disposition'] = f'attachment; filename="{filename}.zip"'
+            return response
+        
+        pdf = result_cards.merged_pdf(cards, exam_type, academic_year, today, max_workers)
+        response = HttpResponse(pdf, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.pdf"'
+        return response
+        
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def export_student_result_card_excel(request, symbol_number):
@@ -2527,115 +2490,117 @@ def export_student_result_card_excel(request, symbol_number):
             academic_year=academic_year
         ).select_related('subject').order_by('subject__name')
         
-        if not marks.exists():
+        cache_parts = _result_card_cache_parts(student, marks, exam_type, academic_year)
+        if cache_parts is None:
             return Response({'error': 'No results found for this student'}, status=404)
         
-        # Create Excel workbook
-        workbook = xlsxwriter.Workbook('temp_result_card.xlsx')
+        today = datetime.now().strftime('%Y-%m-%d')
         
-        # Student info worksheet
-        info_worksheet = workbook.add_worksheet('Student Info')
+        def render_xlsx():
+            # Create Excel workbook
+            output = BytesIO()
+            workbook = xlsxwriter.Workbook(output, {'in_memory': True})
         
-        # Styles
-        title_format = workbook.add_format({
-            'bold': True,
-            'font_size': 16,
-            'align': 'center',
-            'valign': 'vcenter'
-        })
+            # Student info worksheet
+            info_worksheet = workbook.add_worksheet('Student Info')
         
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#D7E4BC',
-            'border': 1
-        })
-        
-        cell_format = workbook.add_format({
-            'border': 1,
-            'align': 'left'
-        })
-        
-        # Title
-        info_worksheet.merge_range('A1:B1', 'NAWA PRATIVA SECONDARY SCHOOL', title_format)
-        info_worksheet.merge_range('A2:B2', 'STUDENT RESULT CARD', title_format)
-        
-        # Student Information
-        student_info = [
-            ['Student Name:', student.full_name],
-            ['Symbol Number:', student.symbol_number],
-            ['Class:', student.student_class],
-            ['Exam Type:', exam_type],
-            ['Academic Year:', academic_year],
-            ['Date:', datetime.now().strftime('%Y-%m-%d')]
-        ]
-        
-        for row, (label, value) in enumerate(student_info, start=4):
-            info_worksheet.write(row, 0, label, header_format)
-            info_worksheet.write(row, 1, value, cell_format)
+            # Styles
+            title_format = workbook.add_format({
+                'bold': True,
+                'font_size': 16,
+                'align': 'center',
+                'valign': 'vcenter'
+            })
         
-        # Results worksheet
-        results_worksheet = workbook.add_worksheet('Results')
+            header_format = workbook.add_format({
+                'bold': True,
+                'bg_color': '#D7E4BC',
+                'border': 1
+            })
         
-        # Headers
-        headers = ['Subject', 'Theory', 'Practical', 'Total', 'Grade', 'Status']
-        for col, header in enumerate(headers):
-            results_worksheet.write(0, col, header, header_format)
+            cell_format = workbook.add_format({
+                'border': 1,
+                'align': 'left'
+            })
         
-        # Data
-        total_marks = 0
-        total_obtained = 0
-        passed_subjects = 0
+            # Title
+            info_worksheet.merge_range('A1:B1', 'NAWA PRATIVA SECONDARY SCHOOL', title_format)
+            info_worksheet.merge_range('A2:B2', 'STUDENT RESULT CARD', title_format)
+        
+            # Student Information
+            student_info = [
+                ['Student Name:', student.full_name],
+                ['Symbol Number:', student.symbol_number],
+                ['Class:', student.student_class],
+                ['Exam Type:', exam_type],
+                ['Academic Year:', academic_year],
+                ['Date:', today]
+            ]
         
-        for row, mark in enumerate(marks, start=1):
-            theory = mark.theory_marks or 0
-            practical = mark.practical_marks or 0
-            total = theory + practical
-            grade = mark.grade or 'N/A'
-            status = 'Pass' if mark.is_passed else 'Fail' if mark.is_passed is False else 'N/A'
+            for row, (label, value) in enumerate(student_info, start=4):
+                info_worksheet.write(row, 0, label, header_format)
+                info_worksheet.write(row, 1, value, cell_format)
+        
+            # Results worksheet
+            results_worksheet = workbook.add_worksheet('Results')
+        
+            # Headers
+            headers = ['Subject', 'Theory', 'Practical', 'Total', 'Grade', 'Status']
+            for col, header in enumerate(headers):
+                results_worksheet.write(0, col, header, header_format)
+        
+            # Data
+            total_marks = 0
+            total_obtained = 0
+            passed_subjects = 0
+        
+            for row, mark in enumerate(marks, start=1):
+                theory = mark.theory_marks or 0
+                practical = mark.practical_marks or 0
+                total = theory + practical
+                grade = mark.grade or 'N/A'
+                status = 'Pass' if mark.is_passed else 'Fail' if mark.is_passed is False else 'N/A'
             
-            results_worksheet.write(row, 0, mark.subject.name, cell_format)
-            results_worksheet.write(row, 1, theory, cell_format)
-            results_worksheet.write(row, 2, practical, cell_format)
-            results_worksheet.write(row, 3, total, cell_format)
-            results_worksheet.write(row, 4, grade, cell_format)
-            results_worksheet.write(row, 5, status, cell_format)
+                results_worksheet.write(row, 0, mark.subject.name, cell_format)
+                results_worksheet.write(row, 1, theory, cell_format)
+                results_worksheet.write(row, 2, practical, cell_format)
+                results_worksheet.write(row, 3, total, cell_format)
+                results_worksheet.write(row, 4, grade, cell_format)
+                results_worksheet.write(row, 5, status, cell_format)
             
-            total_marks += (mark.subject.theory_total or 0) + (mark.subject.practical_total or 0)
-            total_obtained += total
-            if mark.is_passed:
-                passed_subjects += 1
-        
-        # Calculate percentage
-        percentage = (total_obtained / total_marks * 100) if total_marks > 0 else 0
+                total_marks += (mark.theory_total or 0) + (mark.practical_total or 0)
+                total_obtained += total
+                if mark.is_passed:
+                    passed_subjects += 1
+        
+            # Calculate percentage
+            percentage = (total_obtained / total_marks * 100) if total_marks > 0 else 0
+        
+            # Summary
+            summary_start_row = len(marks) + 3
+            summary_data = [
+                ['Total Marks Obtained:', total_obtained],
+                ['Total Marks Possible:', total_marks],
+                ['Percentage:', f"{percentage:.2f}%"],
+                ['Passed Subjects:', passed_subjects],
+                ['Total Subjects:', len(marks)],
+                ['Overall Result:', 'PASS' if percentage >= 40 else 'FAIL']
+            ]
         
-        # Summary
-        summary_start_row = len(marks) + 3
-        summary_data = [
-            ['Total Marks Obtained:', total_obtained],
-            ['Total Marks Possible:', total_marks],
-            ['Percentage:', f"{percentage:.2f}%"],
-            ['Passed Subjects:', passed_subjects],
-            ['Total Subjects:', len(marks)],
-            ['Overall Result:', 'PASS' if percentage >= 40 else 'FAIL']
-        ]
+            for row, (label, value) in enumerate(summary_data, start=summary_start_row):
+                results_worksheet.write(row, 0, label, header_format)
+                results_worksheet.write(row, 1, value, cell_format)
         
-        for row, (label, value) in enumerate(summary_data, start=summary_start_row):
-            results_worksheet.write(row, 0, label, header_format)
-            results_worksheet.write(row, 1, value, cell_format)
+            # Auto-adjust column widths
+            for worksheet in [info_worksheet, results_worksheet]:
+                for col in range(10):
+                    worksheet.set_column(col, col, 15)
         
-        # Auto-adjust column widths
-        for worksheet in [info_worksheet, results_worksheet]:
-            for col in range(10):
-                worksheet.set_column(col, col, 15)
+            workbook.close()
         
-        workbook.close()
+            return output.getvalue()
         
-        # Read the file and create response
-        with open('temp_result_card.xlsx', 'rb') as f:
-            excel_data = f.read()
-        
-        # Clean up temporary file
-        os.remove('temp_result_card.xlsx')
+        excel_data = render_cache.get_or_render('result_card_xlsx', [*cache_parts, today], render_xlsx)
         
         # Create response
         filename = f"result_card_{student.symbol_number}_{exam_type}_{academic_year}.xlsx"
@@ -2649,6 +2614,15 @@ def export_student_result_card_excel(request, symbol_number):
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+GRADE_STATUS = {
+    'A+': 'Excellent',
+    'A': 'Very Good',
+    'B+': 'Good',
+    'B': 'Satisfactory',
+    'C+': 'Average',
+    'C': 'Pass',
+}
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def grade_calculator_api(request):
@@ -2659,42 +2633,16 @@ def grade_calculator_api(request):
         if percentage < 0 or percentage > 100:
             return Response({'error': 'Percentage must be between 0 and 100'}, status=400)
         
-        # Grade calculation logic
-        if percentage >= 90:
-            grade = 'A+'
-            grade_point = 4.0
-            status = 'Excellent'
-        elif percentage >= 80:
-            grade = 'A'
-            grade_point = 3.6
-            status = 'Very Good'
-        elif percentage >= 70:
-            grade = 'B+'
-            grade_point = 3.2
-            status = 'Good'
-        elif percentage >= 60:
-            grade = 'B'
-            grade_point = 2.8
-            status = 'Satisfactory'
-        elif percentage >= 50:
-            grade = 'C+'
-            grade_point = 2.4
-            status = 'Average'
-        elif percentage >= 40:
-            grade = 'C'
-            grade_point = 2.0
-            status = 'Pass'
-        else:
-            grade = 'F'
-            grade_point = 0.0
-            status = 'Fail'
+        scale = grading.scale_for_class(request.data.get('class_name'))
+        grade, grade_point = grading.get_grade_and_point(percentage, scale)
+        status = GRADE_STATUS.get(grade, 'Fail')
         
         return Response({
             'percentage': percentage,
             'grade': grade,
             'grade_point': grade_point,
             'status': status,
-            'passed': percentage >= 40
+            'passed': bool(scale.passed([percentage])[0])
         })
         
     except ValueError:
@@ -2731,7 +2679,7 @@ def print_result_card_view(request, symbol_number):
             practical = mark.practical_marks or 0
             total = theory + practical
             
-            total_marks += (mark.subject.theory_total or 0) + (mark.subject.practical_total or 0)
+            total_marks += (mark.theory_total or 0) + (mark.practical_total or 0)
             total_obtained += total
             if mark.is_passed:
                 passed_subjects += 1
@@ -2853,8 +2801,20 @@ def send_result_notification_email(request, symbol_number):
             )
             email.attach_alternative(html_content, "text/html")
             
-            # Send email
-            email.send()
+            # Recorded in the outbox first, so a failed send is retried by send_outbox
+            outbound, send_error = outbox.send_now(
+                email, student=student, exam_type=exam_type, academic_year=academic_year
+            )
+            if send_error:
+                return Response({
+                    'success': False,
+                    'queued': True,
+                    'outbox_id': outbound.id,
+                    'error': f'Failed to send email: {send_error}',
+                    'message': 'Email sending failed. It has been queued and will be retried automatically.',
+                    'student_name': student.full_name,
+                    'recipient_email': recipient_email
+                }, status=202)
             
             # Log the successful email sending
             print(f"✅ SUCCESS: Result notification email sent to {recipient_email} for student {student.full_name}")
@@ -2900,6 +2860,16 @@ def send_result_notification_email(request, symbol_number):
             'message': 'An unexpected error occurred while processing the request.'
         }, status=500)
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def email_delivery_metrics(request):
+    """Outbox delivery counts per exam; filters: exam_type, academic_year"""
+    try:
+        filters = {key: request.GET[key] for key in ('exam_type', 'academic_year') if request.GET.get(key)}
+        return Response({'success': True, 'metrics': outbox.delivery_metrics(**filters)})
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def bulk_send_result_notifications(request):
@@ -2917,117 +2887,26 @@ def bulk_send_result_notifications(request):
         if not students.exists():
             return Response({'error': 'No valid students found'}, status=404)
         
-        success_count = 0
-        error_count = 0
-        results = []
+        options = {
+            'student_ids': list(students.values_list('id', flat=True)),
+            'exam_type': exam_type,
+            'academic_year': academic_year,
+            'recipient_type': recipient_type,
+            'base_url': f"{request.scheme}://{request.get_host()}",
+        }
+        # ?background=1: send from the run_jobs worker and poll the job instead
+        if _wants_background(request):
+            return _job_accepted(request, jobs.enqueue('send_result_notifications', options, request.user))
         
-        for student in students:
-            try:
-                # Get student marks
-                marks = Marks.objects.filter(
-                    student=student,
-                    exam_type=exam_type,
-                    academic_year=academic_year
-                ).select_related('subject')
-                
-                if not marks.exists():
-                    results.append({
-                        'student_name': student.full_name,
-                        'symbol_number': student.symbol_number,
-                        'status': 'error',
-                        'message': 'No results found'
-                    })
-                    error_count += 1
-                    continue
-                
-                # Calculate totals
-                total_marks = 0
-                total_obtained = 0
-                
-                for mark in marks:
-                    theory = mark.theory_marks or 0
-                    practical = mark.practical_marks or 0
-                    total = theory + practical
-                    
-                    total_marks += (mark.subject.theory_total or 0) + (mark.subject.practical_total or 0)
-                    total_obtained += total
-                
-                percentage = (total_obtained / total_marks * 100) if total_marks > 0 else 0
-                
-                # Determine recipient email
-                recipient_email = None
-                if recipient_type == 'parent' and student.parent_contact:
-                    # Try to extract email from parent contact if it's an email
-                    if '@' in student.parent_contact:
-                        recipient_email = student.parent_contact
-                elif recipient_type == 'student' and student.email:
-                    recipient_email = student.email
-                
-                if not recipient_email:
-                    results.append({
-                        'student_name': student.full_name,
-                        'symbol_number': student.symbol_number,
-                        'status': 'error',
-                        'message': f'No {recipient_type} email found'
-                    })
-                    error_count += 1
-                    continue
-                
-                # Prepare email context
-                context = {
-                    'student': student,
-                    'marks': marks,
-                    'exam_type': exam_type,
-                    'academic_year': academic_year,
-                    'total_obtained': total_obtained,
-                    'total_marks': total_marks,
-                    'percentage': percentage,
-                    'overall_result': 'PASS' if percentage >= 40 else 'FAIL',
-                    'parent_name': student.parent_name or f"Parent of {student.full_name}",
-                    'recipient_email': recipient_email,
-                    'generated_date': datetime.now().strftime('%Y-%m-%d %H:%M'),
-                    'result_url': f"{request.scheme}://{request.get_host()}/print-result-card/{student.symbol_number}/?exam_type={exam_type}&academic_year={academic_year}"
-                }
-                
-                # Send email
-                html_content = render_to_string('emails/result_notification.html', context)
-                text_content = render_to_string('emails/result_notification.txt', context)
-                
-                subject = f"Result Notification - {student.full_name} ({exam_type})"
-                from_email = settings.DEFAULT_FROM_EMAIL
-                
-                email = EmailMultiAlternatives(
-                    subject=subject,
-                    body=text_content,
-                    from_email=from_email,
-                    to=[recipient_email]
-                )
-                email.attach_alternative(html_content, "text/html")
-                email.send()
-                
-                results.append({
-                    'student_name': student.full_name,
-                    'symbol_number': student.symbol_number,
-                    'recipient_email': recipient_email,
-                    'status': 'success',
-                    'message': 'Email sent successfully'
-                })
-                success_count += 1
-                
-            except Exception as e:
-                results.append({
-                    'student_name': student.full_name,
-                    'symbol_number': student.symbol_number,
-                    'status': 'error',
-                    'message': str(e)
-                })
-                error_count += 1
+        results = notifications.send_result_notifications(**options)
+        success_count = sum(1 for r in results if r['status'] == 'success')
+        error_count = len(results) - success_count
         
         return Response({
             'success': True,
             'message': f'Bulk email operation completed. {success_count} successful, {error_count} failed.',
             'summary': {
-                'total_students': len(students),
+                'total_students': len(results),
                 'success_count': success_count,
                 'error_count': error_count
             },
@@ -3040,84 +2919,48 @@ def bulk_send_result_notifications(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def bulk_import_students(request):
-    """Bulk import students from Excel file"""
+    """Bulk import students from Excel file (create_accounts=true also creates their logins)"""
     try:
         if 'file' not in request.FILES:
             return Response({'error': 'Excel file is required'}, status=400)
         
         excel_file = request.FILES['file']
+        create_accounts = str(request.data.get('create_accounts', '')).lower() in ('1', 'true', 'yes', 'on')
+        # Creating logins with chosen passwords is for admins only
+        if create_accounts and not request.user.is_staff:
+            return Response({'error': 'Access denied. Admin privileges required to create accounts.'}, status=403)
+        
+        # ?stream=1: import a large CSV chunk by chunk, reporting progress as NDJSON
+        if _wants_stream(request) and excel_file.name.endswith('.csv'):
+            return _progress_response(student_import.import_csv_chunks(excel_file, create_accounts=create_accounts))
+        
+        # ?background=1: keep the upload on the job and import it in the run_jobs worker
+        if _wants_background(request):
+            if not excel_file.name.endswith(('.xlsx', '.csv')):
+                return Response({'error': 'Please upload an Excel (.xlsx) or CSV file'}, status=400)
+            return _job_accepted(request, jobs.enqueue(
+                'import_students', {'create_accounts': create_accounts}, request.user,
+                input_name=excel_file.name, input_data=excel_file.read()
+            ))
         
         if not excel_file.name.endswith('.xlsx'):
             return Response({'error': 'Please upload an Excel (.xlsx) file'}, status=400)
         
         # Read Excel file
         import pandas as pd
-        df = pd.read_excel(excel_file)
+        df = pd.read_excel(excel_file, dtype=str).dropna(how='all')
+        df.columns = [str(col).strip() for col in df.columns]
         
-        required_columns = ['full_name', 'symbol_number', 'student_class', 'date_of_birth', 'gender']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = [col for col in student_import.REQUIRED_COLUMNS if col not in df.columns]
         
         if missing_columns:
             return Response({
                 'error': f'Missing required columns: {", ".join(missing_columns)}'
             }, status=400)
         
-        success_count = 0
-        error_count = 0
-        results = []
-        
-        for index, row in df.iterrows():
-            try:
-                # Check if student already exists
-                if Student.objects.filter(symbol_number=row['symbol_number']).exists():
-                    results.append({
-                        'row': index + 2,  # Excel rows start from 1, and we have header
-                        'symbol_number': row['symbol_number'],
-                        'status': 'error',
-                        'message': 'Student with this symbol number already exists'
-                    })
-                    error_count += 1
-                    continue
-                
-                # Create student
-                student_data = {
-                    'full_name': row['full_name'],
-                    'symbol_number': row['symbol_number'],
-                    'student_class': row['student_class'],
-                    'date_of_birth': pd.to_datetime(row['date_of_birth']).date(),
-                    'gender': row['gender'],
-                    'username': f"student_{row['symbol_number']}",
-                }
-                
-                # Optional fields
-                if 'email' in df.columns and pd.notna(row['email']):
-                    student_data['email'] = row['email']
-                if 'parent_name' in df.columns and pd.notna(row['parent_name']):
-                    student_data['parent_name'] = row['parent_name']
-                if 'parent_contact' in df.columns and pd.notna(row['parent_contact']):
-                    student_data['parent_contact'] = row['parent_contact']
-                if 'address' in df.columns and pd.notna(row['address']):
-                    student_data['address'] = row['address']
-                
-                student = Student.objects.create(**student_data)
-                
-                results.append({
-                    'row': index + 2,
-                    'symbol_number': row['symbol_number'],
-                    'student_name': row['full_name'],
-                    'status': 'success',
-                    'message': 'Student created successfully'
-                })
-                success_count += 1
-                
-            except Exception as e:
-                results.append({
-                    'row': index + 2,
-                    'symbol_number': row.get('symbol_number', 'N/A'),
-                    'status': 'error',
-                    'message': str(e)
-                })
-                error_count += 1
+        results = student_import.import_students(df, create_accounts=create_accounts)
+        success_count = sum(1 for r in results if r['status'] == 'success')
+        error_count = len(results) - success_count
         
         return Response({
             'success': True,
@@ -3139,7 +2982,8 @@ def download_student_template(request):
     """Download Excel template for student import"""
     try:
         # Create Excel workbook
-        workbook = xlsxwriter.Workbook('temp_student_template.xlsx')
+        output = BytesIO()
+        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
         worksheet = workbook.add_worksheet('Students')
         
         # Styles
@@ -3180,12 +3024,7 @@ def download_student_template(request):
         
         workbook.close()
         
-        # Read the file and create response
-        with open('temp_student_template.xlsx', 'rb') as f:
-            excel_data = f.read()
-        
-        # Clean up temporary file
-        os.remove('temp_student_template.xlsx')
+        excel_data = output.getvalue()
         
         # Create response
         response = HttpResponse(excel_data, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
@@ -3204,77 +3043,13 @@ def analytics_dashboard_data(request):
         exam_type = request.GET.get('exam_type', 'Final Term')
         academic_year = request.GET.get('academic_year', '2024-25')
         
-        # Get all marks for the specified exam
-        marks = Marks.objects.filter(
-            exam_type=exam_type,
-            academic_year=academic_year
-        ).select_related('student', 'subject')
-        
-        if not marks.exists():
+        summary = analytics.dashboard_summary(exam_type, academic_year)
+        if summary is None:
             return Response({'error': 'No data found for the specified criteria'}, status=404)
         
-        # Calculate analytics
-        total_students = marks.values('student').distinct().count()
-        total_subjects = marks.values('subject').distinct().count()
-        
-        # Performance statistics
-        total_marks_possible = 0
-        total_marks_obtained = 0
-        pass_count = 0
-        fail_count = 0
-        
-        for mark in marks:
-            theory = mark.theory_marks or 0
-            practical = mark.practical_marks or 0
-            total = theory + practical
-            
-            total_marks_possible += (mark.subject.theory_total or 0) + (mark.subject.practical_total or 0)
-            total_marks_obtained += total
-            
-            if mark.is_passed:
-                pass_count += 1
-            elif mark.is_passed is False:
-                fail_count += 1
-        
-        overall_percentage = (total_marks_obtained / total_marks_possible * 100) if total_marks_possible > 0 else 0
-        
-        # Subject-wise performance
-        subject_performance = []
-        for subject in Subject.objects.filter(marks__exam_type=exam_type, marks__academic_year=academic_year).distinct():
-            subject_marks = marks.filter(subject=subject)
-            if subject_marks.exists():
-                subject_total = sum((m.theory_marks or 0) + (m.practical_marks or 0) for m in subject_marks)
-                subject_possible = sum((m.subject.theory_total or 0) + (m.subject.practical_total or 0) for m in subject_marks)
-                subject_percentage = (subject_total / subject_possible * 100) if subject_possible > 0 else 0
-                
-                subject_performance.append({
-                    'subject_name': subject.name,
-                    'average_percentage': round(subject_percentage, 2),
-                    'total_students': subject_marks.count()
-                })
-        
-        # Grade distribution
-        grade_distribution = {
-            'A+': 0, 'A': 0, 'B+': 0, 'B': 0, 'C+': 0, 'C': 0, 'F': 0
-        }
-        
-        for mark in marks:
-            grade = mark.grade
-            if grade in grade_distribution:
-                grade_distribution[grade] += 1
-        
         return Response({
             'success': True,
-            'analytics': {
-                'total_students': total_students,
-                'total_subjects': total_subjects,
-                'overall_percentage': round(overall_percentage, 2),
-                'pass_count': pass_count,
-                'fail_count': fail_count,
-                'pass_rate': round((pass_count / (pass_count + fail_count) * 100), 2) if (pass_count + fail_count) > 0 else 0,
-                'subject_performance': subject_performance,
-                'grade_distribution': grade_distribution
-            }
+            'analytics': summary
         })
         
     except Exception as e:
@@ -3351,16 +3126,22 @@ class SubjectMarksView(APIView):
         try:
             subject = Subject.objects.get(name=subject_name)
             students = Student.objects.filter(student_class=class_name)
+            marks_by_student = {
+                m.student_id: m
+                for m in Marks.objects.filter(
+                    student__student_class=class_name,
+                    subject=subject,
+                    exam_type=exam_type,
+                    academic_year=academic_year
+                )
+            }
             
             marks_data = {}
             for student in students:
                 try:
-                    marks = Marks.objects.get(
-                        student=student,
-                        subject=subject,
-                        exam_type=exam_type,
-                        academic_year=academic_year
-                    )
+                    marks = marks_by_student.get(student.id)
+                    if marks is None:
+                        raise Marks.DoesNotExist
                     marks_data[student.symbol_number] = {
                         'theory_marks': marks.theory_marks,
                         'theory_total': marks.theory_total,
@@ -3390,6 +3171,78 @@ class SubjectMarksView(APIView):
         except Subject.DoesNotExist:
             return Response({'error': 'Subject not found'}, status=404)
 
+class ClassMarksMatrixView(APIView):
+    """Whole-class marks grid (students x subjects) in one round trip.
+
+    Returns a columnar payload: student and subject id arrays plus parallel
+    per-cell arrays indexed into them, so the marks entry grid can load every
+    subject at once instead of one request per subject.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    CELL_FIELDS = [
+        'theory_marks', 'theory_total', 'practical_marks', 'practical_total',
+        'total_marks', 'percentage', 'grade', 'grade_point', 'is_passed'
+    ]
+    
+    def get(self, request):
+        class_name = request.query_params.get('class')
+        subject_name = request.query_params.get('subject')
+        exam_type = request.query_params.get('exam_type')
+        academic_year = request.query_params.get('academic_year')
+        
+        if not all([class_name, exam_type, academic_year]):
+            return Response({'error': 'Missing required parameters'}, status=400)
+        
+        students = list(
+            Student.objects.filter(student_class=class_name)
+            .order_by('full_name')
+            .values_list('id', 'symbol_number', 'full_name')
+        )
+        student_index = {student_id: i for i, (student_id, _, _) in enumerate(students)}
+        
+        # Only the students loaded above: one added to the class in between has no row to index
+        marks = Marks.objects.filter(
+            student_id__in=list(student_index),
+            exam_type=exam_type,
+            academic_year=academic_year
+        )
+        if subject_name:
+            marks = marks.filter(subject__name=subject_name)
+        rows = marks.order_by('subject__name').values_list(
+            'student_id', 'subject_id', 'subject__name', 'subject__code', 'subject__credit_hour', *self.CELL_FIELDS
+        )
+        
+        subject_index = {}
+        subjects = {'ids': [], 'names': [], 'codes': [], 'credit_hours': []}
+        cells = {'student_index': [], 'subject_index': []}
+        cells.update({field: [] for field in self.CELL_FIELDS})
+        
+        for student_id, subject_id, name, code, credit_hour, *values in rows:
+            if subject_id not in subject_index:
+                subject_index[subject_id] = len(subjects['ids'])
+                subjects['ids'].append(subject_id)
+                subjects['names'].append(name)
+                subjects['codes'].append(code)
+                subjects['credit_hours'].append(credit_hour)
+            cells['student_index'].append(student_index[student_id])
+            cells['subject_index'].append(subject_index[subject_id])
+            for field, value in zip(self.CELL_FIELDS, values):
+                cells[field].append(value)
+        
+        return Response({
+            'class_name': class_name,
+            'exam_type': exam_type,
+            'academic_year': academic_year,
+            'students': {
+                'ids': [s[0] for s in students],
+                'symbol_numbers': [s[1] for s in students],
+                'names': [s[2] for s in students],
+            },
+            'subjects': subjects,
+            'cells': cells,
+        })
+
 class EnhancedResultView(APIView):
     """Enhanced result view with better filtering and search"""
     permission_classes = [IsAuthenticated]
@@ -3441,13 +3294,31 @@ def enhanced_bulk_save_marks(request):
             defaults={'code': subject[:3].upper(), 'credit_hour': 4.0}
         )
         
-        saved_count = 0
         errors = []
+        to_create = []
+        to_update = []
+        
+        # Resolve every student and every existing marks row up front (one query each)
+        students = {
+            s.symbol_number: s
+            for s in Student.objects.filter(symbol_number__in=list(marks_data.keys()), student_class=class_name)
+        }
+        existing = {
+            m.student_id: m
+            for m in Marks.objects.filter(
+                subject=subject_obj,
+                exam_type=exam_type,
+                academic_year=academic_year,
+                student__in=list(students.values())
+            )
+        }
         
         # Process each student's marks
         for symbol_number, marks in marks_data.items():
             try:
-                student = Student.objects.get(symbol_number=symbol_number, student_class=class_name)
+                student = students.get(symbol_number)
+                if student is None:
+                    raise Student.DoesNotExist
                 
                 # Validate marks
                 theory_marks = float(marks.get('theory_marks', 0)) if marks.get('theory_marks') else None
@@ -3465,38 +3336,33 @@ def enhanced_bulk_save_marks(request):
                     errors.append(f"Invalid practical marks for {student.full_name}: {practical_marks}")
                     continue
                 
-                # Get or create marks record
-                marks_obj, created = Marks.objects.get_or_create(
-                    student=student,
-                    subject=subject_obj,
-                    exam_type=exam_type,
-                    academic_year=academic_year,
-                    defaults={
-                        'theory_marks': theory_marks,
-                        'theory_total': theory_total,
-                        'practical_marks': practical_marks,
-                        'practical_total': practical_total,
-                    }
-                )
-                
-                if not created:
-                    # Update existing record
-                    marks_obj.theory_marks = theory_marks
-                    marks_obj.theory_total = theory_total
-                    marks_obj.practical_marks = practical_marks
-                    marks_obj.practical_total = practical_total
-                
-                # Save to trigger auto-calculation
-                marks_obj.save()
-                saved_count += 1
+                marks_obj = existing.get(student.id)
+                if marks_obj is None:
+                    marks_obj = Marks(
+                        student=student,
+                        subject=subject_obj,
+                        exam_type=exam_type,
+                        academic_year=academic_year
+                    )
+                    to_create.append(marks_obj)
+                else:
+                    to_update.append(marks_obj)
+                marks_obj.theory_marks = theory_marks
+                marks_obj.theory_total = theory_total
+                marks_obj.practical_marks = practical_marks
+                marks_obj.practical_total = practical_total
                 
             except Student.DoesNotExist:
                 errors.append(f"Student not found: {symbol_number}")
-            except ValueError as e:
+            except (ValueError, TypeError) as e:
                 errors.append(f"Invalid marks format for {symbol_number}: {str(e)}")
             except Exception as e:
                 errors.append(f"Error saving marks for {symbol_number}: {str(e)}")
         
+        # Grade the whole class in one vectorized pass and write it in one transaction
+        grading.save_marks_bulk(to_create, to_update)
+        saved_count = len(to_create) + len(to_update)
+        
         return Response({
             'success': True,
             'message': f'Successfully saved marks for {saved_count} students',
@@ -3560,6 +3426,7 @@ def get_subjects_for_class(request):
 @permission_classes([IsAuthenticated])
 def set_subjects_for_class(request):
     """Define subjects for a class by creating placeholder marks rows for all students in that class.
+    Placeholders have no score, so analytics and build_results skip them until marks are entered.
     Body: { class_name, exam_type, academic_year, subjects: [subject_name or {name, credit_hour}] }
     """
     try:
@@ -3583,33 +3450,46 @@ def set_subjects_for_class(request):
         if not subject_names:
             return Response({'error': 'No valid subjects provided'}, status=400)
 
-        # Ensure Subject records exist
-        from .models import Subject, Student, Marks
-        subjects = []
-        for name in subject_names:
-            subj, _ = Subject.objects.get_or_create(
-                name=name,
-                defaults={'credit_hour': 4.0}
-            )
-            subjects.append(subj)
+        # Ensure Subject records exist (one lookup, one bulk insert for the missing ones)
+        subjects = list(Subject.bulk_get_or_create(subject_names).values())
 
-        students = Student.objects.filter(student_class=class_name)
-        if not students.exists():
+        student_ids = list(Student.objects.filter(student_class=class_name).values_list('id', flat=True))
+        if not student_ids:
             return Response({'error': f'No students found for class {class_name}'}, status=404)
 
-        created_or_existing = 0
-        for student in students:
-            for subj in subjects:
-                _, created = Marks.objects.get_or_create(
-                    student=student,
-                    subject=subj,
-                    exam_type=exam_type,
-                    academic_year=academic_year,
-                    defaults={'theory_total': 100, 'practical_total': 0}
-                )
-                created_or_existing += 1
+        # Build the whole students x subjects cross product and insert it in one statement
+        placeholders = grading.apply_marks_grades(
+            [Marks(
+                student_id=student_id,
+                subject=subj,
+                exam_type=exam_type,
+                academic_year=academic_year,
+                theory_total=100,
+                practical_total=0
+            )
+            for student_id in student_ids
+            for subj in subjects
+        ], scale=grading.scale_for_class(class_name))
+        cell_marks = Marks.objects.filter(
+            student_id__in=student_ids,
+            subject__in=subjects,
+            exam_type=exam_type,
+            academic_year=academic_year
+        )
+        with transaction.atomic():
+            existing_count = cell_marks.count()
+            Marks.objects.bulk_create(placeholders, batch_size=1000, ignore_conflicts=True)
+            created_count = cell_marks.count() - existing_count
+            if created_count:
+                analytics.marks_changed(placeholders)
+                result_documents.marks_changed(placeholders)
 
-        return Response({'success': True, 'records': created_or_existing})
+        return Response({
+            'success': True,
+            'records': len(placeholders),
+            'created': created_count,
+            'existing': existing_count
+        })
     except Exception as e:
         return Response({'success': False, 'error': str(e)}, status=500)
 